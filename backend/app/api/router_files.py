@@ -1,27 +1,25 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from starlette.concurrency import run_in_threadpool
 from app.schemas import FileUploadResponse
-from io import StringIO
-import pandas as pd
-from app.repositories.files_repo import save_upload, get_file_meta
-from app.services.validation_service import validate_dataframe
+from app.repositories.files_repo import get_file_meta
+from app.services.ingest_service import spool_upload_hash, store_upload
 
 router = APIRouter()
 
 @router.post("/files/upload", response_model=FileUploadResponse)
 async def upload_file(file: UploadFile = File(...)):
-    content = await file.read()
+    path, content_hash = await spool_upload_hash(file)
     try:
-        df = pd.read_csv(StringIO(content.decode("utf-8")), low_memory=False)
+        # CSV -> Parquet por bloques, fuera del event loop
+        out, errors = await run_in_threadpool(store_upload, path, file.filename, content_hash)
     except Exception:
         raise HTTPException(status_code=400, detail="Archivo no es CSV válido")
 
-    errors = validate_dataframe(df)
     if errors:
         # No rechazamos, pero informamos (HU002). Si quieres, lanza 422.
         # raise HTTPException(status_code=422, detail=errors)
         pass
 
-    out = save_upload(df, file.filename)
     return FileUploadResponse(**out)
 
 @router.get("/files/{file_id}", response_model=FileUploadResponse)
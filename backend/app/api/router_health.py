@@ -1,7 +1,8 @@
 from fastapi import APIRouter
+from ml.model_registry import registry
 
 router = APIRouter()
 
 @router.get("/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "model": registry.info()}
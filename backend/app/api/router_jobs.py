@@ -0,0 +1,38 @@
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.schemas import JobStatusResponse
+from app.services import job_queue
+
+router = APIRouter()
+
+POLL_SECONDS = 0.5
+
+def _status(job_id: str) -> dict:
+    try:
+        return job_queue.job_status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="job_id no existe")
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def get_job_status(job_id: str):
+    return _status(job_id)
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events: emite el estado cada vez que cambia, hasta terminar."""
+    first = _status(job_id)
+
+    async def stream():
+        last, current = None, first
+        while True:
+            if current != last:
+                yield f"data: {json.dumps(current)}\n\n"
+                last = current
+            if current["status"] in job_queue.TERMINALES:
+                return
+            await asyncio.sleep(POLL_SECONDS)
+            current = job_queue.job_status(job_id)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
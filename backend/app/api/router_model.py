@@ -1,13 +1,72 @@
-from fastapi import APIRouter, UploadFile, File
-from io import StringIO
-import pandas as pd
-from app.schemas import TrainResponse
-from app.services.train_service import train_from_df
+from typing import Literal
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from app.schemas import BacktestResponse, TrainResponse, JobSubmitResponse
+from app.services.train_service import train_from_csv, train_from_file, tuning_en_paralelo
+from app.services.backtest_service import backtest_en_paralelo, backtest_from_file
+from app.services.ingest_service import spool_upload
+from app.services import job_queue
+from app.utils.deps import stored_file_id
+from app.utils.config import settings
 
 router = APIRouter()
 
+# sin modo se usa settings.TRAIN_MODE
+Modo = Literal["onehot", "nativo", "target"]
+
+def _particiones(particiones: int | None, modo: str | None) -> int | None:
+    # sin particiones se usa settings.TRAIN_PARTITIONS
+    if (particiones or settings.TRAIN_PARTITIONS) and (modo or settings.TRAIN_MODE) == "onehot":
+        raise HTTPException(status_code=400, detail="particiones requiere modo nativo o target")
+    return particiones
+
 @router.post("/model/train", response_model=TrainResponse)
-async def train_model(file: UploadFile = File(...), tuning: bool = False):
-    df = pd.read_csv(StringIO((await file.read()).decode("utf-8")), low_memory=False)
-    out = train_from_df(df, tuning=tuning)
+async def train_model(file: UploadFile = File(...), tuning: bool = False, modo: Modo | None = None):
+    path = await spool_upload(file)
+    # se parsea y entrena en el pool de procesos: el event loop sigue atendiendo
+    out = await job_queue.run(train_from_csv, path, tuning=tuning, modo=modo, local=tuning_en_paralelo(tuning))
+    return TrainResponse(**out)
+
+@router.post("/model/train/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_train_job(file: UploadFile = File(...), tuning: bool = False, modo: Modo | None = None):
+    path = await spool_upload(file)
+    job_id = job_queue.submit_training(train_from_csv, path, tuning=tuning, modo=modo,
+                                       local=tuning_en_paralelo(tuning))
+    return {"job_id": job_id, "status": "queued"}
+
+@router.post("/model/train/jobs/{file_id}", response_model=JobSubmitResponse, status_code=202)
+async def submit_train_job_file(fid: str = Depends(stored_file_id), tuning: bool = False, modo: Modo | None = None,
+                                particiones: int | None = Query(None, ge=1)):
+    particiones = _particiones(particiones, modo)
+    job_id = job_queue.submit_training(train_from_file, fid, tuning=tuning, modo=modo, particiones=particiones,
+                                       local=tuning_en_paralelo(tuning))
+    return {"job_id": job_id, "status": "queued"}
+
+@router.post("/model/train/{file_id}", response_model=TrainResponse)
+async def train_model_file(fid: str = Depends(stored_file_id), tuning: bool = False, modo: Modo | None = None,
+                           particiones: int | None = Query(None, ge=1)):
+    # dataset ya subido con /files/upload: sin re-upload ni parseo del CSV
+    particiones = _particiones(particiones, modo)
+    out = await job_queue.run(train_from_file, fid, tuning=tuning, modo=modo, particiones=particiones,
+                              local=tuning_en_paralelo(tuning))
     return TrainResponse(**out)
+
+@router.post("/model/backtest/jobs/{file_id}", response_model=JobSubmitResponse, status_code=202)
+async def submit_backtest_job(fid: str = Depends(stored_file_id), modo: Modo | None = None,
+                              pliegues: int | None = Query(None, ge=1), horizonte: int | None = Query(None, ge=1),
+                              paso: int | None = Query(None, ge=1)):
+    # el resultado queda como un job de entrenamiento (métricas globales + train_{id}.json)
+    job_id = job_queue.submit_training(backtest_from_file, fid, modo=modo, pliegues=pliegues,
+                                       horizonte=horizonte, paso=paso, local=backtest_en_paralelo(pliegues))
+    return {"job_id": job_id, "status": "queued"}
+
+@router.post("/model/backtest/{file_id}", response_model=BacktestResponse)
+async def backtest_model_file(fid: str = Depends(stored_file_id), modo: Modo | None = None,
+                              pliegues: int | None = Query(None, ge=1), horizonte: int | None = Query(None, ge=1),
+                              paso: int | None = Query(None, ge=1)):
+    # no publica modelo: solo evalúa la configuración sobre varios orígenes
+    try:
+        out = await job_queue.run(backtest_from_file, fid, modo=modo, pliegues=pliegues,
+                                  horizonte=horizonte, paso=paso, local=backtest_en_paralelo(pliegues))
+    except ValueError as ex:
+        raise HTTPException(status_code=400, detail=str(ex))
+    return BacktestResponse(**out)
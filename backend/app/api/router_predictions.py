@@ -1,41 +1,274 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Response
-from io import StringIO
-import csv
-from datetime import datetime
-import pandas as pd
+import json
+from typing import Literal
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from datetime import date, datetime
 from uuid import UUID
-from app.schemas import PredictionRunResponse, HistoryItem, SummaryResponse
-from app.services.predict_service import predict_from_df
-from app.repositories import predictions_repo
-from app.utils.deps import pagination_params
-from app.utils.paginate import paginate
+from app.schemas import PredictionItem, PredictionRunResponse, PredictionPageResponse, HistoryItem, SummaryResponse, DailySummaryItem, JobSubmitResponse, PredictionBatchRequest, PredictionBatchResponse, WhatIfRequest, WhatIfResponse, ForecastRunResponse, ForecastPageResponse, ForecastItem
+from app.services.predict_service import (
+    predict_from_csv, predict_from_file, predict_scenarios_from_csv, predict_scenarios_from_file,
+    forecast_from_csv, forecast_from_file, prediccion_en_paralelo
+)
+from app.services.ingest_service import spool_upload_hash
+from app.services.export_service import export_stream
+from app.services.whatif_service import what_if_detalle, what_if_grid
+from app.services import job_queue, result_cache
+from app.repositories import files_repo, predictions_repo, summary_repo
+from app.utils.deps import pagination_params, stored_file_id
+from app.utils.paginate import encode_cursor, decode_cursor
+from app.utils.fast_json import Orient, frame_records, frame_response
 from app.utils.config import settings
 
 router = APIRouter()
 
+def _run_response(response: Response, job_id: str, summary: dict, frame, fast: bool, orient: Orient):
+    meta = {"job_id": job_id, "summary": summary, "generated_at": datetime.utcnow().isoformat()}
+    if fast or orient == "columns":
+        # esquema validado una vez sobre el DataFrame, sin pydantic por fila
+        r = frame_response(meta, "predictions", frame, PredictionItem, orient)
+        r.headers["X-Cache"] = response.headers["X-Cache"]
+        return r
+    return {**meta, "predictions": frame_records(frame)}
+
+def _hash_archivo(fid: str) -> str:
+    # archivos subidos antes del caché no tienen hash: el dataset guardado no cambia
+    return files_repo.get_file_meta(fid).get("content_hash") or f"file:{fid}"
+
+# lo que toca SQLite, Parquet o el hash del modelo en disco corre con
+# run_in_threadpool: los endpoints son async y no deben bloquear el event loop
+
+async def _consulta(content_hash: str, filtros: dict, incremental: bool) -> dict | None:
+    return await run_in_threadpool(result_cache.consulta, content_hash, filtros, incremental)
+
+async def _consulta_archivo(fid: str, filtros: dict, incremental: bool) -> dict | None:
+    return await run_in_threadpool(
+        lambda: result_cache.consulta(_hash_archivo(fid), filtros, incremental)
+    )
+
+async def _buscar(response: Response, consulta: dict | None):
+    # X-Cache: hit | miss | bypass (corrida no cacheable)
+    hit = await run_in_threadpool(result_cache.buscar, consulta)
+    response.headers["X-Cache"] = "bypass" if consulta is None else "hit" if hit else "miss"
+    return hit
+
+def _guardar_corrida(consulta: dict | None, filtros: dict, summary: dict, frame) -> str:
+    job_id, _ = predictions_repo.save_run(filtros, frame, summary)
+    result_cache.registrar(consulta, job_id, summary, frame)
+    return job_id
+
+def _origen(consulta: dict | None) -> str | None:
+    # el worker lo guarda junto al estado de features que escribe
+    return consulta["content_hash"] if consulta is not None else None
+
+async def _correr(response: Response, consulta: dict | None, fn, fuente, filtros: dict, incremental: bool,
+                  particiones: int | None):
+    hit = await _buscar(response, consulta)
+    if hit is not None:
+        return hit
+    summary, frame = await job_queue.run(fn, fuente, filtros, incremental=incremental, as_frame=True,
+                                         particiones=particiones, origen=_origen(consulta),
+                                         local=prediccion_en_paralelo(particiones))
+    job_id = await run_in_threadpool(_guardar_corrida, consulta, filtros, summary, frame)
+    return job_id, summary, frame
+
+async def _encolar(response: Response, consulta: dict | None, fn, fuente, filtros: dict, incremental: bool,
+                   particiones: int | None) -> dict:
+    hit = await _buscar(response, consulta)
+    if hit is not None:
+        return {"job_id": hit[0], "status": "done"}
+    job_id = await run_in_threadpool(
+        job_queue.submit_prediction,
+        fn, fuente, filtros, incremental=incremental,
+        al_terminar=lambda job_id, summary, frame: result_cache.registrar(consulta, job_id, summary, frame),
+        particiones=particiones, origen=_origen(consulta), local=prediccion_en_paralelo(particiones)
+    )
+    return {"job_id": job_id, "status": "queued"}
+
 @router.post("/predictions/run", response_model=PredictionRunResponse)
 async def run_prediction(
+    response: Response,
     file: UploadFile = File(...),
     tienda: str | None = None,
     campania: str | None = None,
-    categoria: str | None = None
+    categoria: str | None = None,
+    incremental: bool = False,
+    particiones: int | None = Query(None, ge=1, description="Grupos de SKU en paralelo"),
+    fast: bool = False,
+    orient: Orient = "records"
+):
+    filtros = {"tienda": tienda, "campania": campania, "categoria": categoria}
+    path, content_hash = await spool_upload_hash(file)
+    consulta = await _consulta(content_hash, filtros, incremental)
+    job_id, summary, frame = await _correr(response, consulta, predict_from_csv, path, filtros, incremental, particiones)
+    # en un miss el worker ya borró el archivo
+    path.unlink(missing_ok=True)
+    return _run_response(response, job_id, summary, frame, fast, orient)
+
+@router.post("/predictions/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_prediction_job(
+    response: Response,
+    file: UploadFile = File(...),
+    tienda: str | None = None,
+    campania: str | None = None,
+    categoria: str | None = None,
+    incremental: bool = False,
+    particiones: int | None = Query(None, ge=1, description="Grupos de SKU en paralelo")
 ):
     filtros = {"tienda": tienda, "campania": campania, "categoria": categoria}
-    df = pd.read_csv(StringIO((await file.read()).decode("utf-8")), low_memory=False)
-    summary, preds = predict_from_df(df, filtros)
-    job_id, _ = predictions_repo.save_run(filtros, preds, summary)
+    path, content_hash = await spool_upload_hash(file)
+    out = await _encolar(response, await _consulta(content_hash, filtros, incremental),
+                         predict_from_csv, path, filtros, incremental, particiones)
+    if out["status"] == "done":
+        path.unlink(missing_ok=True)
+    return out
 
+@router.post("/predictions/run/{file_id}", response_model=PredictionRunResponse)
+async def run_prediction_file(
+    response: Response,
+    fid: str = Depends(stored_file_id),
+    tienda: str | None = None,
+    campania: str | None = None,
+    categoria: str | None = None,
+    incremental: bool = False,
+    particiones: int | None = Query(None, ge=1, description="Grupos de SKU en paralelo"),
+    fast: bool = False,
+    orient: Orient = "records"
+):
+    # dataset ya subido con /files/upload: sin re-upload ni parseo del CSV
+    filtros = {"tienda": tienda, "campania": campania, "categoria": categoria}
+    consulta = await _consulta_archivo(fid, filtros, incremental)
+    job_id, summary, frame = await _correr(response, consulta, predict_from_file, fid, filtros, incremental, particiones)
+    return _run_response(response, job_id, summary, frame, fast, orient)
+
+@router.post("/predictions/jobs/{file_id}", response_model=JobSubmitResponse, status_code=202)
+async def submit_prediction_job_file(
+    response: Response,
+    fid: str = Depends(stored_file_id),
+    tienda: str | None = None,
+    campania: str | None = None,
+    categoria: str | None = None,
+    incremental: bool = False,
+    particiones: int | None = Query(None, ge=1, description="Grupos de SKU en paralelo")
+):
+    filtros = {"tienda": tienda, "campania": campania, "categoria": categoria}
+    return await _encolar(response, await _consulta_archivo(fid, filtros, incremental),
+                          predict_from_file, fid, filtros, incremental, particiones)
+
+def _batch_response(content_hash: str, escenarios: list[dict], resultados: list) -> dict:
+    # bloqueante (Parquet + SQLite por escenario): se llama con run_in_threadpool
+    items = []
+    for filtros, (summary, frame) in zip(escenarios, resultados):
+        job_id, n = predictions_repo.save_run(filtros, frame, summary)
+        # las corridas con filtros no dependen del estado de features: quedan en el caché
+        consulta = result_cache.consulta(content_hash, filtros)
+        if consulta is not None and consulta["filtros"]:
+            result_cache.registrar(consulta, job_id, summary, frame)
+        items.append({"job_id": job_id, "filtros": filtros, "summary": summary, "total_items": n})
+    return {"generated_at": datetime.utcnow().isoformat(), "escenarios": items}
+
+@router.post("/predictions/batch", response_model=PredictionBatchResponse)
+async def run_prediction_batch(
+    file: UploadFile = File(...),
+    escenarios: str = Form(..., description='JSON: [{"tienda": ..., "campania": ..., "categoria": ...}, ...]')
+):
+    # features una sola vez para todos los escenarios; un job por escenario
+    try:
+        body = PredictionBatchRequest.model_validate({"escenarios": json.loads(escenarios)})
+    except ValueError as ex:
+        raise HTTPException(status_code=422, detail=str(ex))
+    filtros = [e.model_dump() for e in body.escenarios]
+    path, content_hash = await spool_upload_hash(file)
+    resultados = await job_queue.run(predict_scenarios_from_csv, path, filtros)
+    return await run_in_threadpool(_batch_response, content_hash, filtros, resultados)
+
+@router.post("/predictions/batch/{file_id}", response_model=PredictionBatchResponse)
+async def run_prediction_batch_file(body: PredictionBatchRequest, fid: str = Depends(stored_file_id)):
+    filtros = [e.model_dump() for e in body.escenarios]
+    resultados = await job_queue.run(predict_scenarios_from_file, fid, filtros)
+    return await run_in_threadpool(lambda: _batch_response(_hash_archivo(fid), filtros, resultados))
+
+def _guardar_pronostico(filtros: dict, summary: dict, frame, pronostico) -> tuple[str, int]:
+    # el pronóstico se escribe antes de marcar el job como terminado; si algo
+    # falla el job queda fallido en vez de running para siempre
+    job_id = predictions_repo.create_job(filtros, status="running")
+    try:
+        filas = predictions_repo.save_forecast(job_id, pronostico)
+        predictions_repo.complete_job(job_id, frame, summary)
+    except Exception as ex:
+        predictions_repo.update_job(job_id, status="failed", error=str(ex), finished_at=datetime.utcnow())
+        raise
+    return job_id, filas
+
+async def _pronostico(fn, fuente, filtros: dict, horizonte: int | None) -> dict:
+    horizonte = horizonte or settings.FORECAST_HORIZON
+    summary, frame, pronostico = await job_queue.run(fn, fuente, filtros, horizonte)
+    job_id, filas = await run_in_threadpool(_guardar_pronostico, filtros, summary, frame, pronostico)
     return {
         "job_id": job_id,
         "summary": summary,
-        "predictions": preds,
-        "generated_at": datetime.utcnow().isoformat()
+        "horizonte": horizonte,
+        "n_skus": filas // horizonte,
+        "filas": filas,
+        "generated_at": datetime.utcnow().isoformat(),
     }
 
+@router.post("/predictions/forecast", response_model=ForecastRunResponse)
+async def run_forecast(
+    file: UploadFile = File(...),
+    horizonte: int | None = Query(None, ge=1, le=365),
+    tienda: str | None = None,
+    campania: str | None = None,
+    categoria: str | None = None
+):
+    # alertas + pronóstico diario por SKU; el detalle en GET /predictions/{job_id}/forecast
+    filtros = {"tienda": tienda, "campania": campania, "categoria": categoria}
+    path = (await spool_upload_hash(file))[0]
+    return await _pronostico(forecast_from_csv, path, filtros, horizonte)
+
+@router.post("/predictions/forecast/{file_id}", response_model=ForecastRunResponse)
+async def run_forecast_file(
+    fid: str = Depends(stored_file_id),
+    horizonte: int | None = Query(None, ge=1, le=365),
+    tienda: str | None = None,
+    campania: str | None = None,
+    categoria: str | None = None
+):
+    filtros = {"tienda": tienda, "campania": campania, "categoria": categoria}
+    return await _pronostico(forecast_from_file, fid, filtros, horizonte)
+
+@router.get("/predictions/cache/stats")
+def cache_stats():
+    """Hits (memoria/disco), misses y desalojos del caché de resultados desde el arranque."""
+    return result_cache.stats()
+
 @router.get("/predictions/history", response_model=list[HistoryItem])
-def list_history(p=Depends(pagination_params)):
-    jobs = predictions_repo.list_jobs()
-    page_items, total = paginate(jobs, p["page"], p["size"])
+def list_history(
+    response: Response,
+    p=Depends(pagination_params),
+    cursor: str | None = None,
+    desde: date | None = None,
+    hasta: date | None = None,
+    tienda: str | None = None,
+    campania: str | None = None,
+    categoria: str | None = None,
+    mae_min: float | None = None,
+    mae_max: float | None = None
+):
+    # con `cursor` (header X-Next-Cursor de la página anterior) se ignora `page`
+    try:
+        # (created_at, id) del último job de la página anterior
+        clave = decode_cursor(cursor, (str, str)) if cursor else None
+    except ValueError as ex:
+        raise HTTPException(status_code=400, detail=str(ex))
+    jobs, siguiente = predictions_repo.list_jobs_page(
+        p["size"], cursor=clave, offset=(p["page"] - 1) * p["size"],
+        desde=desde, hasta=hasta,
+        filtros={"tienda": tienda, "campania": campania, "categoria": categoria},
+        mae_min=mae_min, mae_max=mae_max
+    )
+    if siguiente is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(*siguiente)
     return [
         {
             "job_id": j["id"],
@@ -44,43 +277,165 @@ def list_history(p=Depends(pagination_params)):
             "mae": j.get("mae"),
             "total_items": j.get("total_items", 0)
         }
-        for j in page_items
+        for j in jobs
     ]
 
 @router.get("/predictions/summary", response_model=SummaryResponse)
-def get_summary():
-    jobs = predictions_repo.list_jobs()
-    total = sum(j.get("total_items", 0) for j in jobs)
-    estados: dict[str,int] = {}
-    for j in jobs:
-        for k,v in (j.get("summary") or {}).items():
-            estados[k] = estados.get(k,0) + v
-    return {"total": total, "estados": estados}
-
-@router.get("/predictions/{job_id}", response_model=PredictionRunResponse)
-def get_job(job_id: UUID):
-    j = predictions_repo.get_job(str(job_id))
-    rows = predictions_repo.get_job_rows(str(job_id))
-    return {
+def get_summary(
+    desde: date | None = None,
+    hasta: date | None = None,
+    tienda: str | None = None,
+    campania: str | None = None,
+    categoria: str | None = None
+):
+    # contadores materializados al cerrar cada job: no se recorre el historial
+    filtros = {"tienda": tienda, "campania": campania, "categoria": categoria}
+    return summary_repo.get_summary(desde, hasta, filtros)
+
+@router.get("/predictions/summary/daily", response_model=list[DailySummaryItem])
+def get_summary_daily(
+    desde: date | None = None,
+    hasta: date | None = None,
+    tienda: str | None = None,
+    campania: str | None = None,
+    categoria: str | None = None
+):
+    filtros = {"tienda": tienda, "campania": campania, "categoria": categoria}
+    return summary_repo.get_daily(desde, hasta, filtros)
+
+@router.post("/predictions/summary/rebuild", response_model=SummaryResponse)
+def rebuild_summary():
+    return summary_repo.rebuild()
+
+@router.get("/predictions/export")
+def export_job(
+    job_id: str,
+    formato: Literal["csv", "parquet", "xlsx"] = "csv",
+    gzip: bool = False,
+    columnas: str | None = Query(None, description="Columnas separadas por coma"),
+    estado: str | None = None
+):
+    # las filas se leen por bloques y se envían a medida que se serializan
+    cols = [c.strip() for c in columnas.split(",") if c.strip()] if columnas else None
+    try:
+        body, media_type, filename = export_stream(job_id, formato, cols, estado, comprimir=gzip)
+    except LookupError as ex:
+        raise HTTPException(status_code=404, detail=str(ex))
+    except ValueError as ex:
+        raise HTTPException(status_code=400, detail=str(ex))
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+@router.post("/predictions/{job_id}/what-if", response_model=WhatIfResponse)
+def what_if(job_id: UUID, body: WhatIfRequest):
+    # política recalculada desde los agregados guardados: sin volver a correr el modelo
+    try:
+        return what_if_grid(str(job_id), body.niveles_servicio, body.multiplicadores)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="job_id no existe")
+    except ValueError as ex:
+        raise HTTPException(status_code=409, detail=str(ex))
+
+@router.get("/predictions/{job_id}/what-if", response_model=PredictionPageResponse)
+def what_if_job(
+    job_id: UUID,
+    nivel_servicio: float = Query(..., gt=0, lt=1),
+    multiplicador: float = Query(1.0, gt=0),
+    page: int = Query(1, ge=1),
+    size: int | None = Query(None, ge=1, le=1000),
+    estado: str | None = None,
+    fast: bool = False,
+    orient: Orient = "records"
+):
+    try:
+        rows = what_if_detalle(str(job_id), nivel_servicio, multiplicador)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="job_id no existe")
+    except ValueError as ex:
+        raise HTTPException(status_code=409, detail=str(ex))
+    summary = {k: int(v) for k, v in rows["Estado"].value_counts().items()}
+    if estado:
+        rows = rows[rows["Estado"] == estado]
+    total = len(rows)
+    if size:
+        rows = rows.iloc[(page - 1) * size:page * size]
+    meta = {
+        "job_id": str(job_id),
+        "summary": summary,
+        "generated_at": datetime.utcnow().isoformat(),
+        "total": total,
+        "page": page if size else None,
+        "size": size
+    }
+    if fast or orient == "columns":
+        return frame_response(meta, "predictions", rows, PredictionItem, orient)
+    return {**meta, "predictions": frame_records(rows)}
+
+@router.get("/predictions/{job_id}/forecast", response_model=ForecastPageResponse)
+def get_forecast(
+    job_id: UUID,
+    sku: str | None = Query(None, description="Prefijo de CodArticulo"),
+    desde: date | None = None,
+    hasta: date | None = None,
+    page: int = Query(1, ge=1),
+    size: int | None = Query(None, ge=1, le=5000, description="Sin size se devuelven todas las filas"),
+    fast: bool = False,
+    orient: Orient = "records"
+):
+    try:
+        predictions_repo.get_job(str(job_id))
+        rows, total = predictions_repo.query_forecast(
+            str(job_id), sku_prefix=sku, desde=desde, hasta=hasta,
+            offset=(page - 1) * size if size else 0, limit=size
+        )
+    except (KeyError, LookupError) as ex:
+        raise HTTPException(status_code=404, detail=str(ex).strip("'"))
+    rows["Fechaventa"] = rows["Fechaventa"].dt.strftime("%Y-%m-%d")
+    meta = {"job_id": str(job_id), "total": total, "page": page if size else None, "size": size}
+    if fast or orient == "columns":
+        return frame_response(meta, "pronostico", rows, ForecastItem, orient)
+    return {**meta, "pronostico": frame_records(rows)}
+
+SORT_KEYS = {
+    "riesgo": "indice_riesgo_quiebre",
+    "sobrestock": "porcentaje_sobrestock",
+    "demanda": "d_media",
+    "sku": "CodArticulo",
+}
+
+@router.get("/predictions/{job_id}", response_model=PredictionPageResponse)
+def get_job(
+    job_id: UUID,
+    page: int = Query(1, ge=1),
+    size: int | None = Query(None, ge=1, le=1000, description="Sin size se devuelven todas las filas"),
+    estado: str | None = None,
+    accion: str | None = None,
+    sku: str | None = Query(None, description="Prefijo de CodArticulo"),
+    riesgo_min: float | None = None,
+    riesgo_max: float | None = None,
+    sort: Literal["riesgo", "-riesgo", "sobrestock", "-sobrestock", "demanda", "-demanda", "sku", "-sku"] | None = None,
+    fast: bool = False,
+    orient: Orient = "records"
+):
+    try:
+        j = predictions_repo.get_job(str(job_id))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="job_id no existe")
+    rows, total = predictions_repo.query_job_rows(
+        str(job_id), estado=estado, accion=accion, sku_prefix=sku,
+        riesgo_min=riesgo_min, riesgo_max=riesgo_max,
+        sort=SORT_KEYS[sort.lstrip("-")] if sort else None,
+        descending=bool(sort and sort.startswith("-")),
+        offset=(page - 1) * size if size else 0, limit=size
+    )
+    meta = {
         "job_id": j["id"],
         "summary": j.get("summary", {}),
-        "predictions": rows,
-        "generated_at": j["created_at"]
+        "generated_at": j["created_at"],
+        "total": total,
+        "page": page if size else None,
+        "size": size
     }
-
-@router.get("/predictions/export")
-def export_job(job_id: str):
-    rows = predictions_repo.get_job_rows(job_id)
-    if not rows:
-        raise HTTPException(status_code=404, detail="job_id sin contenido")
-
-    export_path = settings.EXPORT_DIR / f"predictions_{job_id}.csv"
-    with export_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-        writer.writeheader()
-        writer.writerows(rows)
-
-    # descarga directa
-    content = export_path.read_text(encoding="utf-8")
-    return Response(content, media_type="text/csv",
-                    headers={"Content-Disposition": f"attachment; filename={export_path.name}"})
+    if fast or orient == "columns":
+        return frame_response(meta, "predictions", rows, PredictionItem, orient)
+    return {**meta, "predictions": predictions_repo.rows_to_records(rows)}
@@ -12,10 +12,19 @@ def compare_real(body: CompareRequest):
         result = compare_with_real(
             job_id=body.job_id,
             ventas_real_csv_base64=body.ventas_real_csv_base64,
-            nivel=body.nivel
+            nivel=body.nivel,
+            desde=body.desde,
+            hasta=body.hasta,
+            periodo=body.periodo,
+            acumular=body.acumular,
+            page=body.page,
+            size=body.size,
+            orden=body.orden,
         )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="job_id no existe")
     except ValueError as ex:
         raise HTTPException(status_code=400, detail=str(ex))
 
     # pydantic alias para "global"
-    return CompareResponse(**{"global": result["global"], "por_sku": result["por_sku"], "observaciones": result["observaciones"]})
+    return CompareResponse(**{"global": result.pop("global"), **result})
@@ -0,0 +1,42 @@
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+from app.utils.config import settings
+
+engine = create_engine(
+    settings.DATABASE_URL,
+    # la API y los callbacks de la cola escriben desde hilos distintos
+    connect_args={"check_same_thread": False, "timeout": 30},
+)
+
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _record):
+    # WAL: lectores no bloquean al escritor (API + workers del pool en paralelo)
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA foreign_keys=ON")
+    cur.close()
+
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+
+class Base(DeclarativeBase):
+    pass
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Sesión con commit al salir y rollback si hay error."""
+    with SessionLocal() as session:
+        with session.begin():
+            yield session
+
+def as_datetime(value):
+    """Acepta datetime o texto ISO (formato de los manifiestos JSON anteriores)."""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def as_iso(value) -> str | None:
+    return value.isoformat() if value is not None else None
@@ -0,0 +1,59 @@
+"""
+Preparación de la base al arrancar (lifespan de app/main.py o
+`python -m app.manage init-db`), fuera del import de modelos y repositorios:
+
+- tablas, columnas nuevas e índices agregados a tablas ya existentes;
+- importación única de los manifiestos JSON anteriores a SQLite;
+- contadores de /predictions/summary para bases con jobs previos a ellos.
+"""
+from pathlib import Path
+from typing import Callable
+from sqlalchemy import func, inspect, select, text
+from app.database import Base, engine, session_scope
+from app.models import FileRecord, PredictionJob, TrainJob
+from app.repositories import files_repo, predictions_repo, summary_repo, train_jobs_repo
+from app.utils.io_utils import read_json
+
+def _agregar_columnas():
+    # create_all no altera tablas existentes: se agregan las columnas nuevas (nullable)
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existentes = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in existentes and col.nullable:
+                    tipo = col.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {tipo}"))
+
+def _crear_esquema():
+    Base.metadata.create_all(bind=engine)
+    _agregar_columnas()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def importar_legacy(path: Path, modelo, clave: str, registro: Callable[[dict], Base]):
+    """Carga el manifiesto JSON `path` en la tabla de `modelo` si está vacía y lo renombra."""
+    if not path.exists():
+        return
+    with session_scope() as s:
+        if s.scalar(select(func.count()).select_from(modelo)) == 0:
+            for d in read_json(path, default={clave: []})[clave]:
+                s.add(registro(d))
+    try:
+        path.rename(path.with_suffix(".json.migrado"))
+    except FileNotFoundError:
+        pass    # otro proceso ya lo importó
+
+def _asegurar_resumen():
+    # bases con jobs previos a los contadores materializados
+    if summary_repo.is_empty() and predictions_repo.hay_jobs_terminados():
+        summary_repo.rebuild()
+
+def preparar_base():
+    """Idempotente: se puede llamar en cada arranque."""
+    _crear_esquema()
+    importar_legacy(files_repo.LEGACY_MANIFEST, FileRecord, "files", files_repo.registro_legacy)
+    importar_legacy(predictions_repo.LEGACY_JOBS, PredictionJob, "jobs", predictions_repo.registro_legacy)
+    importar_legacy(train_jobs_repo.LEGACY_JOBS, TrainJob, "jobs", train_jobs_repo.registro_legacy)
+    _asegurar_resumen()
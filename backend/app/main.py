@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.router_health import router as health_router
@@ -5,12 +6,22 @@ from app.api.router_files import router as files_router
 from app.api.router_model import router as model_router
 from app.api.router_predictions import router as predictions_router
 from app.api.router_validation import router as validation_router
+from app.api.router_jobs import router as jobs_router
+from app.inicializacion import preparar_base
+from app.services import job_queue
 from app.utils.logging_conf import setup_logging
 from app.utils.config import settings
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    preparar_base()
+    job_queue.recuperar_interrumpidos()
+    yield
+    job_queue.shutdown()
+
 def create_app() -> FastAPI:
     setup_logging()
-    app = FastAPI(title="MultiTop Demand System API", version="0.3.0")
+    app = FastAPI(title="MultiTop Demand System API", version="0.3.0", lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -18,6 +29,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Cache"],
     )
 
     app.include_router(health_router, tags=["Health"])
@@ -25,6 +37,7 @@ def create_app() -> FastAPI:
     app.include_router(model_router, prefix="/api", tags=["Model"])
     app.include_router(predictions_router, prefix="/api", tags=["Predictions"])
     app.include_router(validation_router, prefix="/api", tags=["Validation"])
+    app.include_router(jobs_router, prefix="/api", tags=["Jobs"])
 
     return app
 
@@ -0,0 +1,38 @@
+"""
+Comandos de mantenimiento (ejecutar desde backend/):
+
+    python -m app.manage init-db
+    python -m app.manage rebuild-summary
+    python -m app.manage backtest <file_id> [--modo target --pliegues 4 --horizonte 28 --paso 28]
+"""
+import argparse
+import json
+from app.inicializacion import preparar_base
+from app.repositories import summary_repo
+from app.services.backtest_service import backtest_from_file
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("init-db", help="crea/actualiza tablas e importa los manifiestos JSON anteriores")
+    sub.add_parser("rebuild-summary", help="recalcula los contadores de /predictions/summary")
+    bt = sub.add_parser("backtest", help="backtest de origen móvil de un dataset guardado")
+    bt.add_argument("file_id")
+    bt.add_argument("--modo", choices=["onehot", "nativo", "target"])
+    bt.add_argument("--pliegues", type=int)
+    bt.add_argument("--horizonte", type=int)
+    bt.add_argument("--paso", type=int)
+    args = parser.parse_args(argv)
+
+    if args.comando == "init-db":
+        preparar_base()
+    elif args.comando == "rebuild-summary":
+        print(json.dumps(summary_repo.rebuild(), ensure_ascii=False))
+    elif args.comando == "backtest":
+        out = backtest_from_file(args.file_id, modo=args.modo, pliegues=args.pliegues,
+                                 horizonte=args.horizonte, paso=args.paso)
+        out.pop("por_sku")      # el detalle queda en outputs/backtest_por_sku.csv
+        print(json.dumps(out, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+from datetime import date, datetime
+from typing import Any, Optional
+from sqlalchemy import JSON, Date, DateTime, Float, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+class FileRecord(Base):
+    __tablename__ = "files"
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    filename: Mapped[str] = mapped_column(String(255))
+    rows: Mapped[int] = mapped_column(Integer, default=0)
+    detected_columns: Mapped[list] = mapped_column(JSON, default=list)
+    format: Mapped[str] = mapped_column(String(16), default="parquet")
+    bytes: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    # sha256 del CSV subido (None en archivos anteriores al caché de resultados)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+
+class PredictionJob(Base):
+    __tablename__ = "prediction_jobs"
+    # paginación por cursor del historial: (created_at, id) descendente
+    __table_args__ = (Index("ix_prediction_jobs_created_id", "created_at", "id"),)
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    status: Mapped[str] = mapped_column(String(16), default="queued", index=True)
+    # filtros como columnas (HU007) para poder indexar y filtrar el historial
+    tienda: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, index=True)
+    campania: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, index=True)
+    categoria: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, index=True)
+    summary: Mapped[dict[str, Any]] = mapped_column(JSON, default=dict)
+    total_items: Mapped[int] = mapped_column(Integer, default=0)
+    mae: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+
+class SummaryTotal(Base):
+    """Conteo acumulado por Estado de todos los jobs terminados (GET /predictions/summary)."""
+    __tablename__ = "prediction_summary_totals"
+
+    estado: Mapped[str] = mapped_column(String(32), primary_key=True)
+    items: Mapped[int] = mapped_column(Integer, default=0)
+
+class SummaryDaily(Base):
+    """Mismo conteo por día y combinación de filtros ("" = sin filtro)."""
+    __tablename__ = "prediction_summary_daily"
+
+    dia: Mapped[date] = mapped_column(Date, primary_key=True)
+    tienda: Mapped[str] = mapped_column(String(100), primary_key=True, default="")
+    campania: Mapped[str] = mapped_column(String(100), primary_key=True, default="")
+    categoria: Mapped[str] = mapped_column(String(100), primary_key=True, default="")
+    estado: Mapped[str] = mapped_column(String(32), primary_key=True)
+    items: Mapped[int] = mapped_column(Integer, default=0)
+
+class PredictionCacheEntry(Base):
+    """Corrida reutilizable: (contenido, versión de modelo, filtros) -> job con sus filas."""
+    __tablename__ = "prediction_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    job_id: Mapped[str] = mapped_column(String(36))
+    content_hash: Mapped[str] = mapped_column(String(64))
+    model_version: Mapped[str] = mapped_column(String(32))
+    filtros: Mapped[dict[str, Any]] = mapped_column(JSON, default=dict)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+
+class TrainJob(Base):
+    __tablename__ = "train_jobs"
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    status: Mapped[str] = mapped_column(String(16), default="queued", index=True)
+    params: Mapped[dict[str, Any]] = mapped_column(JSON, default=dict)
+    metrics: Mapped[Optional[dict[str, Any]]] = mapped_column(JSON, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
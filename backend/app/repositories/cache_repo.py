@@ -0,0 +1,42 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy import delete, func, select, update
+from app.database import session_scope
+from app.models import PredictionCacheEntry
+
+def get_entry(key: str) -> Optional[str]:
+    """job_id de la entrada (marcándola como usada) o None."""
+    with session_scope() as s:
+        res = s.execute(
+            update(PredictionCacheEntry)
+            .where(PredictionCacheEntry.key == key)
+            .values(last_used_at=datetime.utcnow(), hits=PredictionCacheEntry.hits + 1)
+            .returning(PredictionCacheEntry.job_id)
+        ).first()
+        return res[0] if res else None
+
+def put_entry(key: str, job_id: str, content_hash: str, model_version: str, filtros: Dict[str, Any]):
+    now = datetime.utcnow()
+    with session_scope() as s:
+        s.merge(PredictionCacheEntry(
+            key=key, job_id=job_id, content_hash=content_hash, model_version=model_version,
+            filtros=filtros, created_at=now, last_used_at=now, hits=0,
+        ))
+
+def delete_entry(key: str):
+    with session_scope() as s:
+        s.execute(delete(PredictionCacheEntry).where(PredictionCacheEntry.key == key))
+
+def evict(max_entries: int) -> int:
+    """Deja las `max_entries` entradas usadas más recientemente; devuelve cuántas borró."""
+    with session_scope() as s:
+        viejas = (
+            select(PredictionCacheEntry.key)
+            .order_by(PredictionCacheEntry.last_used_at.desc())
+            .offset(max_entries)
+        )
+        return s.execute(delete(PredictionCacheEntry).where(PredictionCacheEntry.key.in_(viejas))).rowcount
+
+def count() -> int:
+    with session_scope() as s:
+        return s.scalar(select(func.count()).select_from(PredictionCacheEntry))
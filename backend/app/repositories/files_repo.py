@@ -1,49 +1,162 @@
 import uuid
+from functools import lru_cache
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 from datetime import datetime
+from typing import Iterable, List, Optional
+from app.database import as_datetime, as_iso, session_scope
+from app.models import FileRecord
 from app.utils.config import settings
-from app.utils.io_utils import write_json, read_json
+from ml.features import BINARIAS, NUMERICAS
 
-MANIFEST = settings.STORE_DIR / "files_manifest.json"
+# manifiesto JSON anterior a la base de datos: se importa una vez
+LEGACY_MANIFEST = settings.STORE_DIR / "files_manifest.json"
 
-def _load_manifest():
-    return read_json(MANIFEST, default={"files": []})
+# columnas de texto (SKU, temporada, tienda, campaña...) se guardan como diccionario
+DICT_TYPE = pa.dictionary(pa.int32(), pa.string())
 
-def _save_manifest(data):
-    write_json(MANIFEST, data)
+def _to_dict(f: FileRecord) -> dict:
+    return {
+        "id": f.id,
+        "filename": f.filename,
+        "rows": f.rows,
+        "detected_columns": f.detected_columns or [],
+        "format": f.format,
+        "bytes": f.bytes,
+        "created_at": as_iso(f.created_at),
+        "content_hash": f.content_hash,
+    }
+
+def _schema(df: pd.DataFrame) -> pa.Schema:
+    """
+    Esquema fijo para todos los bloques. Solo las columnas requeridas tienen
+    tipo propio (mismas reglas que ml/features.tipar_df); el resto (tienda,
+    campaña, categoría...) se guarda como texto: inferirlo del primer bloque
+    convertiría en nulos los valores de texto de bloques siguientes.
+    """
+    fields = []
+    for col in df.columns:
+        if col == "Fechaventa":
+            typ = pa.timestamp("us")
+        elif col in NUMERICAS:
+            typ = pa.float64()
+        elif col in BINARIAS:
+            typ = pa.int8()
+        else:
+            typ = DICT_TYPE
+        fields.append(pa.field(str(col), typ))
+    return pa.schema(fields)
 
-def save_upload(df: pd.DataFrame, filename: str) -> dict:
+def _to_arrow(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    arrays = []
+    for field in schema:
+        s = df[field.name] if field.name in df.columns else pd.Series([None] * len(df))
+        if pa.types.is_dictionary(field.type):
+            if not isinstance(s.dtype, pd.CategoricalDtype):
+                # texto tal cual; números (p. ej. códigos de tienda) a su forma de texto
+                s = s.astype("str").where(s.notna())
+            arr = pa.array(s, from_pandas=True)
+            if not pa.types.is_dictionary(arr.type):
+                arr = arr.cast(pa.string()).dictionary_encode()
+            arr = arr.cast(DICT_TYPE)
+        elif pa.types.is_timestamp(field.type):
+            arr = pa.array(pd.to_datetime(s, errors="coerce", dayfirst=True), from_pandas=True).cast(field.type)
+        else:
+            arr = pa.array(pd.to_numeric(s, errors="coerce"), from_pandas=True).cast(field.type, safe=False)
+        arrays.append(arr)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def save_upload_chunks(chunks: Iterable[pd.DataFrame], filename: str,
+                       content_hash: Optional[str] = None) -> dict:
+    """
+    Guarda el dataset como Parquet tipado (zstd, un row group por bloque),
+    escribiendo bloque a bloque sin materializar todo el archivo en memoria.
+    """
     file_id = str(uuid.uuid4())
-    csv_path = settings.STORE_DIR / f"{file_id}.csv"
-    df.to_csv(csv_path, index=False)
+    path = settings.STORE_DIR / f"{file_id}.parquet"
+    writer: Optional[pq.ParquetWriter] = None
+    rows, columns = 0, []
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = _schema(chunk)
+                columns = list(chunk.columns)
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+            writer.write_table(_to_arrow(chunk, schema))
+            rows += len(chunk)
+    except Exception:
+        if writer is not None:
+            writer.close()
+        path.unlink(missing_ok=True)
+        raise
+    if writer is None:
+        raise ValueError("Archivo vacío")
+    writer.close()
 
-    manifest = _load_manifest()
-    manifest["files"].append({
-        "id": file_id,
-        "filename": filename,
-        "rows": len(df),
-        "detected_columns": list(df.columns),
-        "created_at": datetime.utcnow().isoformat()
-    })
-    _save_manifest(manifest)
+    with session_scope() as s:
+        s.add(FileRecord(
+            id=file_id, filename=filename, rows=rows, detected_columns=columns,
+            format="parquet", bytes=path.stat().st_size, created_at=datetime.utcnow(),
+            content_hash=content_hash
+        ))
 
     return {
         "file_id": file_id,
         "filename": filename,
-        "rows": len(df),
-        "detected_columns": list(df.columns)
+        "rows": rows,
+        "detected_columns": columns
     }
 
+def save_upload(df: pd.DataFrame, filename: str, content_hash: Optional[str] = None) -> dict:
+    return save_upload_chunks([df], filename, content_hash)
+
 def get_file(file_id: str) -> Path:
-    p = settings.STORE_DIR / f"{file_id}.csv"
-    if not p.exists():
-        raise FileNotFoundError("file_id no existe")
-    return p
+    for ext in ("parquet", "csv"):      # csv: uploads anteriores al formato columnar
+        p = settings.STORE_DIR / f"{file_id}.{ext}"
+        if p.exists():
+            return p
+    raise FileNotFoundError("file_id no existe")
+
+def read_file(file_id: str, columns: Optional[List[str]] = None,
+              filters: Optional[list] = None) -> pd.DataFrame:
+    """
+    Lee un dataset guardado con proyección de columnas y filtros empujados al
+    lector Parquet, p. ej. filters=[("tienda", "==", "Lima Centro")].
+    Las columnas diccionario vuelven como category.
+    """
+    p = get_file(file_id)
+    if p.suffix == ".csv":
+        df = pd.read_csv(p, usecols=columns, low_memory=False)
+        for col, op, val in filters or []:
+            df = df[df[col] == val] if op == "==" else df[df[col].isin(val)]
+        return df.reset_index(drop=True)
+    return pq.read_table(p, columns=columns, filters=filters or None).to_pandas()
+
+@lru_cache(maxsize=settings.DATASET_CACHE_SIZE)
+def load_dataset(file_id: str) -> pd.DataFrame:
+    """
+    Dataset completo ya tipado, cacheado por proceso (los archivos guardados
+    no cambian). Quien lo use no debe modificarlo en sitio.
+    """
+    return read_file(file_id)
+
+def features_path(file_id: str, version: int) -> Path:
+    """Ruta de la matriz de features del dataset (la arma app/services/features_service.py)."""
+    return settings.STORE_DIR / "features" / f"{file_id}.v{version}.arrow"
 
 def get_file_meta(file_id: str) -> dict:
-    m = _load_manifest()
-    for f in m["files"]:
-        if f["id"] == file_id:
-            return f
-    raise FileNotFoundError("file_id no existe")
+    with session_scope() as s:
+        f = s.get(FileRecord, file_id)
+        if f is None:
+            raise FileNotFoundError("file_id no existe")
+        return _to_dict(f)
+
+def registro_legacy(f: dict) -> FileRecord:
+    """Fila de `files` desde una entrada del manifiesto JSON anterior (LEGACY_MANIFEST)."""
+    return FileRecord(
+        id=f["id"], filename=f["filename"], rows=f.get("rows", 0),
+        detected_columns=f.get("detected_columns") or [], format=f.get("format", "csv"),
+        bytes=f.get("bytes"), created_at=as_datetime(f["created_at"])
+    )
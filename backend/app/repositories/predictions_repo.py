@@ -1,55 +1,359 @@
+import os
 import uuid
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import func, select, tuple_, update
+from app.database import as_datetime, as_iso, session_scope
+from app.models import PredictionJob
+from app.repositories import summary_repo
 from app.utils.config import settings
-from app.utils.io_utils import read_json, write_json
+from app.utils.io_utils import read_json
+from app.utils.fast_json import frame_records
 
-JOBS = settings.STORE_DIR / "prediction_jobs.json"
+# manifiesto JSON anterior a la base de datos: se importa una vez
+LEGACY_JOBS = settings.STORE_DIR / "prediction_jobs.json"
 
-def _load_jobs():
-    return read_json(JOBS, default={"jobs": []})
+FILTROS = ("tienda", "campania", "categoria")
+ROWS_DIR = settings.STORE_DIR / "preds"
+ROWS_DIR.mkdir(parents=True, exist_ok=True)
 
-def _save_jobs(data):
-    write_json(JOBS, data)
+# filas por job en Parquet: Estado/Accion (pocos valores) como diccionario;
+# CodArticulo es único por fila, así que va como texto plano
+TEXT_COLS = ["CodArticulo", "Estado", "Accion"]
+ROW_SCHEMA = pa.schema(
+    [pa.field("CodArticulo", pa.string())]
+    + [pa.field(c, pa.float64()) for c in (
+        "d_media", "d_sigma", "StockMes", "horizon", "seguridad", "stock_objetivo",
+        "dias_cobertura", "porcentaje_sobrestock", "indice_riesgo_quiebre")]
+    + [pa.field(c, pa.dictionary(pa.int32(), pa.string())) for c in ("Estado", "Accion")]
+)
+ROW_COLS = ROW_SCHEMA.names
+ROW_GROUP = 10_000
+# columna auxiliar de desempate al ordenar en query_job_rows
+_POSICION = "__posicion"
 
-def save_run(filtros: Dict[str, Any], preds: List[Dict[str, Any]], summary: Dict[str, int]) -> Tuple[str, Path]:
+# pronóstico diario hacia adelante (ml/pronostico.py), ordenado por (SKU, paso)
+FORECAST_DIR = settings.STORE_DIR / "forecasts"
+FORECAST_DIR.mkdir(parents=True, exist_ok=True)
+FORECAST_SCHEMA = pa.schema([
+    pa.field("CodArticulo", pa.string()),
+    pa.field("Fechaventa", pa.date32()),
+    pa.field("paso", pa.int16()),
+    pa.field("Pred", pa.float64()),
+])
+FORECAST_COLS = FORECAST_SCHEMA.names
+FORECAST_ROW_GROUP = 100_000
+
+# ventas reales ya cruzadas con el pronóstico (compare_service con acumular)
+COMPARE_DIR = settings.STORE_DIR / "comparaciones"
+COMPARE_DIR.mkdir(parents=True, exist_ok=True)
+
+def _to_dict(j: PredictionJob) -> dict:
+    return {
+        "id": j.id,
+        "created_at": as_iso(j.created_at),
+        "finished_at": as_iso(j.finished_at),
+        "filters": {k: getattr(j, k) for k in FILTROS},
+        "summary": j.summary or {},
+        "total_items": j.total_items,
+        "mae": j.mae,
+        "status": j.status,
+        "error": j.error,
+    }
+
+def _columnas(fields: Dict[str, Any]) -> Dict[str, Any]:
+    cols = dict(fields)
+    filtros = cols.pop("filters", None)
+    if filtros is not None:
+        cols.update({k: filtros.get(k) for k in FILTROS})
+    for k in ("created_at", "finished_at"):
+        if k in cols:
+            cols[k] = as_datetime(cols[k])
+    return cols
+
+def create_job(filtros: Dict[str, Any], status: str = "queued") -> str:
     job_id = str(uuid.uuid4())
-    created_at = datetime.utcnow().isoformat()
-
-    # guardar filas en json por job
-    job_file = settings.STORE_DIR / f"preds_{job_id}.json"
-    write_json(job_file, preds)
-
-    jobs = _load_jobs()
-    jobs["jobs"].append({
-        "id": job_id,
-        "created_at": created_at,
-        "filters": filtros or {},
-        "summary": summary,
-        "total_items": len(preds),
-        "mae": None
-    })
-    _save_jobs(jobs)
-    return job_id, job_file
+    with session_scope() as s:
+        s.add(PredictionJob(id=job_id, created_at=datetime.utcnow(), status=status,
+                            summary={}, total_items=0, **_columnas({"filters": filtros or {}})))
+    return job_id
+
+def update_job(job_id: str, **fields):
+    with session_scope() as s:
+        res = s.execute(update(PredictionJob).where(PredictionJob.id == job_id).values(**_columnas(fields)))
+        if res.rowcount == 0:
+            raise KeyError("job_id no existe")
+
+def fail_unfinished(error: str, excepto: Iterable[str] = ()) -> int:
+    """Marca como fallidos los jobs queued/running (salvo `excepto`); devuelve cuántos."""
+    with session_scope() as s:
+        res = s.execute(
+            update(PredictionJob)
+            .where(PredictionJob.status.in_(("queued", "running")), PredictionJob.id.not_in(list(excepto)))
+            .values(status="failed", error=error, finished_at=datetime.utcnow())
+        )
+        return res.rowcount
+
+def rows_path(job_id: str) -> Path:
+    return ROWS_DIR / f"{job_id}.parquet"
+
+def _write_rows(job_id: str, preds: List[Dict[str, Any]] | pd.DataFrame):
+    if isinstance(preds, pd.DataFrame):
+        table = pa.Table.from_pandas(preds[ROW_COLS], preserve_index=False)
+    else:
+        table = pa.table({
+            c: pa.array([p.get(c) for p in preds],
+                        type=pa.string() if c in TEXT_COLS else pa.float64(), from_pandas=True)
+            for c in ROW_COLS
+        })
+    table = table.cast(ROW_SCHEMA)
+    path = rows_path(job_id)
+    tmp = path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp, compression="zstd", row_group_size=ROW_GROUP)
+    os.replace(tmp, path)
+
+def complete_job(job_id: str, preds: List[Dict[str, Any]] | pd.DataFrame, summary: Dict[str, int]) -> int:
+    # filas en Parquet antes de marcar el job como terminado
+    _write_rows(job_id, preds)
+    with session_scope() as s:
+        job = s.get(PredictionJob, job_id)
+        if job is None:
+            raise KeyError("job_id no existe")
+        job.summary, job.total_items = summary, len(preds)
+        job.status, job.finished_at = "done", datetime.utcnow()
+        # contadores de /predictions/summary al día en la misma transacción
+        summary_repo.add_job(s, job, summary)
+    return len(preds)
+
+def save_run(filtros: Dict[str, Any], preds: List[Dict[str, Any]] | pd.DataFrame,
+             summary: Dict[str, int]) -> Tuple[str, int]:
+    job_id = create_job(filtros, status="running")
+    n = complete_job(job_id, preds, summary)
+    return job_id, n
 
 def list_jobs() -> list[dict]:
-    return _load_jobs()["jobs"][::-1]
+    with session_scope() as s:
+        jobs = s.scalars(select(PredictionJob).order_by(PredictionJob.created_at.desc(), PredictionJob.id.desc()))
+        return [_to_dict(j) for j in jobs]
+
+def list_jobs_page(size: int, cursor: Optional[Tuple[str, str]] = None, offset: int = 0,
+                   desde: Optional[date] = None, hasta: Optional[date] = None,
+                   filtros: Optional[Dict[str, Any]] = None,
+                   mae_min: Optional[float] = None, mae_max: Optional[float] = None
+                   ) -> Tuple[list[dict], Optional[Tuple[str, str]]]:
+    """
+    Página del historial (más recientes primero) filtrada en la base.
+
+    `cursor` es la clave (created_at, id) del último job de la página anterior:
+    la consulta sigue el índice desde ahí sin recorrer los jobs ya vistos.
+    Devuelve los jobs y la clave para pedir la página siguiente (None si no hay).
+    """
+    q = select(PredictionJob)
+    if desde is not None:
+        q = q.where(PredictionJob.created_at >= datetime.combine(desde, datetime.min.time()))
+    if hasta is not None:
+        q = q.where(PredictionJob.created_at < datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+    for k, v in (filtros or {}).items():
+        if k in FILTROS and v:
+            q = q.where(getattr(PredictionJob, k) == v)
+    if mae_min is not None:
+        q = q.where(PredictionJob.mae >= mae_min)
+    if mae_max is not None:
+        q = q.where(PredictionJob.mae <= mae_max)
+    if cursor is not None:
+        q = q.where(tuple_(PredictionJob.created_at, PredictionJob.id) < (as_datetime(cursor[0]), cursor[1]))
+    elif offset:
+        q = q.offset(offset)
+    q = q.order_by(PredictionJob.created_at.desc(), PredictionJob.id.desc()).limit(size + 1)
+
+    with session_scope() as s:
+        jobs = [_to_dict(j) for j in s.scalars(q)]
+    if len(jobs) <= size:
+        return jobs, None
+    jobs = jobs[:size]
+    return jobs, (jobs[-1]["created_at"], jobs[-1]["id"])
 
 def get_job(job_id: str) -> dict:
-    for j in _load_jobs()["jobs"]:
-        if j["id"] == job_id:
-            return j
-    raise KeyError("job_id no existe")
+    with session_scope() as s:
+        j = s.get(PredictionJob, job_id)
+        if j is None:
+            raise KeyError("job_id no existe")
+        return _to_dict(j)
+
+def _legacy_rows(job_id: str) -> pd.DataFrame:
+    # jobs guardados antes del formato columnar
+    return pd.DataFrame(read_json(settings.STORE_DIR / f"preds_{job_id}.json", default=[]))
+
+def _job_table(job_id: str, columns: Optional[List[str]] = None,
+               filters: Optional[list] = None) -> pa.Table:
+    path = rows_path(job_id)
+    if path.exists():
+        return pq.read_table(path, columns=columns, filters=filters or None)
+    legacy = _legacy_rows(job_id)
+    if legacy.empty:
+        return pa.table({c: pa.array([], type=ROW_SCHEMA.field(c).type) for c in columns or ROW_COLS})
+    table = pa.Table.from_pandas(legacy, preserve_index=False)
+    if filters:
+        table = table.filter(pq.filters_to_expression(filters))
+    return table.select(columns) if columns else table
+
+def read_job_rows(job_id: str, columns: Optional[List[str]] = None,
+                  filters: Optional[list] = None) -> pd.DataFrame:
+    """
+    Filas del job leyendo solo `columns`; `filters` se empuja al lector
+    Parquet, p. ej. [("Estado", "==", "Quiebre Potencial")].
+    Estado y Accion vuelven como category.
+    """
+    return _job_table(job_id, columns, filters).to_pandas()
 
-def get_job_rows(job_id: str) -> List[Dict[str, Any]]:
-    path = settings.STORE_DIR / f"preds_{job_id}.json"
-    return read_json(path, default=[])
+def query_job_rows(job_id: str, estado: Optional[str] = None, accion: Optional[str] = None,
+                   sku_prefix: Optional[str] = None, riesgo_min: Optional[float] = None,
+                   riesgo_max: Optional[float] = None, sort: Optional[str] = None,
+                   descending: bool = False, offset: int = 0,
+                   limit: Optional[int] = None) -> Tuple[pd.DataFrame, int]:
+    """
+    Página de filas del job filtrada y ordenada sin pasar por Python fila a fila.
+
+    Estado, Accion y el rango de riesgo se empujan al lector Parquet (las
+    estadísticas por row group descartan bloques completos); el prefijo de SKU
+    y el orden se resuelven con kernels de Arrow. Con `limit` y `sort` solo se
+    seleccionan las primeras offset+limit filas (top-k) antes de ordenar.
+    Devuelve la página y el total de filas que cumplen los filtros.
+    """
+    filters = []
+    if estado:
+        filters.append(("Estado", "==", estado))
+    if accion:
+        filters.append(("Accion", "==", accion))
+    if riesgo_min is not None:
+        filters.append(("indice_riesgo_quiebre", ">=", riesgo_min))
+    if riesgo_max is not None:
+        filters.append(("indice_riesgo_quiebre", "<=", riesgo_max))
+    table = _job_table(job_id, filters=filters)
+    if sku_prefix:
+        table = table.filter(pc.starts_with(table.column("CodArticulo").cast(pa.string()), sku_prefix))
+    total = table.num_rows
+
+    if sort:
+        # desempate por posición de guardado: con valores repetidos las páginas
+        # no se solapan ni saltan filas entre una consulta y la siguiente
+        table = table.append_column(_POSICION, pa.array(np.arange(total, dtype=np.int64)))
+        keys = [(sort, "descending" if descending else "ascending"), (_POSICION, "ascending")]
+        if limit is not None and offset + limit < total:
+            table = pc.take(table, pc.select_k_unstable(table, k=offset + limit, sort_keys=keys))
+        table = table.sort_by(keys).drop_columns([_POSICION])
+    if limit is not None:
+        table = table.slice(offset, limit)
+    elif offset:
+        table = table.slice(offset)
+    return table.to_pandas(), total
+
+def rows_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return frame_records(df)
+
+def get_job_rows(job_id: str, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    return rows_to_records(read_job_rows(job_id, columns=columns))
+
+def iter_job_rows(job_id: str, columns: Optional[List[str]] = None, estado: Optional[str] = None,
+                  chunk_size: int = 5000) -> Iterator[pd.DataFrame]:
+    """
+    Filas del job en bloques de hasta `chunk_size` (en orden de guardado),
+    solo con `columns` y opcionalmente de un Estado, sin leer el archivo completo.
+    """
+    cols = columns or ROW_COLS
+    path = rows_path(job_id)
+    if not path.exists():
+        df = read_job_rows(job_id, filters=[("Estado", "==", estado)] if estado else None)
+        for i in range(0, len(df), chunk_size):
+            yield df.iloc[i:i + chunk_size][cols].reset_index(drop=True)
+        return
+    leer = cols if not estado or "Estado" in cols else cols + ["Estado"]
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=leer):
+        if estado:
+            batch = batch.filter(pc.equal(batch.column("Estado").cast(pa.string()), estado))
+            if batch.num_rows == 0:
+                continue
+        yield batch.select(cols).to_pandas()
+
+def forecast_path(job_id: str) -> Path:
+    return FORECAST_DIR / f"{job_id}.parquet"
+
+def save_forecast(job_id: str, df: pd.DataFrame) -> int:
+    table = pa.Table.from_pandas(df[FORECAST_COLS], preserve_index=False).cast(FORECAST_SCHEMA)
+    path = forecast_path(job_id)
+    tmp = path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp, compression="zstd", row_group_size=FORECAST_ROW_GROUP)
+    os.replace(tmp, path)
+    return table.num_rows
+
+def _forecast_filters(skus: Optional[List[str]], desde: Optional[date], hasta: Optional[date]) -> list:
+    filters = []
+    if skus is not None:
+        filters.append(("CodArticulo", "in", list(skus)))
+    if desde is not None:
+        filters.append(("Fechaventa", ">=", desde))
+    if hasta is not None:
+        filters.append(("Fechaventa", "<=", hasta))
+    return filters
+
+def read_forecast(job_id: str, columns: Optional[List[str]] = None, skus: Optional[List[str]] = None,
+                  desde: Optional[date] = None, hasta: Optional[date] = None) -> pd.DataFrame:
+    """
+    Pronóstico diario del job; SKUs y rango de fechas se empujan al lector.
+    Fechaventa vuelve como datetime64. LookupError si el job no tiene pronóstico.
+    """
+    path = forecast_path(job_id)
+    if not path.exists():
+        raise LookupError("El job no tiene pronóstico")
+    table = pq.read_table(path, columns=columns, filters=_forecast_filters(skus, desde, hasta) or None)
+    return table.to_pandas(date_as_object=False)
+
+def query_forecast(job_id: str, sku_prefix: Optional[str] = None, desde: Optional[date] = None,
+                   hasta: Optional[date] = None, offset: int = 0,
+                   limit: Optional[int] = None) -> Tuple[pd.DataFrame, int]:
+    """Página del pronóstico (en orden de SKU y paso) y total de filas que cumplen los filtros."""
+    path = forecast_path(job_id)
+    if not path.exists():
+        raise LookupError("El job no tiene pronóstico")
+    table = pq.read_table(path, filters=_forecast_filters(None, desde, hasta) or None)
+    if sku_prefix:
+        table = table.filter(pc.starts_with(table.column("CodArticulo"), sku_prefix))
+    total = table.num_rows
+    table = table.slice(offset, limit) if limit is not None else table.slice(offset)
+    return table.to_pandas(date_as_object=False), total
+
+def comparison_path(job_id: str) -> Path:
+    return COMPARE_DIR / f"{job_id}.parquet"
+
+def read_comparison(job_id: str) -> Optional[pd.DataFrame]:
+    path = comparison_path(job_id)
+    return pq.read_table(path).to_pandas() if path.exists() else None
+
+def save_comparison(job_id: str, df: pd.DataFrame):
+    path = comparison_path(job_id)
+    tmp = path.with_suffix(".parquet.tmp")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, compression="zstd")
+    os.replace(tmp, path)
 
 def set_job_mae(job_id: str, mae: float):
-    data = _load_jobs()
-    for j in data["jobs"]:
-        if j["id"] == job_id:
-            j["mae"] = mae
-            break
-    _save_jobs(data)
+    update_job(job_id, mae=mae)
+
+def registro_legacy(j: dict) -> PredictionJob:
+    """Fila de `prediction_jobs` desde una entrada del manifiesto JSON anterior (LEGACY_JOBS)."""
+    return PredictionJob(
+        id=j["id"], status=j.get("status", "done"), summary=j.get("summary") or {},
+        total_items=j.get("total_items", 0), mae=j.get("mae"), error=j.get("error"),
+        **_columnas({"filters": j.get("filters") or {}, "created_at": j["created_at"],
+                     "finished_at": j.get("finished_at")})
+    )
+
+def hay_jobs_terminados() -> bool:
+    with session_scope() as s:
+        return bool(s.scalar(select(func.count()).select_from(PredictionJob)
+                             .where(PredictionJob.status == "done")))
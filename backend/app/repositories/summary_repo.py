@@ -0,0 +1,75 @@
+from datetime import date
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from app.database import session_scope
+from app.models import PredictionJob, SummaryDaily, SummaryTotal
+
+FILTROS = ("tienda", "campania", "categoria")
+
+def _upsert(s: Session, model, keys: Dict[str, Any], items: int):
+    stmt = insert(model).values(**keys, items=items)
+    s.execute(stmt.on_conflict_do_update(
+        index_elements=list(keys), set_={"items": model.items + stmt.excluded["items"]}
+    ))
+
+def add_job(s: Session, job: PredictionJob, summary: Dict[str, int]):
+    """Suma el resumen de un job recién terminado (dentro de su misma transacción)."""
+    base = {"dia": job.created_at.date(), **{k: getattr(job, k) or "" for k in FILTROS}}
+    for estado, n in (summary or {}).items():
+        _upsert(s, SummaryTotal, {"estado": estado}, int(n))
+        _upsert(s, SummaryDaily, {**base, "estado": estado}, int(n))
+
+def _daily_query(cols, desde: Optional[date], hasta: Optional[date], filtros: Optional[Dict[str, Any]]):
+    q = select(*cols)
+    if desde is not None:
+        q = q.where(SummaryDaily.dia >= desde)
+    if hasta is not None:
+        q = q.where(SummaryDaily.dia <= hasta)
+    for k, v in (filtros or {}).items():
+        if k in FILTROS and v:
+            q = q.where(getattr(SummaryDaily, k) == v)
+    return q
+
+def get_summary(desde: Optional[date] = None, hasta: Optional[date] = None,
+                filtros: Optional[Dict[str, Any]] = None) -> dict:
+    """
+    Totales por Estado. Sin filtros se leen los contadores globales (una fila
+    por Estado); con filtros se agregan los contadores diarios.
+    """
+    with session_scope() as s:
+        if desde is None and hasta is None and not any((filtros or {}).values()):
+            rows = s.execute(select(SummaryTotal.estado, SummaryTotal.items)).all()
+        else:
+            q = _daily_query([SummaryDaily.estado, func.sum(SummaryDaily.items)], desde, hasta, filtros)
+            rows = s.execute(q.group_by(SummaryDaily.estado)).all()
+    estados = {e: int(n) for e, n in rows if n}
+    return {"total": sum(estados.values()), "estados": estados}
+
+def get_daily(desde: Optional[date] = None, hasta: Optional[date] = None,
+              filtros: Optional[Dict[str, Any]] = None) -> List[dict]:
+    q = _daily_query([SummaryDaily.dia, SummaryDaily.estado, func.sum(SummaryDaily.items)], desde, hasta, filtros)
+    with session_scope() as s:
+        rows = s.execute(q.group_by(SummaryDaily.dia, SummaryDaily.estado).order_by(SummaryDaily.dia)).all()
+    dias: Dict[date, dict] = {}
+    for dia, estado, n in rows:
+        d = dias.setdefault(dia, {"dia": dia.isoformat(), "total": 0, "estados": {}})
+        d["estados"][estado] = int(n)
+        d["total"] += int(n)
+    return list(dias.values())
+
+def rebuild() -> dict:
+    """Recalcula los contadores desde los jobs terminados (reparación de consistencia)."""
+    with session_scope() as s:
+        s.execute(delete(SummaryTotal))
+        s.execute(delete(SummaryDaily))
+        jobs = s.scalars(select(PredictionJob).where(PredictionJob.status == "done")
+                         .execution_options(yield_per=1000))
+        for job in jobs:
+            add_job(s, job, job.summary)
+    return get_summary()
+
+def is_empty() -> bool:
+    with session_scope() as s:
+        return s.scalar(select(func.count()).select_from(SummaryTotal)) == 0
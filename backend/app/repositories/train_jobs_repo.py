@@ -0,0 +1,75 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable
+from sqlalchemy import select, update
+from app.database import as_datetime, as_iso, session_scope
+from app.models import TrainJob
+from app.utils.config import settings
+from app.utils.io_utils import read_json, write_json
+
+LEGACY_JOBS = settings.STORE_DIR / "train_jobs.json"
+
+def _to_dict(j: TrainJob) -> dict:
+    return {
+        "id": j.id,
+        "created_at": as_iso(j.created_at),
+        "finished_at": as_iso(j.finished_at),
+        "params": j.params or {},
+        "status": j.status,
+        "metrics": j.metrics,
+        "error": j.error,
+    }
+
+def create_job(params: Dict[str, Any]) -> str:
+    job_id = str(uuid.uuid4())
+    with session_scope() as s:
+        s.add(TrainJob(id=job_id, created_at=datetime.utcnow(), params=params or {}, status="queued"))
+    return job_id
+
+def update_job(job_id: str, **fields):
+    for k in ("created_at", "finished_at"):
+        if k in fields:
+            fields[k] = as_datetime(fields[k])
+    with session_scope() as s:
+        res = s.execute(update(TrainJob).where(TrainJob.id == job_id).values(**fields))
+        if res.rowcount == 0:
+            raise KeyError("job_id no existe")
+
+def fail_unfinished(error: str, excepto: Iterable[str] = ()) -> int:
+    """Marca como fallidos los jobs queued/running (salvo `excepto`); devuelve cuántos."""
+    with session_scope() as s:
+        res = s.execute(
+            update(TrainJob)
+            .where(TrainJob.status.in_(("queued", "running")), TrainJob.id.not_in(list(excepto)))
+            .values(status="failed", error=error, finished_at=datetime.utcnow())
+        )
+        return res.rowcount
+
+def complete_job(job_id: str, result: Dict[str, Any]):
+    # el resultado completo (alertas, plot_data) va aparte; en el registro solo métricas
+    write_json(settings.STORE_DIR / f"train_{job_id}.json", result)
+    metrics = {k: result.get(k) for k in ("mae", "mape", "wape", "smape", "bias", "precision", "model_version")}
+    update_job(job_id, status="done", metrics=metrics, finished_at=datetime.utcnow())
+
+def list_jobs() -> list[dict]:
+    with session_scope() as s:
+        jobs = s.scalars(select(TrainJob).order_by(TrainJob.created_at.desc(), TrainJob.id.desc()))
+        return [_to_dict(j) for j in jobs]
+
+def get_job(job_id: str) -> dict:
+    with session_scope() as s:
+        j = s.get(TrainJob, job_id)
+        if j is None:
+            raise KeyError("job_id no existe")
+        return _to_dict(j)
+
+def get_job_result(job_id: str) -> Dict[str, Any] | None:
+    return read_json(settings.STORE_DIR / f"train_{job_id}.json", default=None)
+
+def registro_legacy(j: dict) -> TrainJob:
+    """Fila de `train_jobs` desde una entrada del manifiesto JSON anterior (LEGACY_JOBS)."""
+    return TrainJob(
+        id=j["id"], created_at=as_datetime(j["created_at"]),
+        finished_at=as_datetime(j.get("finished_at")), params=j.get("params") or {},
+        status=j.get("status", "done"), metrics=j.get("metrics"), error=j.get("error")
+    )
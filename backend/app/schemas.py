@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Optional, Literal
+from typing import Annotated, List, Dict, Any, Optional, Literal
 from pydantic import BaseModel, Field, ConfigDict
 
 # Files
@@ -19,8 +19,26 @@ class TrainResponse(BaseModel):
     importancia: List[Dict[str, Any]]
     alerta: List[Dict[str, Any]]
     plot_data: List[Dict[str, Any]]
+    model_version: Optional[str] = None
+    modo: Optional[str] = None
+    params: Optional[Dict[str, Any]] = None         # solo con tuning=true
+    tuning: Optional[Dict[str, Any]] = None
 
 # Predictions
+class BacktestResponse(BaseModel):
+    mae: float
+    mape: float
+    wape: float
+    smape: float
+    bias: float
+    modo: str
+    n_pliegues: int
+    horizonte: int
+    paso: int
+    workers: Optional[int] = None                   # procesos que corrieron los pliegues
+    pliegues: List[Dict[str, Any]]
+    por_sku: List[Dict[str, Any]]
+
 class PredictionItem(BaseModel):
     CodArticulo: str
     d_media: float
@@ -41,6 +59,59 @@ class PredictionRunResponse(BaseModel):
     predictions: List[PredictionItem]
     generated_at: str
 
+class EscenarioFiltros(BaseModel):
+    tienda: Optional[str] = None
+    campania: Optional[str] = None
+    categoria: Optional[str] = None
+
+class PredictionBatchRequest(BaseModel):
+    escenarios: List[EscenarioFiltros] = Field(..., min_length=1, max_length=200)
+
+class BatchScenarioItem(BaseModel):
+    job_id: str
+    filtros: Dict[str, Any]
+    summary: Dict[str, int]
+    total_items: int
+
+class PredictionBatchResponse(BaseModel):
+    generated_at: str
+    escenarios: List[BatchScenarioItem]     # un job por escenario, en el orden pedido
+
+class ForecastItem(BaseModel):
+    CodArticulo: str
+    Fechaventa: str
+    paso: int
+    Pred: float
+
+class ForecastRunResponse(BaseModel):
+    job_id: str
+    summary: Dict[str, int]
+    horizonte: int
+    n_skus: int                     # SKUs con historia suficiente para pronosticar
+    filas: int
+    generated_at: str
+
+class ForecastPageResponse(BaseModel):
+    job_id: str
+    total: int
+    page: Optional[int] = None
+    size: Optional[int] = None
+    pronostico: List[ForecastItem]
+
+class WhatIfRequest(BaseModel):
+    niveles_servicio: List[Annotated[float, Field(gt=0, lt=1)]] = Field(..., min_length=1, max_length=50)
+    multiplicadores: List[Annotated[float, Field(gt=0)]] = Field([1.0], min_length=1, max_length=50)
+
+class WhatIfResponse(BaseModel):
+    job_id: str
+    n_skus: int
+    grilla: List[Dict[str, Any]]    # una fila por (nivel_servicio, multiplicador)
+
+class PredictionPageResponse(PredictionRunResponse):
+    total: int                      # filas que cumplen los filtros
+    page: Optional[int] = None
+    size: Optional[int] = None
+
 class HistoryItem(BaseModel):
     job_id: str
     created_at: str
@@ -52,6 +123,26 @@ class SummaryResponse(BaseModel):
     total: int
     estados: Dict[str, int]
 
+class DailySummaryItem(BaseModel):
+    dia: str
+    total: int
+    estados: Dict[str, int]
+
+# Jobs
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    tipo: Literal["prediction", "train"]
+    status: Literal["queued", "running", "done", "failed"]
+    created_at: str
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+    metrics: Optional[Dict[str, Any]] = None
+    summary: Optional[Dict[str, int]] = None
+
 # Validation
 class CompareRequest(BaseModel):
     job_id: str
@@ -59,9 +150,18 @@ class CompareRequest(BaseModel):
     nivel: Literal["SKU", "Categoria", "Global"] = "SKU"   # ← en lugar de regex
     desde: Optional[str] = None
     hasta: Optional[str] = None
+    periodo: Optional[Literal["dia", "semana", "mes"]] = None
+    acumular: bool = False                                  # suma estas ventas a las ya cargadas del job
+    page: int = Field(1, ge=1)
+    size: Optional[int] = Field(None, ge=1, le=5000)
+    orden: Literal["clave", "mae", "wape"] = "clave"
 
 class CompareResponse(BaseModel):
     model_config = ConfigDict(populate_by_name=True)       # ← para usar alias al serializar
-    global_: Dict[str, float] = Field(..., alias="global")
-    por_sku: List[Dict[str, Any]]
+    global_: Dict[str, Optional[float]] = Field(..., alias="global")
+    por_sku: List[Dict[str, Any]]                           # una fila por grupo de `nivel`
+    total: int = 0
+    page: Optional[int] = None
+    size: Optional[int] = None
+    por_periodo: Optional[List[Dict[str, Any]]] = None
     observaciones: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,40 @@
+from ml.backtest import backtest
+from ml.procesos import workers_para
+from app.services.features_service import features_from_file
+from app.utils.config import settings
+
+def _redondear(m: dict) -> dict:
+    return {k: round(v, 2) if isinstance(v, float) else v for k, v in m.items()}
+
+def backtest_en_paralelo(pliegues: int | None = None) -> bool:
+    # los pliegues se reparten en procesos: se coordina desde un hilo de la API
+    return workers_para(settings.BACKTEST_WORKERS or None, pliegues or settings.BACKTEST_FOLDS) > 1
+
+def backtest_from_file(file_id: str, modo: str | None = None, pliegues: int | None = None,
+                       horizonte: int | None = None, paso: int | None = None) -> dict:
+    """
+    Backtest de origen móvil sobre un dataset guardado. El detalle por
+    (SKU, pliegue) queda en outputs/backtest_por_sku.csv; la respuesta lleva
+    las métricas globales en el primer nivel (como un entrenamiento) más el
+    detalle por pliegue y por SKU.
+    """
+    out = backtest(
+        features_from_file(file_id),
+        modo=modo or settings.TRAIN_MODE,
+        n_pliegues=pliegues or settings.BACKTEST_FOLDS,
+        horizonte=horizonte or settings.BACKTEST_HORIZON,
+        paso=paso or settings.BACKTEST_STEP,
+        workers=settings.BACKTEST_WORKERS or None,
+        early_stopping_rounds=settings.EARLY_STOPPING_ROUNDS or None,
+    )
+    out["por_sku_pliegue"].round(4).to_csv(settings.OUTPUT_DIR / "backtest_por_sku.csv", index=False)
+    return {
+        **_redondear(out["global"]),
+        "modo": out["modo"],
+        "n_pliegues": out["n_pliegues"],
+        "horizonte": out["horizonte"],
+        "paso": out["paso"],
+        "workers": out["workers"],
+        "pliegues": [_redondear(p) for p in out["pliegues"].to_dict(orient="records")],
+        "por_sku": out["por_sku"].round(2).to_dict(orient="records"),
+    }
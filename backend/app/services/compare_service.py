@@ -1,52 +1,194 @@
+"""
+Comparación de un job contra ventas reales.
+
+Las ventas reales se llevan a (SKU, día) (varias tiendas se suman: la
+predicción es por SKU) y se cruzan con el pronóstico del job: el diario de
+/predictions/forecast si el job lo tiene; si no, d_media (demanda diaria
+media) del SKU para cada día. MAE, MAPE y WAPE salen de sumas por grupo
+(SKU, categoría o global, y por día/semana/mes) hechas con bincount sobre las
+filas cruzadas, en una pasada.
+
+Con `acumular` las filas cruzadas quedan guardadas con el job y cada llamada
+solo cruza las ventas nuevas (un mismo SKU y día se reemplaza); las métricas
+se calculan sobre todo lo acumulado.
+"""
 import base64
 import io
+import threading
 import pandas as pd
 import numpy as np
-from typing import Dict, List
-from app.repositories.predictions_repo import get_job_rows, set_job_mae
+from typing import Dict, Optional
+from app.repositories.predictions_repo import (
+    forecast_path, get_job, read_comparison, read_forecast, read_job_rows, save_comparison, set_job_mae
+)
+
+NIVELES = {"SKU": "CodArticulo", "Categoria": "categoria", "Global": None}
+PERIODOS = {"dia": "D", "semana": "W", "mes": "M"}
+ORDEN = {"mae": "MAE", "wape": "WAPE"}
+SIN_CATEGORIA = "Sin categoria"     # ventas acumuladas de archivos sin columna categoria
+
+# un lock por job: acumular es leer → unir → guardar las filas del job
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+SUMAS = ["n", "abs_err", "ape", "n_ape", "Real", "Pred"]
+
+def leer_reales(ventas_real_csv_base64: str) -> pd.DataFrame:
+    """(CodArticulo, Fechaventa, Real[, categoria]) con una fila por SKU y día."""
+    real_df = pd.read_csv(io.BytesIO(base64.b64decode(ventas_real_csv_base64)))
+    faltan = [c for c in ("CodArticulo", "Fechaventa", "CantidadVendida") if c not in real_df.columns]
+    if faltan:
+        raise ValueError(f"Faltan columnas en las ventas reales: {faltan}")
+    real = pd.DataFrame({
+        "CodArticulo": real_df["CodArticulo"].astype(str),
+        "Fechaventa": pd.to_datetime(real_df["Fechaventa"], errors="coerce", dayfirst=True)
+                        .dt.normalize().astype("datetime64[s]"),
+        "Real": pd.to_numeric(real_df["CantidadVendida"], errors="coerce"),
+    })
+    agregados = {"Real": ("Real", "sum")}
+    if "categoria" in real_df.columns:
+        real["categoria"] = real_df["categoria"].astype("string")
+        agregados["categoria"] = ("categoria", "first")
+    real = real.dropna(subset=["Fechaventa", "Real"])
+    return real.groupby(["CodArticulo", "Fechaventa"], sort=False).agg(**agregados).reset_index()
+
+def cruzar(job_id: str, real: pd.DataFrame) -> pd.DataFrame:
+    """Agrega `Pred` a cada fila real; quedan solo las que tienen pronóstico."""
+    if real.empty:
+        return real.assign(Pred=np.zeros(0))
+    if forecast_path(job_id).exists():
+        pron = read_forecast(
+            job_id, columns=["CodArticulo", "Fechaventa", "Pred"],
+            desde=real["Fechaventa"].min().date(), hasta=real["Fechaventa"].max().date(),
+        )
+        pron["Fechaventa"] = pron["Fechaventa"].astype("datetime64[s]")
+        return real.merge(pron, on=["CodArticulo", "Fechaventa"], how="inner")
+    preds = read_job_rows(job_id, columns=["CodArticulo", "d_media"])
+    idx = pd.Index(preds["CodArticulo"].astype(str)).get_indexer(real["CodArticulo"])
+    return real[idx >= 0].assign(Pred=preds["d_media"].to_numpy(dtype=float)[idx[idx >= 0]])
+
+def _sumas(codigos: np.ndarray, n_grupos: int, real: np.ndarray, pred: np.ndarray) -> Dict[str, np.ndarray]:
+    # términos por fila una vez; cada suma es un bincount sobre los códigos de grupo
+    abs_err = np.abs(real - pred)
+    con_real = real != 0
+    ape = np.divide(abs_err, np.abs(real), out=np.zeros_like(abs_err), where=con_real)
+    pesos = {"abs_err": abs_err, "ape": ape, "n_ape": con_real, "Real": real, "Pred": pred}
+    out = {"n": np.bincount(codigos, minlength=n_grupos)}
+    out.update({k: np.bincount(codigos, weights=w, minlength=n_grupos) for k, w in pesos.items()})
+    return out
+
+def _metricas(s: Dict[str, np.ndarray]) -> pd.DataFrame:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({
+            "n": s["n"],
+            "Real": s["Real"],
+            "Pred": s["Pred"],
+            "MAE": s["abs_err"] / s["n"],
+            "MAPE": np.where(s["n_ape"] > 0, s["ape"] / s["n_ape"], np.nan),
+            "WAPE": np.where(s["Real"] != 0, s["abs_err"] / np.abs(s["Real"]), np.nan),
+            "bias": np.where(s["Real"] != 0, (s["Pred"] - s["Real"]) / np.abs(s["Real"]), np.nan),
+        })
+
+def _registros(df: pd.DataFrame) -> list:
+    # NaN -> None y 3 decimales
+    df = df.round(3).astype(object)
+    return df.where(df.notna(), None).to_dict(orient="records")
+
+def _lock_job(job_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(job_id, threading.Lock())
 
-def _mae(y_true, y_pred):
-    return float(np.mean(np.abs(np.array(y_true) - np.array(y_pred))))
+def _acumular(job_id: str, nuevas: pd.DataFrame | None) -> pd.DataFrame | None:
+    """Filas ya guardadas del job más `nuevas` (el mismo SKU y día se reemplaza)."""
+    with _lock_job(job_id):
+        previas = read_comparison(job_id)
+        if nuevas is None:
+            return previas
+        if previas is None:
+            filas = nuevas
+        else:
+            filas = pd.concat([previas, nuevas], ignore_index=True)
+            filas = filas.drop_duplicates(["CodArticulo", "Fechaventa"], keep="last", ignore_index=True)
+        save_comparison(job_id, filas)
+        return filas
 
-def _mape(y_true, y_pred):
-    y_true = np.array(y_true, dtype=float)
-    y_pred = np.array(y_pred, dtype=float)
-    mask = y_true != 0
-    if mask.sum() == 0:
-        return float("nan")
-    return float(np.mean(np.abs((y_true[mask] - y_pred[mask]) / y_true[mask])))
+def _fecha(valor: Optional[str], campo: str) -> Optional[pd.Timestamp]:
+    if not valor:
+        return None
+    try:
+        return pd.Timestamp(valor).normalize()
+    except ValueError:
+        raise ValueError(f"{campo} debe ser una fecha (AAAA-MM-DD)")
 
-def compare_with_real(job_id: str, ventas_real_csv_base64: str | None, nivel: str) -> Dict:
-    preds = pd.DataFrame(get_job_rows(job_id))
-    if preds.empty:
-        return {"global": {"MAE": float("nan"), "MAPE": float("nan")}, "por_sku": [], "observaciones": "No hay predicciones."}
+def compare_with_real(job_id: str, ventas_real_csv_base64: str | None, nivel: str = "SKU",
+                      desde: str | None = None, hasta: str | None = None, periodo: str | None = None,
+                      acumular: bool = False, page: int = 1, size: int | None = None,
+                      orden: str = "clave") -> Dict:
+    """
+    Métricas globales, una fila por grupo de `nivel` (página `page` de `size`,
+    ordenadas por clave o por MAE/WAPE descendente) y, con `periodo`, una fila
+    por día/semana/mes. KeyError si el job no existe.
+    """
+    get_job(job_id)
+    if nivel not in NIVELES:
+        raise ValueError(f"nivel debe ser uno de {list(NIVELES)}")
+    ini, fin = _fecha(desde, "desde"), _fecha(hasta, "hasta")
 
-    if ventas_real_csv_base64:
-        raw = base64.b64decode(ventas_real_csv_base64)
-        real_df = pd.read_csv(io.BytesIO(raw))
-    else:
-        raise ValueError("Debe adjuntar ventas reales en base64 para la demo sin BD.")
+    nuevas = cruzar(job_id, leer_reales(ventas_real_csv_base64)) if ventas_real_csv_base64 else None
+    filas = _acumular(job_id, nuevas) if acumular else nuevas
+    if filas is None:
+        raise ValueError("Debe adjuntar ventas reales en base64 (o usar acumular con ventas ya cargadas).")
 
-    # esperamos columnas CodArticulo, Fechaventa, CantidadVendida
-    real_df["CodArticulo"] = real_df["CodArticulo"].astype(str)
+    fechas = filas["Fechaventa"]
+    ventana = np.ones(len(filas), dtype=bool)
+    if ini is not None:
+        ventana &= (fechas >= ini).to_numpy()
+    if fin is not None:
+        ventana &= (fechas <= fin).to_numpy()
+    filas = filas[ventana]
 
-    # En esta demo, no tenemos series por fecha en preds; usamos d_media como pronóstico.
-    merged = preds[["CodArticulo","d_media"]].merge(
-        real_df.groupby("CodArticulo", as_index=False)["CantidadVendida"].sum(),
-        on="CodArticulo", how="inner"
-    ).rename(columns={"d_media": "Pred", "CantidadVendida": "Real"})
+    clave = NIVELES[nivel]
+    if clave and clave not in filas.columns:
+        raise ValueError("Las ventas reales no traen la columna categoria")
+    real, pred = filas["Real"].to_numpy(dtype=float), filas["Pred"].to_numpy(dtype=float)
 
-    mae = _mae(merged["Real"], merged["Pred"])
-    mape = _mape(merged["Real"], merged["Pred"])
+    total = _metricas(_sumas(np.zeros(len(filas), dtype=np.int64), 1, real, pred)).iloc[0]
+    global_ = {k: (None if pd.isna(total[k]) else round(float(total[k]), 3)) for k in ("MAE", "MAPE", "WAPE", "bias")}
+    global_["n"] = int(total["n"])
+    if len(filas):
+        set_job_mae(job_id, float(total["MAE"]))
 
-    set_job_mae(job_id, mae)
+    por_grupo, n_grupos = [], 0
+    if clave:
+        claves = filas[clave]
+        if clave == "categoria":
+            # ventas acumuladas de cargas sin categoria quedan como NaN
+            claves = claves.fillna(SIN_CATEGORIA)
+        codigos, grupos = pd.factorize(claves, sort=True)
+        m = _metricas(_sumas(codigos, len(grupos), real, pred))
+        m.insert(0, clave, np.asarray(grupos, dtype=object))
+        if orden in ORDEN:
+            m = m.sort_values(ORDEN[orden], ascending=False, na_position="last", kind="stable")
+        n_grupos = len(m)
+        if size:
+            m = m.iloc[(page - 1) * size:page * size]
+        por_grupo = _registros(m)
 
-    por_sku = merged.assign(MAE=lambda x: np.abs(x["Real"]-x["Pred"]),
-                            APE=lambda x: np.where(x["Real"]!=0, np.abs((x["Real"]-x["Pred"])/x["Real"]), np.nan)
-                            ).to_dict(orient="records")
+    por_periodo = None
+    if periodo:
+        periodos = fechas[ventana].dt.to_period(PERIODOS[periodo])
+        codigos, etiquetas = pd.factorize(periodos, sort=True)
+        m = _metricas(_sumas(codigos, len(etiquetas), real, pred))
+        m.insert(0, "periodo", etiquetas.astype(str))
+        por_periodo = _registros(m)
 
+    fuente = "pronóstico diario del job" if forecast_path(job_id).exists() else "d_media diaria por SKU"
     return {
-        "global": {"MAE": round(mae,3), "MAPE": round(mape,3) if np.isfinite(mape) else None},
-        "por_sku": por_sku,
-        "observaciones": "Comparación por agregación de periodo."
+        "global": global_,
+        "por_sku": por_grupo,
+        "total": n_grupos,
+        "page": page if size else None,
+        "size": size,
+        "por_periodo": por_periodo,
+        "observaciones": f"Comparación por día contra {fuente}: {len(filas)} filas (SKU, día) con venta real."
+                         if len(filas) else "No hay ventas reales que coincidan con las predicciones.",
     }
@@ -0,0 +1,122 @@
+import tempfile
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app.repositories.predictions_repo import ROW_COLS, iter_job_rows
+
+EXPORT_CHUNK = 5000
+COPY_BUFFER = 1 << 20
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+class _Sumidero:
+    """Archivo de solo escritura que acumula bytes hasta que se vacían con `drain`."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._buf += data
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = bytes(self._buf)
+        self._buf.clear()
+        return out
+
+def _csv(chunks: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    for i, df in enumerate(chunks):
+        yield df.to_csv(index=False, header=(i == 0)).encode("utf-8")
+
+def _gzip(parts: Iterable[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)      # wbits=31: formato gzip
+    for part in parts:
+        out = z.compress(part)
+        if out:
+            yield out
+    yield z.flush()
+
+def _parquet(chunks: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    # un row group por bloque: cada bloque se envía apenas se escribe
+    sink = _Sumidero()
+    writer = None
+    for df in chunks:
+        for col in ("CodArticulo", "Estado", "Accion"):
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression="zstd")
+        writer.write_table(table.cast(writer.schema))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+def _xlsx(chunks: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    # xlsx es un zip: se arma en modo write_only sobre un temporal y luego se envía por partes
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("predicciones")
+    for i, df in enumerate(chunks):
+        if i == 0:
+            ws.append(list(df.columns))
+        for row in df.itertuples(index=False):
+            ws.append(list(row))
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while part := tmp.read(COPY_BUFFER):
+            yield part
+
+def export_stream(job_id: str, formato: str = "csv", columnas: Optional[List[str]] = None,
+                  estado: Optional[str] = None, comprimir: bool = False) -> Tuple[Iterator[bytes], str, str]:
+    """
+    Generador de bytes del export, media type y nombre de archivo.
+    Lanza ValueError con formato o columnas inválidas y LookupError si el job
+    no tiene filas.
+    """
+    if formato not in MEDIA_TYPES:
+        raise ValueError(f"Formato no soportado: {formato}")
+    if formato == "xlsx":
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise ValueError("El formato xlsx requiere openpyxl instalado")
+    faltan = [c for c in columnas or [] if c not in ROW_COLS]
+    if faltan:
+        raise ValueError(f"Columnas desconocidas: {faltan}")
+
+    chunks = iter_job_rows(job_id, columns=columnas or None, estado=estado, chunk_size=EXPORT_CHUNK)
+    primero = next(chunks, None)
+    if primero is None:
+        raise LookupError("job_id sin contenido")
+
+    def todos():
+        yield primero
+        yield from chunks
+
+    body = {"csv": _csv, "parquet": _parquet, "xlsx": _xlsx}[formato](todos())
+    filename, media_type = f"predictions_{job_id}.{formato}", MEDIA_TYPES[formato]
+    if comprimir:
+        body, filename, media_type = _gzip(body), filename + ".gz", "application/gzip"
+    return body, media_type, filename
@@ -0,0 +1,13 @@
+from pathlib import Path
+from ml.features import FEATURES_VERSION, construir_features, guardar_features
+from app.repositories.files_repo import features_path, load_dataset
+
+def features_from_file(file_id: str) -> Path:
+    """
+    Matriz de features del dataset (Arrow IPC), calculada la primera vez y
+    reutilizada por backtests y tuning: los datasets guardados no cambian.
+    """
+    p = features_path(file_id, FEATURES_VERSION)
+    if not p.exists():
+        guardar_features(construir_features(load_dataset(file_id)), p)
+    return p
@@ -0,0 +1,101 @@
+import hashlib
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Tuple
+import pandas as pd
+from pandas.api.types import union_categoricals
+from starlette.concurrency import run_in_threadpool
+from fastapi import UploadFile
+from app.repositories import files_repo
+from ml.features import BINARIAS, CATEGORICAS, NUMERICAS
+from app.services.validation_service import REQUIRED, validate_dataframe
+from app.utils.config import settings
+
+COPY_BUFFER = 1 << 20
+
+def _spool(src: BinaryIO) -> Tuple[Path, str]:
+    # sha256 calculado en la misma pasada de copia (clave del caché de resultados)
+    path = settings.UPLOAD_DIR / f"{uuid.uuid4()}.csv"
+    h = hashlib.sha256()
+    with path.open("wb") as out:
+        while block := src.read(COPY_BUFFER):
+            h.update(block)
+            out.write(block)
+    return path, h.hexdigest()
+
+async def spool_upload_hash(file: UploadFile) -> Tuple[Path, str]:
+    """Copia el upload a disco por bloques (sin decodificar ni cargar en memoria) y su sha256."""
+    await file.seek(0)
+    return await run_in_threadpool(_spool, file.file)
+
+async def spool_upload(file: UploadFile) -> Path:
+    return (await spool_upload_hash(file))[0]
+
+def _tipar_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    # mismas reglas que ml/features.tipar_df, aplicadas por bloque
+    if "Fechaventa" in chunk.columns:
+        chunk["Fechaventa"] = pd.to_datetime(chunk["Fechaventa"], errors="coerce", dayfirst=True)
+    for col in NUMERICAS:
+        if col in chunk.columns:
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce").astype("float64")
+    for col in BINARIAS:
+        if col in chunk.columns:
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce").fillna(0).astype("int8")
+    return chunk
+
+def iter_csv(path: Path, chunksize: int | None = None) -> Iterator[pd.DataFrame]:
+    """
+    Bloques tipados del CSV; las columnas categóricas se leen ya como category
+    y las no requeridas como texto, igual en todos los bloques (sin inferir
+    por bloque: "101" y "Lima" en la misma columna siguen siendo texto).
+    """
+    columnas = pd.read_csv(path, nrows=0, encoding="utf-8").columns
+    dtype = {c: "str" for c in columnas if c not in REQUIRED}
+    reader = pd.read_csv(
+        path,
+        dtype={**dtype, **{c: "category" for c in CATEGORICAS}},
+        chunksize=chunksize or settings.CSV_CHUNK_ROWS,
+        encoding="utf-8",
+    )
+    with reader:
+        for chunk in reader:
+            yield _tipar_chunk(chunk)
+
+def concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatena bloques unificando categorías (pd.concat las degradaría a texto)."""
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+    cols = list(chunks[0].columns)
+    cats = [c for c in cols if isinstance(chunks[0][c].dtype, pd.CategoricalDtype)]
+    unidas = {c: union_categoricals([ch[c] for ch in chunks]) for c in cats}
+    df = pd.concat([ch.drop(columns=cats) for ch in chunks], ignore_index=True)
+    for c in cats:
+        df[c] = unidas[c]
+    return df[cols]
+
+def read_csv_path(path: Path, remove: bool = False) -> pd.DataFrame:
+    try:
+        return concat_chunks(list(iter_csv(path)))
+    finally:
+        if remove:
+            path.unlink(missing_ok=True)
+
+def store_upload(path: Path, filename: str, content_hash: str | None = None) -> Tuple[dict, list]:
+    """
+    Guarda el CSV subido como dataset columnar bloque a bloque. Devuelve la
+    metadata y los errores de validación del primer bloque (solo columnas).
+    """
+    errors: list = []
+
+    def bloques():
+        for i, chunk in enumerate(iter_csv(path)):
+            if i == 0:
+                errors.extend(validate_dataframe(chunk))
+            yield chunk
+
+    try:
+        return files_repo.save_upload_chunks(bloques(), filename, content_hash), errors
+    finally:
+        path.unlink(missing_ok=True)
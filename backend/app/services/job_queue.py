@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from ml.procesos import crear_pool
+from app.repositories import predictions_repo, train_jobs_repo
+from app.utils.config import settings
+
+log = logging.getLogger(__name__)
+
+TERMINALES = {"done", "failed"}
+INTERRUMPIDO = "interrumpido por reinicio"
+POOL_ROTO = "el pool de procesos se cayó (worker terminado abruptamente)"
+
+_executor: Optional[ProcessPoolExecutor] = None
+_coordinador: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# job_id -> (tipo, future, executor) de los trabajos lanzados por este proceso
+# que aún no tienen su estado final en la base (el callback los saca)
+_futures: Dict[str, tuple[str, Future, Executor]] = {}
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido por entrenamiento y predicción (ml/procesos.py:
+    `spawn`, núcleos / JOB_WORKERS hilos de XGBoost por worker y sin pools
+    anidados dentro de un job).
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = crear_pool(settings.JOB_WORKERS)
+        return _executor
+
+
+def get_coordinador() -> ThreadPoolExecutor:
+    """
+    Hilos del proceso de la API para los jobs que reparten su trabajo en
+    procesos (predicción particionada, tuning, backtest): un worker del pool
+    de jobs no abre pools (ml/procesos.py), pero estos hilos sí, sin anidarlos.
+    """
+    global _coordinador
+    with _executor_lock:
+        if _coordinador is None:
+            _coordinador = ThreadPoolExecutor(max_workers=settings.JOB_WORKERS, thread_name_prefix="coordinador")
+        return _coordinador
+
+
+def _ejecutor(local: bool) -> Executor:
+    return get_coordinador() if local else get_executor()
+
+
+def _repo(tipo: str):
+    return predictions_repo if tipo == "prediction" else train_jobs_repo
+
+
+def _fallar(job_id: str, repo, error: str):
+    repo.update_job(job_id, status="failed", error=error, finished_at=datetime.utcnow().isoformat())
+
+
+def _descartar(roto: Executor):
+    """
+    Un worker que muere (OOM, segfault) rompe el ProcessPoolExecutor para
+    siempre: se descarta para que el próximo submit cree uno nuevo y los jobs
+    que seguían en él se marcan como fallidos.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not roto:
+            return
+        _executor = None
+    log.error("pool de procesos roto: se recrea en el próximo job")
+    roto.shutdown(wait=False, cancel_futures=True)
+    for job_id, (tipo, fut, ejecutor) in list(_futures.items()):
+        # los terminados los persiste su callback
+        if ejecutor is roto and not fut.done():
+            _fallar(job_id, _repo(tipo), POOL_ROTO)
+            _futures.pop(job_id, None)
+
+
+def _submit(local: bool, fn: Callable, *args, **kwargs) -> tuple[Executor, Future]:
+    ejecutor = _ejecutor(local)
+    try:
+        return ejecutor, ejecutor.submit(fn, *args, **kwargs)
+    except BrokenProcessPool:
+        _descartar(ejecutor)
+        ejecutor = _ejecutor(local)
+        return ejecutor, ejecutor.submit(fn, *args, **kwargs)
+
+
+def shutdown():
+    global _executor, _coordinador
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+        if _coordinador is not None:
+            _coordinador.shutdown(wait=False, cancel_futures=True)
+            _coordinador = None
+
+
+def recuperar_interrumpidos() -> int:
+    """
+    Al arrancar la API: los jobs que quedaron queued/running en la base los
+    lanzó un proceso anterior y sus futures ya no existen, así que nunca
+    terminarían. Se marcan como fallidos (salvo los lanzados por este proceso).
+    """
+    propios = list(_futures)
+    n = sum(repo.fail_unfinished(INTERRUMPIDO, excepto=propios) for repo in (predictions_repo, train_jobs_repo))
+    if n:
+        log.warning("%d jobs interrumpidos por reinicio marcados como fallidos", n)
+    return n
+
+
+async def run(fn: Callable, *args, local: bool = False, **kwargs) -> Any:
+    """
+    Ejecuta `fn` en el pool (o con `local` en un hilo coordinador) y espera
+    el resultado sin bloquear el event loop.
+    """
+    ejecutor, fut = _submit(local, fn, *args, **kwargs)
+    try:
+        return await asyncio.wrap_future(fut)
+    except BrokenProcessPool:
+        _descartar(ejecutor)
+        raise
+
+
+def _on_done(job_id: str, repo, ejecutor: Executor, complete: Callable[[Any], None]):
+    def callback(fut: Future):
+        try:
+            complete(fut.result())
+        except BrokenProcessPool:
+            log.error("job %s: %s", job_id, POOL_ROTO)
+            _fallar(job_id, repo, POOL_ROTO)
+            _descartar(ejecutor)
+        except Exception as ex:
+            log.exception("job %s falló", job_id)
+            _fallar(job_id, repo, str(ex))
+        finally:
+            # el estado final ya está en la base: job_status lo lee de ahí
+            _futures.pop(job_id, None)
+    return callback
+
+
+def submit_prediction(fn: Callable, fuente: Path | str, filtros: Dict, incremental: bool = False,
+                      al_terminar: Optional[Callable[[str, dict, Any], None]] = None,
+                      particiones: Optional[int] = None, origen: Optional[str] = None,
+                      local: bool = False) -> str:
+    """
+    `fn(fuente, filtros, incremental, as_frame, particiones, origen)`:
+    predict_from_csv (ruta) o predict_from_file (file_id); con `local` corre
+    en un hilo coordinador (ver get_coordinador).
+    `al_terminar(job_id, resumen, filas)` corre después de persistir el resultado.
+    """
+    job_id = predictions_repo.create_job(filtros)
+    ejecutor, fut = _submit(local, fn, fuente, filtros, incremental, as_frame=True, particiones=particiones,
+                            origen=origen)
+    _futures[job_id] = ("prediction", fut, ejecutor)
+
+    def completar(out):
+        predictions_repo.complete_job(job_id, out[1], out[0])
+        if al_terminar is not None:
+            try:
+                al_terminar(job_id, out[0], out[1])
+            except Exception:
+                # el job ya quedó guardado: no se marca como fallido
+                log.exception("job %s: al_terminar falló", job_id)
+    fut.add_done_callback(_on_done(job_id, predictions_repo, ejecutor, completar))
+    return job_id
+
+
+def submit_training(fn: Callable, fuente: Path | str, local: bool = False, **params) -> str:
+    """
+    `fn(fuente, **params)`: train_from_csv (ruta), train_from_file (file_id)
+    o backtest_from_file; con `local` corre en un hilo coordinador.
+    """
+    job_id = train_jobs_repo.create_job(params)
+    ejecutor, fut = _submit(local, fn, fuente, **params)
+    _futures[job_id] = ("train", fut, ejecutor)
+    fut.add_done_callback(_on_done(
+        job_id, train_jobs_repo, ejecutor,
+        lambda out: train_jobs_repo.complete_job(job_id, out)
+    ))
+    return job_id
+
+
+def _find(job_id: str) -> tuple[str, dict]:
+    for tipo, repo in (("prediction", predictions_repo), ("train", train_jobs_repo)):
+        try:
+            return tipo, repo.get_job(job_id)
+        except KeyError:
+            continue
+    raise KeyError("job_id no existe")
+
+
+def job_status(job_id: str) -> dict:
+    tipo, job = _find(job_id)
+    # los registros previos a la cola no tienen status: ya estaban terminados
+    status = job.get("status", "done")
+    en_curso = _futures.get(job_id)
+    if status not in TERMINALES and en_curso is not None:
+        fut = en_curso[1]
+        if fut.done():
+            # el callback aún no persistió el resultado
+            status = "running"
+        else:
+            status = "running" if fut.running() else "queued"
+    return {
+        "job_id": job_id,
+        "tipo": tipo,
+        "status": status,
+        "created_at": job["created_at"],
+        "finished_at": job.get("finished_at"),
+        "error": job.get("error"),
+        "metrics": job.get("metrics"),
+        "summary": job.get("summary"),
+    }
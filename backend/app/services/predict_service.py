@@ -1,11 +1,116 @@
 import pandas as pd
+from contextlib import nullcontext
+from pathlib import Path
 from typing import Dict, Tuple, List
-from ml.model_prediction import procesar_prediccion_global
+from ml.model_prediction import predecir_con_estado
+from ml.prediccion_particiones import predecir_particionado
+from ml.escenarios import predecir_escenarios
+from ml.pronostico import pronosticar
+from ml.feature_state import actualizar_cola, bloqueo_estado, cargar_estado, guardar_estado, version_estado
+from ml.features import tipar_df
+from ml.procesos import workers_para
 from app.services.etl_service import limpiar_df
+from app.services.ingest_service import read_csv_path
+from app.repositories.files_repo import get_file_meta, load_dataset, read_file
+from app.utils.config import settings
+from app.utils.fast_json import frame_records
 
-def predict_from_df(df: pd.DataFrame, filtros: Dict) -> Tuple[Dict[str,int], List[dict]]:
+def prediccion_en_paralelo(particiones: int | None) -> bool:
+    """
+    Si la corrida reparte los SKUs en varios procesos: entonces se coordina
+    desde un hilo de la API (job_queue, `local`) y no desde un worker del pool.
+    """
+    n = settings.PREDICT_PARTITIONS if particiones is None else particiones
+    return n > 1 and workers_para(settings.PREDICT_WORKERS or None, n) > 1
+
+def _resumen(resultado: pd.DataFrame) -> Dict[str, int]:
+    return {k: int(v) for k, v in resultado["Estado"].value_counts().items()}
+
+def predict_from_df(df: pd.DataFrame, filtros: Dict, incremental: bool = False,
+                    as_frame: bool = False, particiones: int | None = None, origen: str | None = None
+                    ) -> Tuple[Dict[str,int], List[dict] | pd.DataFrame]:
+    """
+    Con `particiones` (o settings.PREDICT_PARTITIONS) > 1 los SKUs se reparten
+    entre procesos (ml/prediccion_particiones.py); el resultado es el mismo.
+    `origen` (hash del contenido) queda registrado junto al estado que escribe
+    una corrida completa sin filtros.
+    """
+    df = limpiar_df(df, filtros=filtros)
+    # el estado representa la serie completa por SKU: solo corridas sin filtros lo actualizan
+    persistir = not any((filtros or {}).values())
+    particiones = settings.PREDICT_PARTITIONS if particiones is None else particiones
+    historia = version = None
+    if incremental:
+        # incremental: el archivo trae solo los días nuevos y el resto sale del estado
+        with bloqueo_estado() if persistir else nullcontext():
+            historia, version = cargar_estado(), version_estado()
+    # la predicción corre fuera del lock: solo la carga y el reemplazo del estado lo toman
+    if particiones > 1:
+        resultado, cola = predecir_particionado(df, historia, actualizar=persistir, n_particiones=particiones,
+                                                workers=settings.PREDICT_WORKERS or None)
+    else:
+        resultado, cola = predecir_con_estado(df, historia, actualizar=persistir)
+    if persistir and cola is not None:
+        with bloqueo_estado():
+            if incremental and version_estado() != version:
+                # otra corrida reemplazó el estado mientras se predecía: los días
+                # nuevos se aplican sobre el actual para no perder su actualización
+                cola = actualizar_cola(cargar_estado(), tipar_df(df))
+            guardar_estado(cola, origen=None if incremental else origen)
+    resumen = _resumen(resultado)
+    if as_frame:
+        # el DataFrame viaja entre procesos mucho más rápido que una lista de dicts
+        return resumen, resultado
+    return resumen, frame_records(resultado)
+
+def predict_from_csv(path: Path, filtros: Dict, incremental: bool = False, as_frame: bool = False,
+                     particiones: int | None = None, origen: str | None = None
+                     ) -> Tuple[Dict[str,int], List[dict] | pd.DataFrame]:
+    # se parsea en el worker: al proceso de la API solo le llega la ruta
+    return predict_from_df(read_csv_path(path, remove=True), filtros, incremental=incremental,
+                           as_frame=as_frame, particiones=particiones, origen=origen)
+
+def _dataset(file_id: str, filtros: Dict) -> pd.DataFrame:
+    """
+    Dataset guardado para una corrida: con filtros (HU007) se empujan al lector
+    Parquet y solo se leen esas filas; sin filtros, el dataset cacheado.
+    """
+    columnas = set(get_file_meta(file_id)["detected_columns"])
+    filters = [(k, "==", v) for k, v in (filtros or {}).items() if v and k in columnas]
+    return read_file(file_id, filters=filters) if filters else load_dataset(file_id)
+
+def predict_from_file(file_id: str, filtros: Dict, incremental: bool = False, as_frame: bool = False,
+                      particiones: int | None = None, origen: str | None = None
+                      ) -> Tuple[Dict[str,int], List[dict] | pd.DataFrame]:
+    # dataset ya guardado: sin upload ni parseo, y cacheado entre corridas what-if
+    return predict_from_df(_dataset(file_id, filtros), filtros, incremental=incremental,
+                           as_frame=as_frame, particiones=particiones, origen=origen)
+
+def predict_scenarios_from_df(df: pd.DataFrame, escenarios: List[Dict]) -> List[Tuple[Dict[str, int], pd.DataFrame]]:
+    """
+    (resumen, filas) por escenario de filtros, con features compartidas entre
+    escenarios (ml/escenarios.py). No usa ni actualiza el estado incremental.
+    """
+    return [(_resumen(r), r) for r in predecir_escenarios(df, escenarios)]
+
+def predict_scenarios_from_csv(path: Path, escenarios: List[Dict]) -> List[Tuple[Dict[str, int], pd.DataFrame]]:
+    return predict_scenarios_from_df(read_csv_path(path, remove=True), escenarios)
+
+def predict_scenarios_from_file(file_id: str, escenarios: List[Dict]) -> List[Tuple[Dict[str, int], pd.DataFrame]]:
+    return predict_scenarios_from_df(load_dataset(file_id), escenarios)
+
+def forecast_from_df(df: pd.DataFrame, filtros: Dict, horizonte: int
+                     ) -> Tuple[Dict[str, int], pd.DataFrame, pd.DataFrame]:
+    """
+    Alertas (igual que una corrida normal, sin tocar el estado incremental)
+    más el pronóstico diario de `horizonte` días por SKU (ml/pronostico.py).
+    """
     df = limpiar_df(df, filtros=filtros)
-    resultado = procesar_prediccion_global(df)
-    resumen = resultado["Estado"].value_counts().to_dict()
-    predicciones = resultado.to_dict(orient="records")
-    return resumen, predicciones
+    resultado, _ = predecir_con_estado(df, None, actualizar=False)
+    return _resumen(resultado), resultado, pronosticar(df, horizonte)
+
+def forecast_from_csv(path: Path, filtros: Dict, horizonte: int) -> Tuple[Dict[str, int], pd.DataFrame, pd.DataFrame]:
+    return forecast_from_df(read_csv_path(path, remove=True), filtros, horizonte)
+
+def forecast_from_file(file_id: str, filtros: Dict, horizonte: int) -> Tuple[Dict[str, int], pd.DataFrame, pd.DataFrame]:
+    return forecast_from_df(_dataset(file_id, filtros), filtros, horizonte)
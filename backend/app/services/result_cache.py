@@ -0,0 +1,153 @@
+"""
+Caché de resultados de predicción.
+
+Clave: sha256 de (contenido del dataset, versión del modelo en disco, filtros).
+Dos niveles en el proceso de la API:
+
+- memoria: LRU de (job_id, resumen, DataFrame) acotado por PREDICTION_CACHE_MB;
+- disco: índice `prediction_cache` en SQLite que apunta al job ya guardado
+  (sus filas siguen en Parquet), acotado a PREDICTION_CACHE_ENTRIES por LRU.
+
+Al desalojar una entrada solo se olvida el índice: el job queda en el historial.
+Las corridas incrementales no se cachean (dependen del estado de features), y
+una corrida sin filtros solo es hit si el estado guardado salió de ese mismo
+contenido: reutilizarla no vuelve a escribirlo. El contenido que escribió el
+estado lo registra el worker junto al archivo (feature_state.origen_estado),
+así vale entre procesos y sin importar en qué orden terminan los jobs.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import pandas as pd
+from ml.feature_state import origen_estado
+from ml.model_registry import registry
+from app.repositories import cache_repo, predictions_repo
+from app.utils.config import settings
+
+_lock = threading.Lock()
+_memoria: "OrderedDict[str, Tuple[str, dict, pd.DataFrame, int]]" = OrderedDict()
+_bytes = 0
+_stats = {"hits_memoria": 0, "hits_disco": 0, "misses": 0, "evictions": 0}
+
+
+def clave(content_hash: str, model_version: str, filtros: Dict) -> str:
+    normal = {k: v for k, v in (filtros or {}).items() if v}
+    return hashlib.sha256(json.dumps([content_hash, model_version, normal], sort_keys=True).encode()).hexdigest()
+
+
+def consulta(content_hash: Optional[str], filtros: Dict, incremental: bool = False) -> Optional[dict]:
+    """Clave y componentes de la corrida, o None si no es cacheable."""
+    if not settings.PREDICTION_CACHE or incremental or not content_hash:
+        return None
+    version = registry.info()["disk_version"]
+    if version is None:
+        return None
+    filtros = {k: v for k, v in (filtros or {}).items() if v}
+    return {"key": clave(content_hash, version, filtros), "content_hash": content_hash,
+            "model_version": version, "filtros": filtros}
+
+
+def _a_memoria(key: str, job_id: str, summary: dict, frame: pd.DataFrame):
+    global _bytes
+    peso = int(frame.memory_usage(deep=True).sum())
+    limite = settings.PREDICTION_CACHE_MB * 1024 * 1024
+    if peso > limite:
+        return
+    with _lock:
+        viejo = _memoria.pop(key, None)
+        if viejo is not None:
+            _bytes -= viejo[3]
+        _memoria[key] = (job_id, summary, frame, peso)
+        _bytes += peso
+        while _bytes > limite:
+            _, (_, _, _, p) = _memoria.popitem(last=False)
+            _bytes -= p
+            _stats["evictions"] += 1
+
+
+def _olvidar(key: str):
+    global _bytes
+    with _lock:
+        viejo = _memoria.pop(key, None)
+        if viejo is not None:
+            _bytes -= viejo[3]
+    cache_repo.delete_entry(key)
+
+
+def buscar(c: Optional[dict]) -> Optional[Tuple[str, dict, pd.DataFrame]]:
+    """(job_id, resumen, filas) de una corrida idéntica, o None (miss)."""
+    if c is None:
+        return None
+    key = c["key"]
+    if not c["filtros"] and origen_estado() != c["content_hash"]:
+        # reutilizarla dejaría el estado de features de otro dataset
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    with _lock:
+        if key in _memoria:
+            _memoria.move_to_end(key)
+            _stats["hits_memoria"] += 1
+            job_id, summary, frame, _ = _memoria[key]
+            encontrado = (job_id, summary, frame)
+        else:
+            encontrado = None
+    if encontrado is not None:
+        cache_repo.get_entry(key)
+        return encontrado
+
+    job_id = cache_repo.get_entry(key)
+    if job_id is not None:
+        try:
+            job = predictions_repo.get_job(job_id)
+            if job.get("status", "done") != "done" or not predictions_repo.rows_path(job_id).exists():
+                raise KeyError(job_id)
+        except KeyError:
+            _olvidar(key)
+        else:
+            frame = predictions_repo.read_job_rows(job_id)
+            summary = job.get("summary", {})
+            _a_memoria(key, job_id, summary, frame)
+            with _lock:
+                _stats["hits_disco"] += 1
+            return job_id, summary, frame
+    with _lock:
+        _stats["misses"] += 1
+    return None
+
+
+def registrar(c: Optional[dict], job_id: str, summary: dict, frame: pd.DataFrame):
+    """Guarda la corrida terminada `job_id` (no hace nada si `c` es None)."""
+    if c is None:
+        return
+    cache_repo.put_entry(c["key"], job_id, c["content_hash"], c["model_version"], c["filtros"])
+    borradas = cache_repo.evict(settings.PREDICTION_CACHE_ENTRIES)
+    with _lock:
+        _stats["evictions"] += borradas
+    _a_memoria(c["key"], job_id, summary, frame)
+
+
+def limpiar():
+    global _bytes
+    with _lock:
+        _memoria.clear()
+        _bytes = 0
+        for k in _stats:
+            _stats[k] = 0
+
+
+def stats() -> dict:
+    entradas_disco = cache_repo.count()
+    with _lock:
+        hits = _stats["hits_memoria"] + _stats["hits_disco"]
+        total = hits + _stats["misses"]
+        return {
+            **_stats,
+            "hits": hits,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "entradas_memoria": len(_memoria),
+            "mb_memoria": round(_bytes / 1024 / 1024, 3),
+            "entradas_disco": entradas_disco,
+        }
@@ -1,10 +1,102 @@
+import tempfile
 import pandas as pd
-from ml.train_model import entrenar_modelo
+from pathlib import Path
+from ml.features import construir_features, guardar_features
+from ml.train_model import entrenar_modelo, entrenar_por_particiones
+from ml.tuning import tunear
+from ml.model_registry import registry
+from ml.procesos import workers_para
 from app.services.etl_service import limpiar_df
+from app.services.ingest_service import read_csv_path
+from app.repositories.files_repo import load_dataset, read_file
+from app.services.features_service import features_from_file
+from app.utils.config import settings
+from app.utils.io_utils import write_json
 
-def train_from_df(df: pd.DataFrame, tuning: bool = False) -> dict:
-    # Si deseas, aquí puedes aplicar tuning condicional
-    df = limpiar_df(df)
-    out = entrenar_modelo(df)
-    # podrías adjuntar hiperparámetros usados si tuning=True
+# mejores hiperparámetros de la última búsqueda, junto al modelo entrenado con ellos
+TUNED_PARAMS_PATH = settings.OUTPUT_DIR / "mejores_params.json"
+
+def _motor() -> dict:
+    return {
+        "nthread": settings.TRAIN_THREADS or None,
+        "early_stopping_rounds": settings.EARLY_STOPPING_ROUNDS or None,
+    }
+
+def _tunear(ruta: Path, modo: str) -> dict:
+    return tunear(
+        ruta, modo,
+        n_trials=settings.TUNING_TRIALS,
+        eta=settings.TUNING_ETA,
+        rondas_min=settings.TUNING_MIN_ROUNDS,
+        presupuesto_s=settings.TUNING_BUDGET_S,
+        workers=settings.TUNING_WORKERS or None,
+    )
+
+def tuning_en_paralelo(tuning: bool) -> bool:
+    # los trials se reparten en procesos: se coordina desde un hilo de la API
+    return tuning and workers_para(settings.TUNING_WORKERS or None, settings.TUNING_TRIALS) > 1
+
+def _publicar(out: dict, busqueda: dict | None = None) -> dict:
+    # publicar la nueva versión en el registro del proceso
+    out["model_version"] = registry.reload()
+    if busqueda:
+        out["params"] = busqueda["params"]
+        out["tuning"] = {
+            "trials": len(busqueda["trials"]),
+            **{k: busqueda[k] for k in ("mae_val", "rondas_halving", "segundos", "agotado", "workers")},
+        }
+        write_json(TUNED_PARAMS_PATH, {"model_version": out["model_version"], "modo": out["modo"], **busqueda})
     return out
+
+def train_from_df(df: pd.DataFrame, tuning: bool = False, modo: str | None = None,
+                  ruta_features: Path | None = None) -> dict:
+    """
+    Con `tuning` primero se buscan hiperparámetros (ml/tuning.py) sobre la
+    matriz de features `ruta_features` (o una temporal calculada de `df`) y
+    el modelo final se entrena con los mejores.
+    """
+    df = limpiar_df(df)
+    modo = modo or settings.TRAIN_MODE
+    busqueda = None
+    if tuning and ruta_features is not None:
+        busqueda = _tunear(ruta_features, modo)
+    elif tuning:
+        with tempfile.TemporaryDirectory(prefix="tuning_") as tmp:
+            ruta = Path(tmp) / "features.arrow"
+            guardar_features(construir_features(df), ruta)
+            busqueda = _tunear(ruta, modo)
+    out = entrenar_modelo(df, modo=modo, params=busqueda and busqueda["params"], **_motor())
+    return _publicar(out, busqueda)
+
+def train_from_csv(path: Path, tuning: bool = False, modo: str | None = None) -> dict:
+    # se parsea en el worker: al proceso de la API solo le llega la ruta
+    return train_from_df(read_csv_path(path, remove=True), tuning=tuning, modo=modo)
+
+def train_from_file(file_id: str, tuning: bool = False, modo: str | None = None,
+                    particiones: int | None = None) -> dict:
+    """
+    Con `particiones` (o settings.TRAIN_PARTITIONS) > 0 el dataset no se carga
+    entero: cada grupo de SKUs se lee del Parquet con filtro y XGBoost
+    entrena desde las features por bloques (solo modos nativo y target); con
+    settings.TRAIN_EXTERNAL_MEMORY los bloques cuantizados quedan en disco.
+    """
+    particiones = settings.TRAIN_PARTITIONS if particiones is None else particiones
+    # la búsqueda reutiliza la matriz de features cacheada del dataset
+    ruta = features_from_file(file_id) if tuning else None
+    if not particiones:
+        return train_from_df(load_dataset(file_id), tuning=tuning, modo=modo, ruta_features=ruta)
+
+    modo = modo or settings.TRAIN_MODE
+    busqueda = _tunear(ruta, modo) if tuning else None
+    base = read_file(file_id, columns=["CodArticulo", "Fechaventa"])
+    out = entrenar_por_particiones(
+        lambda skus: read_file(file_id, filters=[("CodArticulo", "in", skus)]),
+        skus=base["CodArticulo"].dropna().astype(str).unique().tolist(),
+        fechas=base["Fechaventa"],
+        modo=modo,
+        n_particiones=particiones,
+        params=busqueda and busqueda["params"],
+        externa=settings.TRAIN_EXTERNAL_MEMORY,
+        **_motor(),
+    )
+    return _publicar(out, busqueda)
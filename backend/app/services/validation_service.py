@@ -1,10 +1,8 @@
 import pandas as pd
+from ml.features import BINARIAS, CATEGORICAS, NUMERICAS
 
-REQUIRED = [
-    "Fechaventa","CodArticulo","Temporada","PrecioVenta",
-    "CantidadVendida","StockMes","TiempoReposicionDias",
-    "Promocion","DiaFestivo","EsDomingo","TiendaCerrada"
-]
+# columnas requeridas con los tipos de ml/features.py (ver ingest_service)
+REQUIRED = ["Fechaventa", *CATEGORICAS, *NUMERICAS, *BINARIAS]
 
 def validate_dataframe(df: pd.DataFrame) -> list[dict]:
     errs = []
@@ -0,0 +1,31 @@
+from functools import lru_cache
+from typing import Sequence
+import pandas as pd
+from ml.model_prediction import politica_stock
+from ml.what_if import COLUMNAS, grilla_politica, z_servicio
+from app.repositories import predictions_repo
+
+@lru_cache(maxsize=8)
+def _agregados(job_id: str) -> pd.DataFrame:
+    # las filas de un job terminado no cambian: se leen una vez por proceso
+    return predictions_repo.read_job_rows(job_id, columns=["CodArticulo", *COLUMNAS])
+
+def _job_terminado(job_id: str) -> pd.DataFrame:
+    job = predictions_repo.get_job(job_id)          # KeyError si no existe
+    if job.get("status", "done") != "done":
+        raise ValueError("El job aún no terminó")
+    return _agregados(job_id)
+
+def what_if_grid(job_id: str, niveles: Sequence[float], multiplicadores: Sequence[float]) -> dict:
+    """
+    Conteos por Estado y totales de la política para cada (nivel de servicio,
+    multiplicador de lead time), desde los agregados guardados del job.
+    """
+    agregados = _job_terminado(job_id)
+    grilla = grilla_politica(agregados, niveles, multiplicadores)
+    return {"job_id": job_id, "n_skus": len(agregados), "grilla": grilla.to_dict(orient="records")}
+
+def what_if_detalle(job_id: str, nivel: float, multiplicador: float = 1.0) -> pd.DataFrame:
+    """Filas por SKU (mismo esquema que la predicción) para un punto de la grilla."""
+    agregados = _job_terminado(job_id).set_index("CodArticulo")
+    return politica_stock(agregados, z=z_servicio(nivel), multiplicador=multiplicador)
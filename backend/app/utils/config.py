@@ -3,10 +3,35 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     OUTPUT_DIR: Path = Path("outputs")
-    STORE_DIR: Path = OUTPUT_DIR / "store"          # simulación DB
+    STORE_DIR: Path = OUTPUT_DIR / "store"          # parquet de datasets y resultados
+    DATABASE_URL: str = f"sqlite:///{STORE_DIR / 'multitop.db'}"
     EXPORT_DIR: Path = OUTPUT_DIR / "exports"
     LOG_DIR: Path = OUTPUT_DIR / "logs"
+    UPLOAD_DIR: Path = OUTPUT_DIR / "uploads"       # CSV subidos en espera de parseo
+    CSV_CHUNK_ROWS: int = 200_000
+    DATASET_CACHE_SIZE: int = 4                     # datasets tipados en memoria por worker
     ALLOW_ORIGINS: list[str] = ["*"]
+    JOB_WORKERS: int = 2                            # procesos para entrenar/predecir
+    TRAIN_MODE: str = "onehot"                      # onehot | nativo | target (ml/train_model.py)
+    TRAIN_THREADS: int = 0                          # hilos de XGBoost por entrenamiento (0 = todos)
+    EARLY_STOPPING_ROUNDS: int = 50                 # 0 = sin early stopping
+    TRAIN_PARTITIONS: int = 0                       # >0: entrenar por grupos de SKU desde el Parquet
+    TRAIN_EXTERNAL_MEMORY: bool = False             # con particiones: caché en disco (ExtMemQuantileDMatrix)
+    BACKTEST_FOLDS: int = 4                         # pliegues de origen móvil (ml/backtest.py)
+    BACKTEST_HORIZON: int = 28                      # días de prueba por pliegue
+    BACKTEST_STEP: int = 28                         # días entre orígenes
+    BACKTEST_WORKERS: int = 0                       # procesos por backtest (0 = núcleos)
+    TUNING_TRIALS: int = 16                         # configuraciones iniciales (ml/tuning.py)
+    TUNING_ETA: int = 3                             # successive halving: sobrevive 1/eta por ronda
+    TUNING_MIN_ROUNDS: int = 50                     # árboles de la primera ronda
+    TUNING_BUDGET_S: float = 600                    # tiempo máximo de búsqueda
+    TUNING_WORKERS: int = 0                         # procesos para trials (0 = núcleos)
+    PREDICT_PARTITIONS: int = 0                     # >1: predecir por grupos de SKU en procesos
+    PREDICT_WORKERS: int = 0                        # procesos por predicción particionada (0 = núcleos)
+    FORECAST_HORIZON: int = 28                      # días pronosticados por defecto (ml/pronostico.py)
+    PREDICTION_CACHE: bool = True                   # reutilizar corridas idénticas (app/services/result_cache.py)
+    PREDICTION_CACHE_ENTRIES: int = 256             # entradas en el índice de disco
+    PREDICTION_CACHE_MB: int = 256                  # resultados en memoria del proceso de la API
 
     class Config:
         env_file = ".env"
@@ -18,3 +43,4 @@ settings.OUTPUT_DIR.mkdir(exist_ok=True)
 settings.STORE_DIR.mkdir(exist_ok=True, parents=True)
 settings.EXPORT_DIR.mkdir(exist_ok=True, parents=True)
 settings.LOG_DIR.mkdir(exist_ok=True, parents=True)
+settings.UPLOAD_DIR.mkdir(exist_ok=True, parents=True)
@@ -1,4 +1,14 @@
-from fastapi import Query
+from uuid import UUID
+from fastapi import Query, HTTPException
+from app.repositories import files_repo
 
 def pagination_params(page: int = Query(1, ge=1), size: int = Query(25, ge=1, le=500)):
     return {"page": page, "size": size}
+
+def stored_file_id(file_id: UUID) -> str:
+    """file_id de la ruta que debe existir en files_repo (404 si no)."""
+    try:
+        files_repo.get_file(str(file_id))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="file_id no existe")
+    return str(file_id)
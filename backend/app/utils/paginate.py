@@ -1,6 +1,25 @@
+import base64
+import json
 from typing import Sequence, Any
 
 def paginate(items: Sequence[Any], page: int, size: int):
     start = (page - 1) * size
     end = start + size
-    return items[start:end], len(items)
\ No newline at end of file
+    return items[start:end], len(items)
+
+def encode_cursor(*keys: Any) -> str:
+    """Token opaco con la clave de orden del último elemento devuelto."""
+    raw = json.dumps(keys, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str, tipos: Sequence[type]) -> list:
+    """Claves del cursor; ValueError si no es un token de `encode_cursor` con claves de `tipos`."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        keys = json.loads(raw)
+    except ValueError:
+        raise ValueError("cursor inválido")
+    if (not isinstance(keys, list) or len(keys) != len(tipos)
+            or not all(isinstance(k, t) for k, t in zip(keys, tipos))):
+        raise ValueError("cursor inválido")
+    return keys
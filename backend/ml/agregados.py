@@ -0,0 +1,100 @@
+"""
+Agregados por SKU para alertas de stock en una sola pasada sobre arrays.
+
+Las filas de cada SKU deben venir contiguas y en orden de fecha (lo que
+devuelven construir_features y la cola de ml/feature_state.py); con eso cada
+SKU es un tramo [inicio, fin) y medias, desviaciones, primero y último se
+reducen con bincount/reduceat, sin groupby ni funciones Python por SKU.
+NaN se ignoran como en mean/std/first/last de un groupby de pandas.
+"""
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+VENTANA_SIGMA = 30
+
+
+def _tramos(s: pd.Series):
+    """(orden o None, códigos ordenados, inicio de cada tramo, grupo de cada fila, índice de SKUs)."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, categorias = s.cat.codes.to_numpy().astype(np.int64), s.cat.categories
+    else:
+        codes, categorias = pd.factorize(s)
+        codes = codes.astype(np.int64)
+    orden = None
+    if len(codes) and np.any(np.diff(codes) < 0):
+        # filas no agrupadas por SKU: orden estable (mantiene el orden de fechas)
+        orden = np.argsort(codes, kind="stable")
+        codes = codes[orden]
+    n = len(codes)
+    inicios = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if n else np.zeros(0, dtype=np.int64)
+    gid = np.repeat(np.arange(len(inicios)), np.diff(np.r_[inicios, n]))
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        indice = pd.CategoricalIndex(pd.Categorical.from_codes(codes[inicios], dtype=s.dtype), name=s.name)
+    else:
+        indice = pd.Index(pd.Index(categorias)[codes[inicios]], name=s.name)
+    return orden, inicios, gid, indice
+
+
+def _sigma(x: np.ndarray, gid: np.ndarray, n: int, mascara: np.ndarray) -> np.ndarray:
+    # dos pasadas (media y luego desvíos): sin la cancelación de E[x²] - E[x]²
+    ok = mascara & ~np.isnan(x)
+    cuenta = np.bincount(gid[ok], minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.bincount(gid[ok], weights=x[ok], minlength=n) / cuenta
+        desvio = np.bincount(gid[ok], weights=(x[ok] - media[gid[ok]]) ** 2, minlength=n)
+        return np.where(cuenta > 0, np.sqrt(desvio / cuenta), np.nan)
+
+
+def _extremo_valido(x: np.ndarray, inicios: np.ndarray, ultimo: bool) -> np.ndarray:
+    n = len(x)
+    valido = ~np.isnan(x)
+    if ultimo:
+        idx = np.maximum.reduceat(np.where(valido, np.arange(n), -1), inicios)
+        return np.where(idx >= 0, x[np.maximum(idx, 0)], np.nan)
+    idx = np.minimum.reduceat(np.where(valido, np.arange(n), n), inicios)
+    return np.where(idx < n, x[np.minimum(idx, n - 1)], np.nan)
+
+
+def resumen_por_sku(df: pd.DataFrame, media: Optional[str] = "Pred", sigma: Optional[str] = "CantidadVendida",
+                    ultimo: Optional[str] = "StockMes", primero: Optional[str] = "TiempoReposicionDias",
+                    ventana: int = VENTANA_SIGMA, respaldo: bool = True) -> pd.DataFrame:
+    """
+    Por SKU (índice CodArticulo, en orden de código), solo las columnas pedidas:
+
+        d_media  media de `media`
+        d_sigma  desviación ddof=0 de las últimas `ventana` filas de `sigma`;
+                 si todas son nulas, la de todo el SKU (`respaldo`); si no, 0
+        StockMes último valor no nulo de `ultimo`
+        horizon  primer valor no nulo de `primero`
+    """
+    orden, inicios, gid, indice = _tramos(df["CodArticulo"])
+    n, g = len(gid), len(inicios)
+
+    def col(nombre: str) -> np.ndarray:
+        x = df[nombre].to_numpy(dtype=float)
+        return x if orden is None else x[orden]
+
+    out = {}
+    todas = np.ones(n, dtype=bool)
+    if media:
+        x = col(media)
+        ok = ~np.isnan(x)
+        cuenta = np.bincount(gid[ok], minlength=g)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["d_media"] = np.bincount(gid[ok], weights=x[ok], minlength=g) / cuenta
+    if sigma:
+        x = col(sigma)
+        fin = np.r_[inicios[1:], n]
+        s = _sigma(x, gid, g, np.arange(n) >= (fin - ventana)[gid])
+        if respaldo:
+            s = np.where(np.isnan(s), _sigma(x, gid, g, todas), s)
+        out["d_sigma"] = np.nan_to_num(s, nan=0.0)
+    if g:
+        if ultimo:
+            out["StockMes"] = _extremo_valido(col(ultimo), inicios, ultimo=True)
+        if primero:
+            out["horizon"] = _extremo_valido(col(primero), inicios, ultimo=False)
+    else:
+        out.update({k: np.zeros(0) for k, c in (("StockMes", ultimo), ("horizon", primero)) if c})
+    return pd.DataFrame(out, index=indice)
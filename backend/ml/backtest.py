@@ -0,0 +1,131 @@
+"""
+Backtesting con origen móvil (rolling origin).
+
+    pliegue k: train = días < origen_k, prueba = [origen_k, origen_k + horizonte)
+    origen_k = último día - (horizonte - 1) - paso * (n_pliegues - 1 - k)
+
+La matriz de features se calcula una sola vez y se comparte entre pliegues
+como archivo Arrow mapeado en memoria (ml/features.py: guardar_features); cada
+pliegue entrena en su propio proceso con nthread = núcleos / procesos
+(ml/procesos.py; la API lo coordina desde un hilo, no desde un worker). Como en
+`entrenar_modelo`, los lags del tramo de prueba usan la venta real de los días
+previos (evaluación a un paso).
+
+Las métricas por SKU salen de sumas por (pliegue, SKU), así que agregarlas por
+SKU o en global es sumar y dividir, sin volver a recorrer filas.
+"""
+import time
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from ml.features import X_COLS, cargar_features
+from ml.train_model import ajustar_estimador, metricas, predecir
+from ml.procesos import crear_pool, hilos_por_proceso, workers_para
+
+COLUMNAS = [*X_COLS, "Fechaventa", "CantidadVendida"]
+SUMAS = ["n", "abs_err", "ape", "sape", "err", "abs_y"]
+
+
+def origenes(fechas: pd.Series, n_pliegues: int, horizonte: int, paso: int) -> List[pd.Timestamp]:
+    if n_pliegues < 1 or horizonte < 1 or paso < 1:
+        raise ValueError("n_pliegues, horizonte y paso deben ser >= 1")
+    ini, fin = fechas.min(), fechas.max()
+    primero = fin - pd.Timedelta(days=horizonte - 1 + paso * (n_pliegues - 1))
+    if primero <= ini:
+        raise ValueError(f"Historia insuficiente para {n_pliegues} pliegues de {horizonte} días con paso {paso}")
+    return [primero + pd.Timedelta(days=paso * k) for k in range(n_pliegues)]
+
+
+def sumas_por_sku(sku: pd.Series, y, pred) -> pd.DataFrame:
+    """Sumas por SKU de las que salen MAE/MAPE/WAPE/SMAPE/bias (ver `metricas_desde_sumas`)."""
+    y, pred = np.asarray(y, dtype=float), np.asarray(pred, dtype=float)
+    err = pred - y
+    terminos = pd.DataFrame({
+        "CodArticulo": np.asarray(sku.astype(str)),
+        "n": 1,
+        "abs_err": np.abs(err),
+        "ape": np.abs(err) / np.maximum(1, np.abs(y)),
+        "sape": 2 * np.abs(err) / (np.abs(y) + np.abs(pred) + 1e-9),
+        "err": err,
+        "abs_y": np.abs(y),
+    })
+    return terminos.groupby("CodArticulo", sort=False).sum()
+
+
+def metricas_desde_sumas(s: pd.DataFrame) -> pd.DataFrame:
+    abs_y = np.maximum(s["abs_y"], 1e-9)
+    return pd.DataFrame({
+        "mae": s["abs_err"] / s["n"],
+        "mape": 100 * s["ape"] / s["n"],
+        "wape": 100 * s["abs_err"] / abs_y,
+        "smape": 100 * s["sape"] / s["n"],
+        "bias": 100 * s["err"] / abs_y,
+        "n": s["n"],
+    }, index=s.index)
+
+
+def evaluar_pliegue(ruta: Path, modo: str, k: int, origen: pd.Timestamp, horizonte: int,
+                    nthread: Optional[int] = None, early_stopping_rounds: Optional[int] = None,
+                    params: Optional[dict] = None) -> tuple[dict, pd.DataFrame]:
+    """Entrena y evalúa un pliegue: (fila de métricas, sumas por SKU)."""
+    df = cargar_features(ruta, COLUMNAS)
+    fin = origen + pd.Timedelta(days=horizonte)
+    train = df[df["Fechaventa"] < origen]
+    test = df[(df["Fechaventa"] >= origen) & (df["Fechaventa"] < fin)]
+    if train.empty or test.empty:
+        raise ValueError(f"Pliegue {k} sin filas de entrenamiento o de prueba")
+
+    t0 = time.perf_counter()
+    pipe = ajustar_estimador(modo, train, origen, nthread, early_stopping_rounds, params)
+    fit_s = time.perf_counter() - t0
+    pred = predecir(pipe, test)
+
+    fila = {
+        "pliegue": k,
+        "origen": origen.strftime("%Y-%m-%d"),
+        "fin": (fin - pd.Timedelta(days=1)).strftime("%Y-%m-%d"),
+        "filas_train": len(train),
+        "filas_test": len(test),
+        **metricas(test["CantidadVendida"], pred),
+        "fit_s": round(fit_s, 2),
+    }
+    sumas = sumas_por_sku(test["CodArticulo"], test["CantidadVendida"], pred)
+    return fila, sumas.assign(pliegue=k).set_index("pliegue", append=True)
+
+
+def backtest(ruta: Path, modo: str = "target", n_pliegues: int = 4, horizonte: int = 28, paso: int = 28,
+             workers: Optional[int] = None, early_stopping_rounds: Optional[int] = None,
+             params: Optional[dict] = None) -> dict:
+    """
+    Corre los pliegues sobre la matriz de features en `ruta`, en paralelo
+    (`workers` procesos, por defecto uno por núcleo hasta n_pliegues).
+
+    Devuelve métricas globales, un DataFrame por pliegue, uno por SKU
+    (agregado sobre pliegues) y uno por (SKU, pliegue).
+    """
+    fechas = cargar_features(ruta, ["Fechaventa"])["Fechaventa"]
+    inicios = origenes(fechas, n_pliegues, horizonte, paso)
+    workers = workers_para(workers, n_pliegues)
+    tareas = [(ruta, modo, k, o, horizonte, hilos_por_proceso(workers), early_stopping_rounds, params)
+              for k, o in enumerate(inicios)]
+
+    if workers == 1:
+        resultados = [evaluar_pliegue(*t) for t in tareas]
+    else:
+        with crear_pool(workers) as ex:
+            resultados = [f.result() for f in [ex.submit(evaluar_pliegue, *t) for t in tareas]]
+
+    sumas = pd.concat([r[1] for r in resultados])
+    total = sumas[SUMAS].sum().to_frame().T
+    return {
+        "modo": modo,
+        "n_pliegues": n_pliegues,
+        "horizonte": horizonte,
+        "paso": paso,
+        "workers": workers,
+        "global": metricas_desde_sumas(total).drop(columns="n").iloc[0].to_dict(),
+        "pliegues": pd.DataFrame([r[0] for r in resultados]),
+        "por_sku": metricas_desde_sumas(sumas.groupby(level="CodArticulo")[SUMAS].sum()).reset_index(),
+        "por_sku_pliegue": metricas_desde_sumas(sumas).reset_index(),
+    }
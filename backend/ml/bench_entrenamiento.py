@@ -0,0 +1,86 @@
+"""
+Benchmark de modos de entrenamiento (tiempo de fit, MAE y pico de RSS).
+
+    cd backend && python -m ml.bench_entrenamiento --skus 2000 --dias 200
+
+Cada modo corre en un proceso nuevo para que el pico de memoria sea el suyo.
+No guarda modelo ni archivos en outputs/.
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+
+def datos_sinteticos(n_sku: int, dias: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    fechas = pd.date_range("2024-01-01", periods=dias)
+    base = rng.uniform(20, 200, n_sku)
+    n = n_sku * dias
+    semana = np.tile(1 + 0.2 * np.sin(np.arange(dias) * 2 * np.pi / 7), n_sku)
+    return pd.DataFrame({
+        "Fechaventa": np.tile(fechas, n_sku),
+        "CodArticulo": np.repeat([f"ME{i:05d}" for i in range(n_sku)], dias),
+        "Temporada": rng.choice(["Verano", "Invierno", "Otoño", "Primavera"], n),
+        "PrecioVenta": np.repeat(rng.uniform(20, 90, n_sku), dias),
+        "CantidadVendida": rng.poisson(np.repeat(base, dias) * semana),
+        "StockMes": 5000,
+        "TiempoReposicionDias": 60,
+        "Promocion": rng.integers(0, 2, n),
+        "DiaFestivo": 0,
+        "EsDomingo": 0,
+        "TiendaCerrada": 0,
+    })
+
+
+def _rss_mb() -> float:
+    # ru_maxrss: KiB en Linux, bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _correr(modo: str, n_sku: int, dias: int, cola):
+    from ml.features import construir_features, X_COLS
+    from ml.train_model import construir_estimador
+
+    df = construir_features(datos_sinteticos(n_sku, dias))
+    corte = df["Fechaventa"].max() - pd.Timedelta(days=30)
+    train, test = df[df["Fechaventa"] <= corte], df[df["Fechaventa"] > corte]
+    X_tr, X_te = train[X_COLS], test[X_COLS]
+    if modo == "onehot":
+        X_tr = X_tr.assign(CodArticulo=X_tr["CodArticulo"].astype(str), Temporada=X_tr["Temporada"].astype(str))
+        X_te = X_te.assign(CodArticulo=X_te["CodArticulo"].astype(str), Temporada=X_te["Temporada"].astype(str))
+    rss_antes = _rss_mb()
+
+    t0 = time.perf_counter()
+    modelo = construir_estimador(modo).fit(X_tr, train["CantidadVendida"])
+    fit_s = time.perf_counter() - t0
+    pred = modelo.predict(X_te)
+    mae = float(np.mean(np.abs(test["CantidadVendida"].to_numpy() - pred)))
+    cola.put({
+        "modo": modo, "filas": len(X_tr), "fit_s": round(fit_s, 2), "mae": round(mae, 3),
+        "rss_datos_mb": round(rss_antes), "rss_pico_mb": round(_rss_mb()),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ml.bench_entrenamiento")
+    parser.add_argument("--skus", type=int, default=1000)
+    parser.add_argument("--dias", type=int, default=200)
+    parser.add_argument("--modos", nargs="+", default=["onehot", "nativo", "target"])
+    args = parser.parse_args(argv)
+
+    ctx = multiprocessing.get_context("spawn")
+    for modo in args.modos:
+        cola = ctx.Queue()
+        p = ctx.Process(target=_correr, args=(modo, args.skus, args.dias, cola))
+        p.start()
+        print(cola.get())
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Entrenamiento por particiones de SKU para historias que no caben en memoria
+como un único frame de features.
+
+Los lags son por SKU, así que cada partición (un grupo de SKUs completo) se
+lee y se convierte en features de forma independiente. Las features se
+guardan en Parquet temporal partidas en train / val / test y XGBoost las
+consume bloque a bloque con un `DataIter`: en memoria queda solo el
+QuantileDMatrix cuantizado (o nada, con `externa=True`, que usa la caché en
+disco de ExtMemQuantileDMatrix).
+"""
+from pathlib import Path
+from typing import Callable, List, Optional
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from ml.features import construir_features
+from ml.agregados import resumen_por_sku
+
+ETIQUETA = "CantidadVendida"
+PARTES = ("train", "val", "test")
+
+
+class IteradorParquet(xgb.DataIter):
+    """Entrega a XGBoost los Parquet de `partes` de a uno, pasados por `preparar`."""
+
+    def __init__(self, partes: List[Path], preparar: Callable[[pd.DataFrame], pd.DataFrame],
+                 cache_prefix: Optional[str] = None):
+        self.partes = list(partes)
+        self.preparar = preparar
+        self.externa = cache_prefix is not None
+        self._i = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data) -> bool:
+        if self._i >= len(self.partes):
+            return False
+        df = pd.read_parquet(self.partes[self._i])
+        input_data(data=self.preparar(df), label=df[ETIQUETA].to_numpy(dtype=float))
+        self._i += 1
+        return True
+
+    def reset(self):
+        self._i = 0
+
+
+def grupos_sku(skus: List[str], n_particiones: int) -> List[List[str]]:
+    skus = sorted(set(map(str, skus)))
+    n = max(1, min(n_particiones, len(skus)))
+    return [list(g) for g in np.array_split(np.array(skus, dtype=object), n) if len(g)]
+
+
+def escribir_particiones(leer: Callable[[List[str]], pd.DataFrame], grupos: List[List[str]],
+                         corte: pd.Timestamp, inicio_val: Optional[pd.Timestamp],
+                         columnas: List[str], tmp_dir: Path) -> dict:
+    """
+    Calcula features partición por partición y las escribe en `tmp_dir`.
+
+    Devuelve las rutas por parte y lo que el modelo necesita conocer de todo
+    el catálogo antes de entrenar: categorías de Temporada, suma/cantidad de
+    venta por SKU en train (para el modo target) y, por SKU, la sigma, el
+    stock y el lead time usados en las alertas (ml/agregados.py).
+    """
+    rutas = {p: [] for p in PARTES}
+    temporadas, sumas, cuentas, stats = set(), [], [], []
+    for k, grupo in enumerate(grupos):
+        df = construir_features(leer(grupo))
+        if df.empty:
+            continue
+        fechas = df["Fechaventa"]
+        en_test = fechas >= corte
+        en_val = (fechas >= inicio_val) & ~en_test if inicio_val is not None else np.zeros(len(df), dtype=bool)
+        mascaras = {"train": ~en_test & ~en_val, "val": en_val, "test": en_test}
+        for parte, m in mascaras.items():
+            if m.any():
+                cols = columnas + [ETIQUETA] + (["Fechaventa", "StockMes", "TiempoReposicionDias"] if parte == "test" else [])
+                ruta = tmp_dir / f"{parte}_{k:04d}.parquet"
+                df.loc[m, cols].to_parquet(ruta, index=False)
+                rutas[parte].append(ruta)
+
+        temporadas.update(map(str, df["Temporada"].cat.categories))
+        g = df.loc[mascaras["train"]].groupby("CodArticulo", observed=True)[ETIQUETA].agg(["sum", "count"])
+        sumas.append(g["sum"].rename(index=str))
+        cuentas.append(g["count"].rename(index=str))
+        stats.append(resumen_por_sku(df, media=None, respaldo=False).rename(index=str))
+
+    if not rutas["train"]:
+        raise ValueError("Sin filas de entrenamiento antes del corte")
+    return {
+        "rutas": rutas,
+        "temporadas": sorted(temporadas),
+        "suma": pd.concat(sumas),
+        "cuenta": pd.concat(cuentas),
+        "sku_stats": pd.concat(stats),
+    }
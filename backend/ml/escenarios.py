@@ -0,0 +1,66 @@
+"""
+Predicción de varios escenarios de filtros sobre un mismo dataset.
+
+Cada escenario da el mismo resultado que una corrida con esos filtros
+(limpiar_df + predecir_con_estado sin estado), pero el tipado (fechas,
+categorías) se hace una vez y las features y predicciones del dataset
+completo se calculan a lo sumo una vez:
+
+- SKUs que el escenario conserva enteros: sus filas de features no cambian
+  (los lags son por SKU), así que se toman de la pasada completa con su Pred;
+- SKUs que el filtro recorta (p. ej. una tienda de varias): se recalculan
+  features y predicción solo para esas filas.
+"""
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from ml.features import X_COLS, construir_features, tipar_df
+from ml.model_prediction import politica_stock
+from ml.model_registry import registry
+from ml.agregados import resumen_por_sku
+
+
+def mascara_filtros(df: pd.DataFrame, filtros: Optional[Dict]) -> np.ndarray:
+    """Filas que pasan los filtros, con la misma regla que etl_service.limpiar_df."""
+    m = np.ones(len(df), dtype=bool)
+    for k, v in (filtros or {}).items():
+        if v and k in df.columns:
+            m &= (df[k] == v).to_numpy(dtype=bool, na_value=False)
+    return m
+
+
+def predecir_escenarios(df: pd.DataFrame, escenarios: List[Dict]) -> List[pd.DataFrame]:
+    """Alertas por SKU de cada escenario, en el orden recibido."""
+    modelo = registry.get()
+    tipado = tipar_df(df).reset_index(drop=True)
+    codes = tipado["CodArticulo"].cat.codes.to_numpy().astype(np.int64)
+    n_sku = len(tipado["CodArticulo"].cat.categories)
+    total = np.bincount(codes, minlength=n_sku)
+    completo: Optional[pd.DataFrame] = None
+
+    def con_pred(filas: pd.DataFrame) -> pd.DataFrame:
+        feats = construir_features(filas)
+        feats["Pred"] = modelo.predict(feats[X_COLS]) if len(feats) else np.zeros(0)
+        return feats
+
+    resultados: Dict[str, pd.DataFrame] = {}
+    salida = []
+    for filtros in escenarios:
+        clave = repr(sorted((k, v) for k, v in (filtros or {}).items() if v))
+        if clave not in resultados:
+            m = mascara_filtros(tipado, filtros)
+            elegidas = np.bincount(codes[m], minlength=n_sku)
+            enteros = (elegidas == total) & (total > 0)
+            recortados = (elegidas > 0) & (elegidas < total)
+
+            partes = []
+            if enteros.any():
+                if completo is None:
+                    completo = con_pred(tipado)
+                partes.append(completo[enteros[completo["CodArticulo"].cat.codes.to_numpy()]])
+            if recortados.any():
+                partes.append(con_pred(tipado[m & recortados[codes]]))
+            filas = pd.concat(partes, ignore_index=True) if partes else con_pred(tipado.iloc[:0])
+            resultados[clave] = politica_stock(resumen_por_sku(filas))
+        salida.append(resultados[clave])
+    return salida
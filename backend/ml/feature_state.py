@@ -0,0 +1,147 @@
+import os
+import time
+import joblib
+import pandas as pd
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+from ml.features import orden_por_sku, posiciones_en_grupo
+from ml.agregados import resumen_por_sku
+
+STATE_PATH = Path("outputs/estado_features.joblib")
+
+# las ventanas más largas del pipeline (ma_30d) necesitan 30 observaciones previas;
+# se guarda el doble para tolerar que una corrida reenvíe días ya incorporados
+VENTANA = 30
+RETENCION = 2 * VENTANA
+COLS_ESTADO = ["CodArticulo", "Fechaventa", "CantidadVendida"]
+
+
+def cargar_estado(path: Path = STATE_PATH) -> Optional[pd.DataFrame]:
+    """Últimas RETENCION observaciones por SKU de la última corrida sin filtros."""
+    if not path.exists():
+        return None
+    return joblib.load(path)
+
+
+def version_estado(path: Path = STATE_PATH) -> Optional[tuple[int, int, int]]:
+    """Identidad del estado en disco: cambia con cada `guardar_estado` (None si no existe)."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _origen_path(path: Path) -> Path:
+    return path.with_name(path.name + ".origen")
+
+
+def origen_estado(path: Path = STATE_PATH) -> Optional[str]:
+    """Hash del contenido que escribió el estado (None: desconocido, p. ej. corrida incremental)."""
+    try:
+        return _origen_path(path).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _bloquear(f):
+    try:
+        import fcntl
+    except ImportError:     # Windows
+        import msvcrt
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                time.sleep(0.05)
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def _liberar(f):
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def bloqueo_estado(path: Path = STATE_PATH):
+    """
+    Lock exclusivo entre procesos (workers de la cola) e hilos sobre el
+    estado: la carga y el reemplazo del estado corren dentro de él para que
+    dos corridas sin filtros no se pisen (ver `version_estado`).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a+b") as f:
+        _bloquear(f)
+        try:
+            yield
+        finally:
+            _liberar(f)
+
+
+def guardar_estado(cola: pd.DataFrame, path: Path = STATE_PATH, origen: Optional[str] = None):
+    """
+    Reemplaza el estado (temporal único + rename) y registra a su lado
+    `origen`, el hash del contenido que lo generó. Llamar dentro de `bloqueo_estado`.
+    """
+    # el origen se borra antes de reemplazar el estado: un lector concurrente
+    # puede ver "desconocido", nunca el origen anterior junto al estado nuevo
+    _origen_path(path).unlink(missing_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{uuid4().hex}.tmp")
+    joblib.dump(cola, tmp)
+    os.replace(tmp, path)
+    if origen:
+        tmp = path.with_name(f"{path.name}.origen.{os.getpid()}.{uuid4().hex}.tmp")
+        tmp.write_text(origen)
+        os.replace(tmp, _origen_path(path))
+
+
+def historia_previa(historia: Optional[pd.DataFrame], nuevos: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """
+    Filas de la historia útiles como contexto de `nuevos` (ya tipado): solo SKUs
+    presentes en `nuevos` y solo observaciones anteriores a su primera fecha
+    nueva, para que los días reenviados reemplacen a los guardados.
+    """
+    if historia is None or historia.empty or nuevos.empty:
+        return None
+    primera = nuevos.groupby("CodArticulo", observed=True)["Fechaventa"].min()
+    limite = historia["CodArticulo"].astype(str).map(primera.rename(index=str))
+    return historia[historia["Fechaventa"] < limite].reset_index(drop=True)
+
+
+def actualizar_cola(historia: Optional[pd.DataFrame], nuevos: pd.DataFrame) -> pd.DataFrame:
+    """
+    Nueva cola por SKU: historia previa + filas nuevas, quedándose con las
+    últimas RETENCION observaciones de cada SKU. Los SKUs sin filas nuevas se
+    conservan tal cual.
+    """
+    nuevos = nuevos[COLS_ESTADO].assign(CodArticulo=nuevos["CodArticulo"].astype(str))
+    partes = [nuevos]
+    if historia is not None and not historia.empty:
+        hist = historia.assign(CodArticulo=historia["CodArticulo"].astype(str))
+        tocados = hist["CodArticulo"].isin(nuevos["CodArticulo"].unique())
+        previa = historia_previa(hist[tocados], nuevos) if tocados.any() else None
+        partes = [hist[~tocados]] + ([previa] if previa is not None else []) + partes
+
+    cola = pd.concat(partes, ignore_index=True)
+    cola["CodArticulo"] = cola["CodArticulo"].astype("category")
+    order = orden_por_sku(cola)
+    # posición contando desde el final de cada SKU
+    desde_fin = posiciones_en_grupo(cola["CodArticulo"].cat.codes.to_numpy()[order][::-1])[::-1]
+    return cola.iloc[order[desde_fin < RETENCION]].reset_index(drop=True)
+
+
+def sigma_cola(cola: pd.DataFrame) -> pd.Series:
+    """Desviación (ddof=0) de las últimas VENTANA ventas por SKU, 0 si no hay datos."""
+    # la cola viene ordenada por (SKU, fecha)
+    sigma = resumen_por_sku(cola, media=None, ultimo=None, primero=None, ventana=VENTANA, respaldo=False)
+    return sigma["d_sigma"].rename(index=str)
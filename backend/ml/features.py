@@ -0,0 +1,239 @@
+import os
+from pathlib import Path
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from typing import List, Optional
+from uuid import uuid4
+
+CATEGORICAS = ["CodArticulo", "Temporada"]
+BINARIAS = ["Promocion", "DiaFestivo", "EsDomingo", "TiendaCerrada"]
+NUMERICAS = ["PrecioVenta", "CantidadVendida", "StockMes", "TiempoReposicionDias"]
+
+LAG_COLS = ["lag_1d", "lag_7d", "ma_7d", "ma_14d", "ma_30d", "rolling_std_7d"]
+REQUIRED_LAGS = ["lag_7d", "ma_7d", "ma_14d", "ma_30d", "rolling_std_7d"]
+
+X_COLS = [
+    "CodArticulo", "Temporada",
+    "anio", "mes", "dia_semana", "semana_mes", "es_fin_de_mes",
+    "lag_1d", "lag_7d", "ma_7d", "ma_14d", "ma_30d", "rolling_std_7d",
+    "Promocion", "Precio_log", "DiaFestivo", "EsDomingo", "TiendaCerrada"
+]
+
+
+def _categoria_str(s: pd.Series) -> pd.Series:
+    # categorías como texto (convertir solo los valores únicos, no cada fila)
+    s = s.astype("category")
+    if not all(isinstance(c, str) for c in s.cat.categories):
+        s = s.cat.rename_categories(s.cat.categories.astype(str))
+    return s
+
+
+def tipar_df(df: pd.DataFrame) -> pd.DataFrame:
+    """Tipado robusto común a entrenamiento y predicción (no modifica el original)."""
+    df = df.copy(deep=False)
+    for col in BINARIAS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
+
+    if not pd.api.types.is_datetime64_any_dtype(df["Fechaventa"]):
+        df["Fechaventa"] = pd.to_datetime(df["Fechaventa"], errors="coerce", dayfirst=True)
+    df = df.dropna(subset=["Fechaventa"])
+    for col in CATEGORICAS:
+        df[col] = _categoria_str(df[col])
+    for col in NUMERICAS:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def orden_por_sku(df: pd.DataFrame) -> np.ndarray:
+    """Permutación estable que ordena por (CodArticulo, Fechaventa)."""
+    codes = df["CodArticulo"].cat.codes.to_numpy().astype(np.int64)
+    fechas = df["Fechaventa"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+    n = len(codes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # clave única (sku | día | fila) en un int64: un argsort simple es bastante
+    # más rápido que lexsort y la fila desempata de forma determinista
+    dia, resto = np.divmod(fechas - fechas.min(), 86_400 * 10**9)
+    bits_dia = int(dia.max()).bit_length()
+    bits_fila = int(n - 1).bit_length()
+    bits_sku = int(max(codes.max(), 0)).bit_length()
+    if resto.any() or bits_sku + bits_dia + bits_fila > 62:
+        return np.lexsort((fechas, codes))
+    clave = (codes << (bits_dia + bits_fila)) | (dia << bits_fila) | np.arange(n)
+    return np.argsort(clave)
+
+
+def agregar_calendario(df: pd.DataFrame) -> pd.DataFrame:
+    # aritmética de datetime64 en NumPy en lugar de los accesores .dt
+    dia = df["Fechaventa"].to_numpy().astype("datetime64[D]")
+    mes = dia.astype("datetime64[M]")
+    df["anio"] = mes.astype("datetime64[Y]").astype(int) + 1970
+    df["mes"] = mes.astype(int) % 12 + 1
+    df["dia_semana"] = (dia.astype(np.int64) + 3) % 7
+    df["semana_mes"] = ((dia - mes).astype(int) + 1) // 7 + 1
+    df["es_fin_de_mes"] = ((dia + 1).astype("datetime64[M]") != mes).astype(int)
+    df["Precio_log"] = np.log1p(df["PrecioVenta"])
+    return df
+
+
+def posiciones_en_grupo(codes: np.ndarray) -> np.ndarray:
+    """Índice de cada fila dentro de su SKU (requiere filas agrupadas por código)."""
+    n = len(codes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    inicio = np.r_[True, codes[1:] != codes[:-1]]
+    starts = np.flatnonzero(inicio)
+    grupo = np.cumsum(inicio) - 1
+    return np.arange(n) - starts[grupo]
+
+
+def _suma_ventana(cum: np.ndarray, w: int) -> np.ndarray:
+    # suma de las w observaciones previas a cada fila: cum[i] - cum[i-w]
+    out = np.full(len(cum) - 1, np.nan)
+    out[w:] = cum[w:-1] - cum[:-1 - w]
+    return out
+
+
+def calcular_lags(valores: np.ndarray, codes: np.ndarray) -> dict:
+    """
+    Lags, medias móviles y desviación de 7 días en una sola pasada.
+
+    `valores` y `codes` deben estar ordenados por (SKU, fecha). Cada ventana usa
+    solo observaciones previas del mismo SKU (equivale a shift(1).rolling(w)):
+    se calculan sobre sumas acumuladas globales y luego se anulan las filas
+    cuya ventana cruzaría al SKU anterior.
+    """
+    valores = np.asarray(valores, dtype=float)
+    n = len(valores)
+    pos = posiciones_en_grupo(codes)
+
+    es_nan = np.isnan(valores)
+    # centrar por SKU reduce la cancelación numérica en la suma de cuadrados
+    grupo = np.cumsum(pos == 0) - 1 if n else np.zeros(0, dtype=np.int64)
+    limpio = np.where(es_nan, 0.0, valores)
+    cnt = np.bincount(grupo, weights=~es_nan)
+    centro = (np.bincount(grupo, weights=limpio) / np.maximum(cnt, 1))[grupo]
+    dev = np.where(es_nan, 0.0, valores - centro)
+
+    cum = np.r_[0.0, np.cumsum(limpio)]
+    # ventanas que contienen algún NaN quedan en NaN (como rolling con min_periods=w)
+    nan_cum = np.r_[0.0, np.cumsum(es_nan)] if es_nan.any() else None
+
+    def invalida(w: int) -> np.ndarray:
+        mask = pos < w
+        if nan_cum is not None:
+            mask |= _suma_ventana(nan_cum, w) > 0
+        return mask
+
+    out = {}
+    for col, k in (("lag_1d", 1), ("lag_7d", 7)):
+        lag = np.full(n, np.nan)
+        lag[k:] = valores[:n - k]
+        lag[pos < k] = np.nan
+        out[col] = lag
+
+    for col, w in (("ma_7d", 7), ("ma_14d", 14), ("ma_30d", 30)):
+        ma = _suma_ventana(cum, w) / w
+        ma[invalida(w)] = np.nan
+        out[col] = ma
+
+    # std muestral (ddof=1) de las 7 observaciones previas
+    s1 = _suma_ventana(np.r_[0.0, np.cumsum(dev)], 7)
+    s2 = _suma_ventana(np.r_[0.0, np.cumsum(dev * dev)], 7)
+    std = np.sqrt(np.maximum(s2 - s1 * s1 / 7, 0.0) / 6)
+    std[invalida(7)] = np.nan
+    out["rolling_std_7d"] = std
+    return out
+
+
+def _lags_con_historia(df: pd.DataFrame, order: np.ndarray, historia: pd.DataFrame) -> dict:
+    """
+    Lags de las filas de `df` (en el orden `order`) usando además las
+    observaciones previas de `historia` (CodArticulo, Fechaventa, CantidadVendida)
+    como contexto. El costo es proporcional a filas nuevas + historia usada.
+    """
+    cats = df["CodArticulo"].cat.categories
+    h_codes = pd.Categorical(historia["CodArticulo"].astype(str), categories=cats).codes
+    usar = h_codes >= 0
+    n_hist = int(usar.sum())
+
+    codes = np.r_[h_codes[usar], df["CodArticulo"].cat.codes.to_numpy()[order]].astype(np.int64)
+    fechas = np.r_[
+        historia["Fechaventa"].to_numpy().astype("datetime64[ns]")[usar],
+        df["Fechaventa"].to_numpy().astype("datetime64[ns]")[order],
+    ]
+    valores = np.r_[
+        historia["CantidadVendida"].to_numpy(dtype=float)[usar],
+        df["CantidadVendida"].to_numpy(dtype=float)[order],
+    ]
+    # estable: la historia queda antes y las filas nuevas conservan su orden
+    o = np.lexsort((fechas, codes))
+    lags = calcular_lags(valores[o], codes[o])
+    nuevas = o >= n_hist
+    return {col: arr[nuevas] for col, arr in lags.items()}
+
+
+def construir_features(df: pd.DataFrame, dropna: bool = True,
+                       historia: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Pipeline único de features para entrenamiento y predicción.
+
+    Devuelve el frame tipado, ordenado por (CodArticulo, Fechaventa), con las
+    variables de calendario y de historia; por defecto sin las filas que aún
+    no tienen historia suficiente. Los lags se calculan sobre arrays ordenados
+    y el frame se reindexa una sola vez (orden + filtro en el mismo take).
+
+    `historia` (opcional) aporta observaciones anteriores a `df` solo como
+    contexto de lags/medias; no se devuelven como filas.
+    """
+    df = tipar_df(df)
+    order = orden_por_sku(df)
+    if historia is not None and not historia.empty:
+        lags = _lags_con_historia(df, order, historia)
+    else:
+        codes = df["CodArticulo"].cat.codes.to_numpy()[order]
+        valores = df["CantidadVendida"].to_numpy(dtype=float)[order]
+        lags = calcular_lags(valores, codes)
+
+    if dropna:
+        keep = np.ones(len(order), dtype=bool)
+        for col in REQUIRED_LAGS:
+            keep &= ~np.isnan(lags[col])
+        order = order[keep]
+        lags = {col: arr[keep] for col, arr in lags.items()}
+
+    df = df.iloc[order].reset_index(drop=True)
+    df = agregar_calendario(df)
+    for col, arr in lags.items():
+        df[col] = arr
+    return df
+
+
+# subir cuando cambie construir_features: invalida las matrices cacheadas
+FEATURES_VERSION = 1
+
+
+def guardar_features(df: pd.DataFrame, ruta: Path):
+    """Frame de features en Arrow IPC sin comprimir (se lee con memory map)."""
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    # temporal único: dos hilos del mismo proceso pueden escribir la misma ruta
+    tmp = ruta.with_name(f"{ruta.name}.{os.getpid()}.{uuid4().hex}.tmp")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(str(tmp), "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, ruta)
+
+
+def cargar_features(ruta: Path, columnas: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Lee la matriz guardada por `guardar_features` mapeada en memoria: varios
+    procesos que leen el mismo archivo comparten el page cache del SO.
+    """
+    with pa.memory_map(str(ruta)) as source:
+        table = ipc.open_file(source).read_all()
+    if columnas is not None:
+        table = table.select(columnas)
+    return table.to_pandas()
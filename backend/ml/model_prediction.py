@@ -1,78 +1,59 @@
 import pandas as pd
 import numpy as np
-import joblib
-from pathlib import Path
+from ml.model_registry import registry
+from ml.features import construir_features, tipar_df, X_COLS
+from ml.feature_state import actualizar_cola, historia_previa, sigma_cola
+from ml.agregados import resumen_por_sku
 
-MODEL_PATH = Path("outputs/modelo_xgb_sku_global.joblib")
+Z_SERVICIO = 1.28  # 90% servicio
 
 def _load_model():
-    if not MODEL_PATH.exists():
-        raise FileNotFoundError(
-            "Modelo no encontrado. Entrena primero con POST /api/model/train."
-        )
-    return joblib.load(MODEL_PATH)
-
-def robust_sigma(group: pd.Series) -> float:
-    last = group.tail(30)
-    sigma = last.std(ddof=0)
-    if np.isnan(sigma):
-        sigma = group.std(ddof=0)
-    return 0.0 if np.isnan(sigma) else sigma
-
-def procesar_prediccion_global(df: pd.DataFrame) -> pd.DataFrame:
-    # Carga perezosa del modelo (evita fallo al importar el módulo)
+    # el registro mantiene el pipeline residente y lo recarga si cambia en disco
+    return registry.get()
+
+def procesar_prediccion_global(df: pd.DataFrame, historia: pd.DataFrame | None = None) -> pd.DataFrame:
+    resultado, _ = predecir_con_estado(df, historia, actualizar=False)
+    return resultado
+
+def predecir_con_estado(df: pd.DataFrame, historia: pd.DataFrame | None = None,
+                        actualizar: bool = True):
+    """
+    Predicción + nueva cola de estado por SKU (None si actualizar=False).
+
+    Con `historia` (estado persistido de ml/feature_state.py) `df` puede traer
+    solo los días nuevos: los lags se completan con la cola guardada, solo se
+    predicen las filas nuevas y d_sigma sale de la cola actualizada.
+    """
+    # Modelo residente (se deserializa solo la primera vez o si cambió)
     modelo = _load_model()
 
-    # Limpieza y tipado
-    df["Fechaventa"] = pd.to_datetime(df["Fechaventa"], errors="coerce", dayfirst=True)
-    df = df.dropna(subset=["Fechaventa"])
-    df["CodArticulo"] = df["CodArticulo"].astype("category")
-    df["Temporada"] = df["Temporada"].astype("category")
-    df["PrecioVenta"] = pd.to_numeric(df["PrecioVenta"], errors="coerce")
-    df["CantidadVendida"] = pd.to_numeric(df["CantidadVendida"], errors="coerce")
-    df["StockMes"] = pd.to_numeric(df["StockMes"], errors="coerce")
-    df["TiempoReposicionDias"] = pd.to_numeric(df["TiempoReposicionDias"], errors="coerce")
-
-    # Features temporales
-    df["anio"] = df["Fechaventa"].dt.year
-    df["mes"] = df["Fechaventa"].dt.month
-    df["dia_semana"] = df["Fechaventa"].dt.dayofweek
-    df["semana_mes"] = df["Fechaventa"].dt.day // 7 + 1
-    df["es_fin_de_mes"] = df["Fechaventa"].dt.is_month_end.astype(int)
-    df["Precio_log"] = np.log1p(df["PrecioVenta"])
-
-    # Lags y medias móviles
-    grp = df.groupby("CodArticulo", observed=True)
-    df["lag_1d"] = grp["CantidadVendida"].shift(1)
-    df["lag_7d"] = grp["CantidadVendida"].shift(7)
-    df["ma_7d"] = grp["CantidadVendida"].shift(1).rolling(7).mean()
-    df["ma_14d"] = grp["CantidadVendida"].shift(1).rolling(14).mean()
-    df["ma_30d"] = grp["CantidadVendida"].shift(1).rolling(30).mean()
-    df["rolling_std_7d"] = grp["CantidadVendida"].shift(1).rolling(7).std()
-
-    df = df.dropna(subset=["lag_7d", "ma_7d", "ma_14d", "ma_30d", "rolling_std_7d"])
-
-    # Selección de variables
-    X = df[[
-        "CodArticulo", "Temporada",
-        "anio", "mes", "dia_semana", "semana_mes", "es_fin_de_mes",
-        "lag_1d", "lag_7d", "ma_7d", "ma_14d", "ma_30d", "rolling_std_7d",
-        "Promocion", "Precio_log", "DiaFestivo", "EsDomingo", "TiendaCerrada"
-    ]]
+    # Tipado, calendario, lags y medias móviles (mismo pipeline que entrenamiento)
+    tipado = tipar_df(df)
+    previa = historia_previa(historia, tipado)
+    df = construir_features(tipado, historia=previa)
+    cola = actualizar_cola(historia, tipado) if actualizar or previa is not None else None
+    X = df[X_COLS]
 
     df["Pred"] = modelo.predict(X)
 
     # Agregados y alertas
-    Z = 1.28  # 90% servicio
-    d_media = df.groupby("CodArticulo", observed=True)["Pred"].mean()
-    d_sigma = df.groupby("CodArticulo", observed=True)["CantidadVendida"].apply(robust_sigma)
-    sku_stats = df.groupby("CodArticulo", observed=True).agg(
-        StockMes=("StockMes", "last"),
-        horizon=("TiempoReposicionDias", "first")
-    )
-
-    alerta = pd.concat([d_media, d_sigma], axis=1, keys=["d_media", "d_sigma"]).join(sku_stats)
-    alerta["seguridad"] = Z * alerta["d_sigma"] * np.sqrt(alerta["horizon"])
+    # d_media, d_sigma (últimas 30 ventas), último stock y lead time en una pasada
+    if previa is not None:
+        alerta = resumen_por_sku(df, sigma=None)
+        alerta.insert(1, "d_sigma", sigma_cola(cola).reindex(alerta.index.astype(str)).to_numpy())
+    else:
+        alerta = resumen_por_sku(df)
+    return politica_stock(alerta), cola
+
+
+def politica_stock(alerta: pd.DataFrame, z: float = Z_SERVICIO, multiplicador: float = 1.0) -> pd.DataFrame:
+    """
+    Stock objetivo, cobertura, Estado y Accion desde los agregados de
+    resumen_por_sku. `multiplicador` escala el lead time (`horizon`).
+    """
+    if multiplicador != 1.0:
+        alerta = alerta.assign(horizon=alerta["horizon"] * multiplicador)
+    alerta["seguridad"] = z * alerta["d_sigma"] * np.sqrt(alerta["horizon"])
     alerta["stock_objetivo"] = (alerta["d_media"] * alerta["horizon"] + alerta["seguridad"]).round()
 
     alerta["dias_cobertura"] = (alerta["StockMes"] / alerta["d_media"]).round(1)
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+import joblib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+from uuid import uuid4
+
+MODEL_PATH = Path("outputs/modelo_xgb_sku_global.joblib")
+
+
+def _hash_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+
+def guardar_modelo(model: Any, path: Path = MODEL_PATH):
+    """
+    Escribe a un temporal y renombra, para que ningún lector vea un archivo a
+    medias. El temporal es único: dos entrenamientos en workers distintos no
+    escriben sobre el mismo archivo.
+    """
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{uuid4().hex}.tmp")
+    try:
+        joblib.dump(model, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+class ModelRegistry:
+    """
+    Mantiene el pipeline entrenado residente en memoria (uno por proceso).
+
+    En cada acceso solo se hace un `stat` del archivo; si cambió su mtime/tamaño
+    se recalcula el hash y, si el contenido es distinto, se deserializa la nueva
+    versión y se reemplaza de forma atómica bajo lock. La deserialización corre
+    fuera de `_lock` (una a la vez, bajo `_carga`): mientras tanto los demás
+    hilos siguen usando el modelo anterior.
+    """
+
+    def __init__(self, path: Path = MODEL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._carga = threading.Lock()
+        self._model: Any = None
+        self._version: Optional[str] = None
+        self._stamp: Optional[tuple] = None
+        self._loaded_at: Optional[str] = None
+        self._disk: tuple = (None, None)    # (stamp, hash) del archivo en disco
+
+    def _stat(self) -> Optional[tuple]:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _refresh(self, force: bool = False):
+        with self._lock:
+            stamp = self._stat()
+            if stamp is None:
+                self._model, self._version, self._stamp, self._loaded_at = None, None, None, None
+                return
+            if not force and stamp == self._stamp:
+                return
+            version = self._disk_version(stamp)
+            if not force and version == self._version and self._model is not None:
+                self._stamp = stamp
+                return
+        with self._carga:
+            with self._lock:
+                if not force and self._stamp == stamp and self._model is not None:
+                    return      # otro hilo ya publicó esta versión
+            # se carga fuera del estado compartido y luego se publica de una vez
+            model = joblib.load(self.path)
+            with self._lock:
+                self._model, self._version, self._stamp = model, version, stamp
+                self._loaded_at = datetime.utcnow().isoformat()
+
+    def get(self) -> Any:
+        self._refresh()
+        with self._lock:
+            if self._model is None:
+                raise FileNotFoundError(
+                    "Modelo no encontrado. Entrena primero con POST /api/model/train."
+                )
+            return self._model
+
+    def reload(self) -> Optional[str]:
+        """Fuerza la recarga (p. ej. justo después de entrenar)."""
+        self._refresh(force=True)
+        with self._lock:
+            return self._version
+
+    @property
+    def version(self) -> Optional[str]:
+        with self._lock:
+            return self._version
+
+    def _disk_version(self, stamp: tuple) -> str:
+        if self._disk[0] != stamp:
+            self._disk = (stamp, _hash_file(self.path))
+        return self._disk[1]
+
+    def info(self) -> dict:
+        """Versión activa y versión en disco, sin forzar la carga del modelo."""
+        with self._lock:
+            stamp = self._stat()
+            disk_version = self._disk_version(stamp) if stamp else None
+            return {
+                "loaded": self._model is not None,
+                "version": self._version or disk_version,
+                "disk_version": disk_version,
+                "loaded_at": self._loaded_at,
+            }
+
+
+registry = ModelRegistry()
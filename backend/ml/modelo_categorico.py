@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from typing import Dict, List, Optional, Tuple
+from ml.features import CATEGORICAS, posiciones_en_grupo
+
+CODIFICACIONES = ("nativo", "target")
+
+
+def params_booster(params: dict, nthread: Optional[int] = None) -> Tuple[dict, int]:
+    """Parámetros estilo XGBRegressor -> (params de xgb.train, num_boost_round)."""
+    params = dict(params)
+    rondas = params.pop("n_estimators", 100)
+    if "random_state" in params:
+        params["seed"] = params.pop("random_state")
+    params["tree_method"] = "hist"
+    if nthread:
+        params["nthread"] = nthread
+    return params, rondas
+
+
+class ModeloCategorico:
+    """
+    XGBoost `hist` sin one-hot por SKU: la matriz conserva una sola columna por
+    categórica, así que memoria y construcción de árboles no crecen con el catálogo.
+
+    codificacion="nativo": CodArticulo y Temporada como categóricas nativas
+    de XGBoost (enable_categorical).
+    codificacion="target": CodArticulo como media suavizada de la venta por SKU
+    (`suavizado` observaciones hacia la media global); Temporada sigue nativa.
+    Las filas de entrenamiento se codifican con la media de las ventas
+    *anteriores* del SKU (ventana expansiva, filas en orden temporal dentro
+    de cada SKU como las deja construir_features), así ninguna ve su propia
+    venta; la media de todo el entrenamiento queda para validación y predicción.
+
+    Se entrena con `xgb.train` sobre un QuantileDMatrix construido directo desde
+    el frame de features (sin la copia densa en float que arma XGBRegressor),
+    con `nthread` configurable y early stopping opcional sobre un conjunto de
+    validación. `fit_iter` arma el mismo QuantileDMatrix desde un iterador por
+    bloques (ml/entrenamiento_particiones.py) para historias que no caben en
+    memoria como un solo frame.
+
+    XGBoost usa los códigos de pandas, así que se guardan las categorías vistas
+    en el entrenamiento y en predicción se recodifican contra ellas (un SKU
+    nuevo queda como faltante, o con la media global en modo target). Expone
+    `predict` igual que el Pipeline one-hot, así el registro y la predicción no
+    distinguen el modo.
+    """
+
+    def __init__(self, codificacion: str = "nativo", suavizado: float = 20.0,
+                 nthread: Optional[int] = None, max_bin: int = 256, **params):
+        if codificacion not in CODIFICACIONES:
+            raise ValueError(f"Codificación desconocida: {codificacion}")
+        self.codificacion = codificacion
+        self.suavizado = suavizado
+        self.nthread = nthread
+        self.max_bin = max_bin
+        self.params = params
+        self.categorias: Dict[str, List[str]] = {}
+        self.media_sku: pd.Series | None = None
+        self.media_global = 0.0
+        self.booster: xgb.Booster | None = None
+        self.columnas: List[str] = []
+
+    def _con_categorias(self, s: pd.Series, cats: List[str]) -> pd.Series:
+        if not isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype(str).astype("category")
+        return s.cat.set_categories(cats)
+
+    def _preparar(self, X: pd.DataFrame, y=None) -> pd.DataFrame:
+        """`y` (solo filas de entrenamiento, modo target): codificación expansiva con esas ventas."""
+        X = X.copy(deep=False)
+        for col, cats in self.categorias.items():
+            X[col] = self._con_categorias(X[col], cats)
+        if self.codificacion == "target":
+            codes = X["CodArticulo"].cat.codes.to_numpy()
+            if y is not None:
+                X["CodArticulo"] = self._medias_previas(codes, np.asarray(y, dtype=float))
+            else:
+                # media por categoría y luego por código: sin convertir cada fila a texto
+                valores = self.media_sku.reindex(self.categorias["CodArticulo"]).to_numpy()
+                X["CodArticulo"] = np.where(codes >= 0, valores[codes], self.media_global)
+        return X[self.columnas]
+
+    def _medias_previas(self, codes: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Media suavizada de las ventas anteriores de cada fila dentro de su SKU."""
+        orden = np.argsort(codes, kind="stable")     # conserva el orden temporal dentro del SKU
+        v = y[orden]
+        previas = np.cumsum(v) - v                   # suma de todas las filas anteriores
+        pos = posiciones_en_grupo(codes[orden])      # cuántas anteriores son del mismo SKU
+        idx = np.arange(len(v))
+        suma = previas - previas[idx - pos]
+        out = np.empty(len(v))
+        out[orden] = (suma + self.suavizado * self.media_global) / (pos + self.suavizado)
+        return out
+
+    def medias_target(self, suma: pd.Series, cuenta: pd.Series, media_global: float) -> pd.Series:
+        """Media suavizada por SKU a partir de suma y cantidad de ventas."""
+        return ((suma + self.suavizado * media_global) / (cuenta + self.suavizado)).rename(index=str)
+
+    def _matriz(self, datos, etiqueta=None, ref=None, entrenamiento: bool = False) -> xgb.QuantileDMatrix:
+        if isinstance(datos, xgb.DataIter):
+            # iterador con caché en disco: las páginas cuantizadas quedan fuera de RAM
+            cls = xgb.ExtMemQuantileDMatrix if getattr(datos, "externa", False) else xgb.QuantileDMatrix
+            return cls(datos, ref=ref, enable_categorical=True, max_bin=self.max_bin, nthread=self.nthread)
+        X = self._preparar(datos, etiqueta if entrenamiento else None)
+        return xgb.QuantileDMatrix(X, etiqueta, ref=ref, enable_categorical=True,
+                                   max_bin=self.max_bin, nthread=self.nthread)
+
+    def _entrenar(self, dtrain, dval=None, early_stopping_rounds: Optional[int] = None,
+                  callbacks: Optional[list] = None):
+        params, rondas = params_booster(self.params, self.nthread)
+        evals = [(dval, "val")] if dval is not None else []
+        self.booster = xgb.train(
+            params, dtrain, num_boost_round=rondas, evals=evals,
+            early_stopping_rounds=early_stopping_rounds if evals else None, verbose_eval=False,
+            callbacks=callbacks,
+        )
+        return self
+
+    def fit(self, X: pd.DataFrame, y, eval_set: Optional[Tuple[pd.DataFrame, object]] = None,
+            early_stopping_rounds: Optional[int] = None, callbacks: Optional[list] = None):
+        self.columnas = list(X.columns)
+        self.categorias = {
+            col: [str(c) for c in X[col].astype("category").cat.categories]
+            for col in CATEGORICAS if col in X.columns
+        }
+        if self.codificacion == "target":
+            y = pd.Series(np.asarray(y, dtype=float), index=X.index)
+            sku = self._con_categorias(X["CodArticulo"], self.categorias["CodArticulo"])
+            g = y.groupby(sku, observed=False).agg(["sum", "count"])
+            self.media_global = float(y.mean())
+            self.media_sku = self.medias_target(g["sum"], g["count"], self.media_global)
+        dtrain = self._matriz(X, y, entrenamiento=True)
+        dval = None
+        if eval_set is not None and len(eval_set[0]):
+            dval = self._matriz(eval_set[0], eval_set[1], ref=dtrain)
+        return self._entrenar(dtrain, dval, early_stopping_rounds, callbacks)
+
+    def fit_iter(self, train: xgb.DataIter, val: Optional[xgb.DataIter] = None,
+                 early_stopping_rounds: Optional[int] = None):
+        """
+        Entrena desde iteradores por bloques. `columnas`, `categorias` y (en
+        modo target) `media_sku`/`media_global` deben fijarse antes, porque
+        cada bloque se pasa por `_preparar` (los de `train` con su etiqueta,
+        para la codificación expansiva).
+        """
+        dtrain = self._matriz(train)
+        dval = self._matriz(val, ref=dtrain) if val is not None else None
+        return self._entrenar(dtrain, dval, early_stopping_rounds)
+
+    @property
+    def best_iteration(self) -> Optional[int]:
+        return getattr(self.booster, "best_iteration", None)
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        rango = (0, self.best_iteration + 1) if self.best_iteration is not None else (0, 0)
+        return self.booster.inplace_predict(self._preparar(X), iteration_range=rango)
+
+    def get_feature_names_out(self) -> np.ndarray:
+        return np.array(self.columnas, dtype=object)
+
+    @property
+    def feature_importances_(self) -> np.ndarray:
+        # ganancia media normalizada, como XGBRegressor.feature_importances_
+        score = self.booster.get_score(importance_type="gain")
+        gain = np.array([score.get(c, 0.0) for c in self.columnas], dtype=np.float32)
+        total = gain.sum()
+        return gain / total if total > 0 else gain
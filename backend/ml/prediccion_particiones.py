@@ -0,0 +1,77 @@
+"""
+Predicción particionada por grupos de SKU en un pool de procesos.
+
+Cada partición (hash estable de CodArticulo) corre completa en un worker:
+features, `modelo.predict`, agregados y política de stock, con su parte de la
+cola de estado. Las alertas y colas se unen al final; como todas las filas de
+un SKU caen en la misma partición, el resultado es el mismo que el de una
+pasada única.
+
+No se parte por tienda: las alertas son por SKU y sus lags recorren todas las
+tiendas, así que una partición por tienda cambiaría los agregados.
+
+El pool es persistente en el proceso (ml/procesos.py: pool_compartido) y
+cada worker mantiene el modelo residente en su `registry`: solo se
+deserializa en la primera corrida o cuando cambia en disco. La API corre las
+predicciones particionadas desde un hilo propio (job_queue, `local`), no
+desde un worker del pool de jobs: un worker no abre pools y ahí la
+predicción correría en una sola pasada.
+"""
+from typing import Optional
+import numpy as np
+import pandas as pd
+from ml.features import orden_por_sku
+from ml.model_prediction import predecir_con_estado
+from ml.procesos import pool_compartido, workers_para
+
+
+def particion_sku(skus: pd.Series, n: int) -> np.ndarray:
+    """Partición 0..n-1 de cada fila; estable entre procesos y corridas."""
+    valores = skus.astype(str).to_numpy(dtype=object)
+    return (pd.util.hash_array(valores) % np.uint64(n)).astype(np.int64)
+
+
+def _unir_colas(colas: list) -> Optional[pd.DataFrame]:
+    colas = [c for c in colas if c is not None and not c.empty]
+    if not colas:
+        return None
+    cola = pd.concat([c.assign(CodArticulo=c["CodArticulo"].astype(str)) for c in colas], ignore_index=True)
+    cola["CodArticulo"] = cola["CodArticulo"].astype("category")
+    return cola.iloc[orden_por_sku(cola)].reset_index(drop=True)
+
+
+def predecir_particionado(df: pd.DataFrame, historia: Optional[pd.DataFrame] = None,
+                          actualizar: bool = True, n_particiones: Optional[int] = None,
+                          workers: Optional[int] = None):
+    """
+    Igual que `predecir_con_estado`, repartiendo los SKUs en `n_particiones`
+    (por defecto una por worker) sobre `workers` procesos (por defecto uno por
+    núcleo). Con una sola partición o un solo proceso corre en el proceso actual.
+    """
+    workers = workers_para(workers, n_particiones)
+    n = max(1, n_particiones or workers)
+    if n == 1 or workers == 1 or df.empty:
+        return predecir_con_estado(df, historia, actualizar)
+
+    parte = particion_sku(df["CodArticulo"], n)
+    parte_hist = particion_sku(historia["CodArticulo"], n) if historia is not None else None
+    tareas, sin_filas = [], []
+    for k in range(n):
+        hist_k = historia[parte_hist == k] if historia is not None else None
+        filas = df[parte == k]
+        if filas.empty:
+            # sin días nuevos la cola de estos SKUs se conserva tal cual
+            sin_filas.append(hist_k)
+        else:
+            tareas.append((filas, hist_k))
+
+    ex = pool_compartido(workers)
+    resultados = [f.result() for f in [ex.submit(predecir_con_estado, f, h, actualizar) for f, h in tareas]]
+
+    alerta = pd.concat([r[0].assign(CodArticulo=r[0]["CodArticulo"].astype(str)) for r in resultados],
+                       ignore_index=True)
+    alerta = alerta.sort_values("CodArticulo", kind="stable", ignore_index=True)
+    alerta["CodArticulo"] = alerta["CodArticulo"].astype("category")
+    colas = [r[1] for r in resultados]
+    cola = _unir_colas(colas + sin_filas) if any(c is not None for c in colas) else None
+    return alerta, cola
@@ -0,0 +1,73 @@
+"""
+Pools de procesos compartidos por la cola de jobs, la predicción
+particionada, el backtest y el tuning.
+
+Todos usan `spawn` (no fork): hacer fork de un proceso donde XGBoost/OpenMP
+ya levantó hilos puede dejar al hijo bloqueado.
+
+Cada worker recibe núcleos / workers hilos (XGBoost con `nthread` global) y
+queda marcado como worker: dentro de él `workers_para` devuelve 1 y nunca se
+abre un pool anidado. Por eso la API coordina los trabajos que se reparten
+(predicción particionada, tuning, backtest) desde hilos de su propio proceso
+(app/services/job_queue.py: get_coordinador) y no desde el pool de jobs.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import xgboost as xgb
+
+_hilos = os.cpu_count() or 1        # hilos asignados a este proceso
+_en_worker = False
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _iniciar_worker(hilos: int):
+    global _hilos, _en_worker
+    _hilos, _en_worker = hilos, True
+    xgb.set_config(nthread=hilos)
+
+
+def en_worker() -> bool:
+    return _en_worker
+
+
+def hilos_por_proceso(workers: int) -> int:
+    """Hilos de XGBoost para cada uno de `workers` procesos que reparten los de este."""
+    return max(1, _hilos // max(1, workers))
+
+
+def workers_para(pedidos: Optional[int], tareas: Optional[int] = None) -> int:
+    """Procesos para `tareas` trabajos (`pedidos` o uno por núcleo); 1 dentro de un worker."""
+    if _en_worker:
+        return 1
+    return max(1, min(pedidos or _hilos, tareas or _hilos))
+
+
+def crear_pool(workers: int) -> ProcessPoolExecutor:
+    """Pool `spawn` de `workers` procesos; quien lo crea lo cierra."""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_iniciar_worker,
+        initargs=(hilos_por_proceso(workers),),
+    )
+
+
+def pool_compartido(workers: int) -> ProcessPoolExecutor:
+    """
+    Pool persistente en el proceso (se recrea si cambia `workers`): los
+    workers mantienen el modelo residente en su `registry` entre corridas.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = crear_pool(workers)
+            _pool_workers = workers
+        return _pool
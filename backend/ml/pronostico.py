@@ -0,0 +1,108 @@
+"""
+Pronóstico hacia adelante de H días por SKU, recursivo y por lotes.
+
+Por SKU se guardan sus últimas VENTANA ventas en una matriz (SKUs x 30). En
+cada paso se calculan lags/medias de todos los SKUs desde esa matriz, se hace
+un solo `predict` y la predicción entra a la ventana como la venta del día:
+H pasos son H llamadas al modelo, sin loops por SKU.
+
+Los lags son por observación (como calcular_lags): el día k se pronostica
+como la observación siguiente a la última conocida del SKU, con fecha
+última + k. Las variables exógenas futuras no se conocen: precio y temporada
+se mantienen en el último valor observado y promoción, feriado y tienda
+cerrada van en 0 (EsDomingo sale del calendario). Solo se pronostican los
+SKUs que tendrían features completas en la predicción normal.
+"""
+from typing import Optional
+import numpy as np
+import pandas as pd
+from ml.features import BINARIAS, REQUIRED_LAGS, X_COLS, agregar_calendario, orden_por_sku, posiciones_en_grupo, tipar_df
+from ml.model_registry import registry
+
+VENTANA = 30   # la ventana más larga del pipeline (ma_30d)
+
+
+def lags_desde_ventana(ventana: np.ndarray) -> dict:
+    """Mismas variables que calcular_lags para la observación siguiente a cada fila de `ventana`."""
+    ultimas7 = ventana[:, -7:]
+    return {
+        "lag_1d": ventana[:, -1],
+        "lag_7d": ventana[:, -7],
+        "ma_7d": ultimas7.mean(axis=1),
+        "ma_14d": ventana[:, -14:].mean(axis=1),
+        "ma_30d": ventana[:, -30:].mean(axis=1),
+        "rolling_std_7d": ultimas7.std(axis=1, ddof=1),
+    }
+
+
+def estado_inicial(df: pd.DataFrame) -> dict:
+    """Ventana de ventas, última fecha, precio y temporada por SKU desde el histórico tipado."""
+    order = orden_por_sku(df)
+    codes = df["CodArticulo"].cat.codes.to_numpy()[order]
+    valores = df["CantidadVendida"].to_numpy(dtype=float)[order]
+    n = len(codes)
+    # posición contando desde el final de cada SKU
+    desde_fin = posiciones_en_grupo(codes[::-1])[::-1]
+    ultimas = np.flatnonzero(desde_fin == 0)
+    skus = codes[ultimas]
+
+    ventana = np.full((len(skus), VENTANA), np.nan)
+    fila = np.repeat(np.arange(len(skus)), np.diff(np.r_[0, ultimas + 1]))
+    usar = desde_fin < VENTANA
+    ventana[fila[usar], VENTANA - 1 - desde_fin[usar]] = valores[usar]
+
+    idx = order[ultimas] if n else np.zeros(0, dtype=np.int64)
+    return {
+        "CodArticulo": df["CodArticulo"].iloc[idx].reset_index(drop=True),
+        "Temporada": df["Temporada"].iloc[idx].reset_index(drop=True),
+        "ultima_fecha": df["Fechaventa"].to_numpy().astype("datetime64[D]")[idx],
+        "precio": df["PrecioVenta"].to_numpy(dtype=float)[idx],
+        "ventana": ventana,
+    }
+
+
+def pronosticar(df: pd.DataFrame, horizonte: int, modelo=None, minimo: Optional[float] = 0.0) -> pd.DataFrame:
+    """
+    Filas (CodArticulo, Fechaventa, paso, Pred) con paso = 1..horizonte para
+    cada SKU pronosticable de `df`. `minimo` acota las predicciones (demanda
+    no negativa) antes de que entren a la ventana; None no acota.
+    """
+    modelo = modelo if modelo is not None else registry.get()
+    estado = estado_inicial(tipar_df(df))
+    ventana = estado["ventana"]
+
+    completos = np.ones(len(ventana), dtype=bool)
+    for col, arr in lags_desde_ventana(ventana).items():
+        if col in REQUIRED_LAGS:
+            completos &= ~np.isnan(arr)
+    ventana = ventana[completos]
+    skus = estado["CodArticulo"][completos].reset_index(drop=True)
+    base = pd.DataFrame({
+        "CodArticulo": skus,
+        "Temporada": estado["Temporada"][completos].reset_index(drop=True),
+        "PrecioVenta": estado["precio"][completos],
+        **{col: 0 for col in BINARIAS},
+    })
+    ultima = estado["ultima_fecha"][completos]
+
+    fechas, preds = [], []
+    for paso in range(1, horizonte + 1):
+        X = base.assign(Fechaventa=(ultima + paso).astype("datetime64[ns]"))
+        X = agregar_calendario(X)
+        X["EsDomingo"] = (X["dia_semana"] == 6).astype(int)
+        for col, arr in lags_desde_ventana(ventana).items():
+            X[col] = arr
+        pred = np.asarray(modelo.predict(X[X_COLS]), dtype=float) if len(X) else np.zeros(0)
+        if minimo is not None:
+            pred = np.maximum(pred, minimo)
+        ventana = np.concatenate([ventana[:, 1:], pred[:, None]], axis=1)
+        fechas.append(X["Fechaventa"].to_numpy())
+        preds.append(pred)
+
+    n = len(skus)
+    return pd.DataFrame({
+        "CodArticulo": np.tile(skus.astype(str).to_numpy(dtype=object), horizonte),
+        "Fechaventa": np.concatenate(fechas) if fechas else np.zeros(0, dtype="datetime64[ns]"),
+        "paso": np.repeat(np.arange(1, horizonte + 1), n),
+        "Pred": np.concatenate(preds) if preds else np.zeros(0),
+    }).sort_values(["CodArticulo", "paso"], kind="stable", ignore_index=True)
@@ -1,132 +1,252 @@
+import tempfile
 import pandas as pd
 import numpy as np
-import joblib
 from pathlib import Path
+from typing import Callable, List, Optional
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.metrics import mean_absolute_error
 from xgboost import XGBRegressor
+from ml.model_registry import guardar_modelo
+from ml.features import construir_features, X_COLS
+from ml.modelo_categorico import ModeloCategorico
+from ml.agregados import resumen_por_sku
+from ml.entrenamiento_particiones import ETIQUETA, IteradorParquet, escribir_particiones, grupos_sku
 
 OUTPUT_DIR = Path("outputs")
 OUTPUT_DIR.mkdir(exist_ok=True)
 MODEL_PATH = OUTPUT_DIR / "modelo_xgb_sku_global.joblib"
 
-def entrenar_modelo(df: pd.DataFrame) -> dict:
-    # Tipado robusto
-    binarias = ["Promocion", "DiaFestivo", "EsDomingo", "TiendaCerrada"]
-    for col in binarias:
-        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
-
-    df["Fechaventa"] = pd.to_datetime(df["Fechaventa"], errors="coerce", dayfirst=True)
-    df = df.dropna(subset=["Fechaventa"])
-    df["CodArticulo"] = df["CodArticulo"].astype("category")
-    df["Temporada"] = df["Temporada"].astype("category")
-    df["PrecioVenta"] = pd.to_numeric(df["PrecioVenta"], errors="coerce")
-    df["CantidadVendida"] = pd.to_numeric(df["CantidadVendida"], errors="coerce")
-    df["StockMes"] = pd.to_numeric(df["StockMes"], errors="coerce")
-    df["TiempoReposicionDias"] = pd.to_numeric(df["TiempoReposicionDias"], errors="coerce")
-
-    df = df.sort_values(["CodArticulo", "Fechaventa"])
-
-    # Features
-    df["anio"] = df["Fechaventa"].dt.year
-    df["mes"] = df["Fechaventa"].dt.month
-    df["dia_semana"] = df["Fechaventa"].dt.dayofweek
-    df["semana_mes"] = df["Fechaventa"].dt.day // 7 + 1
-    df["es_fin_de_mes"] = df["Fechaventa"].dt.is_month_end.astype(int)
-    df["Precio_log"] = np.log1p(df["PrecioVenta"])
-
-    grp = df.groupby("CodArticulo", observed=True)
-    df["lag_1d"] = grp["CantidadVendida"].shift(1)
-    df["lag_7d"] = grp["CantidadVendida"].shift(7)
-    df["ma_7d"] = grp["CantidadVendida"].shift(1).rolling(7).mean()
-    df["ma_14d"] = grp["CantidadVendida"].shift(1).rolling(14).mean()
-    df["ma_30d"] = grp["CantidadVendida"].shift(1).rolling(30).mean()
-    df["rolling_std_7d"] = grp["CantidadVendida"].shift(1).rolling(7).std()
-
-    df = df.dropna(subset=["lag_7d", "ma_7d", "ma_14d", "ma_30d", "rolling_std_7d"]).reset_index(drop=True)
+MODOS = ("onehot", "nativo", "target")
 
-    # Split temporal
-    cutoff = "2024-10-01"
-    train = df[df["Fechaventa"] < cutoff]
-    test = df[df["Fechaventa"] >= cutoff]
-
-    y_tr, y_te = train["CantidadVendida"], test["CantidadVendida"]
-    X_cols = [
-        "CodArticulo", "Temporada",
-        "anio", "mes", "dia_semana", "semana_mes", "es_fin_de_mes",
-        "lag_1d", "lag_7d", "ma_7d", "ma_14d", "ma_30d", "rolling_std_7d",
-        "Promocion", "Precio_log", "DiaFestivo", "EsDomingo", "TiendaCerrada"
-    ]
-    X_tr, X_te = train[X_cols], test[X_cols]
-
-    # X_tr["CodArticulo"] = X_tr["CodArticulo"].astype(str)
-    X_tr.loc[:, "CodArticulo"] = X_tr["CodArticulo"].astype(str)
-    # X_tr["Temporada"] = X_tr["Temporada"].astype(str)
-    X_tr.loc[:, "Temporada"] = X_tr["Temporada"].astype(str)
-    X_te["CodArticulo"] = X_te["CodArticulo"].astype(str)
-    X_te["Temporada"] = X_te["Temporada"].astype(str)
+# split temporal: CUTOFF si la historia lo cruza; si no, los últimos TEST_DIAS
+CUTOFF = "2024-10-01"
+TEST_DIAS = 30
+# early stopping: los VALIDACION_DIAS previos al corte como validación
+VALIDACION_DIAS = 14
 
-    # Entrenamiento
-    pipe = Pipeline([
+XGB_PARAMS = dict(
+    n_estimators=500,
+    learning_rate=0.03,
+    max_depth=6,
+    subsample=0.85,
+    colsample_bytree=0.85,
+    reg_lambda=1.0,
+    reg_alpha=0.5,
+    objective="reg:squarederror",
+    random_state=42
+)
+
+def construir_estimador(modo: str = "onehot", nthread: Optional[int] = None):
+    """
+    onehot: ColumnTransformer(OneHotEncoder) + XGBoost (una columna por SKU).
+    nativo: categóricas nativas de XGBoost con `hist` (ml/modelo_categorico.py).
+    target: SKU como media suavizada de la venta + `hist` (ml/modelo_categorico.py).
+
+    `nthread`: hilos de XGBoost (None = todos los núcleos).
+    """
+    if modo in ("nativo", "target"):
+        return ModeloCategorico(codificacion=modo, nthread=nthread, **XGB_PARAMS)
+    if modo != "onehot":
+        raise ValueError(f"Modo de entrenamiento desconocido: {modo}")
+    return Pipeline([
         ("prep", ColumnTransformer([
             ("ohe", OneHotEncoder(handle_unknown="ignore"), ["CodArticulo", "Temporada"])
         ], remainder="passthrough")),
-        ("xgb", XGBRegressor(
-            n_estimators=500,
-            learning_rate=0.03,
-            max_depth=6,
-            subsample=0.85,
-            colsample_bytree=0.85,
-            reg_lambda=1.0,
-            reg_alpha=0.5,
-            objective="reg:squarederror",
-            random_state=42
-        ))
+        ("xgb", XGBRegressor(n_jobs=nthread, **XGB_PARAMS))
     ])
 
-    pipe.fit(X_tr, y_tr)
-    pred = pipe.predict(X_te)
+def corte_temporal(fechas: pd.Series, cutoff: Optional[str] = CUTOFF, dias: int = TEST_DIAS) -> pd.Timestamp:
+    """
+    Primera fecha del tramo de prueba. `cutoff` se respeta si deja filas a
+    ambos lados; si no, el tramo son los últimos `dias` días de la historia
+    (o su último 20% si es más corta).
+    """
+    ini, fin = fechas.min(), fechas.max()
+    if cutoff is not None and ini < pd.Timestamp(cutoff) <= fin:
+        return pd.Timestamp(cutoff)
+    n = max(1, min(dias, ((fin - ini).days + 1) // 5))
+    return fin - pd.Timedelta(days=n - 1)
+
+def _fechas(s: pd.Series) -> pd.Series:
+    if not pd.api.types.is_datetime64_any_dtype(s):
+        s = pd.to_datetime(s, errors="coerce", dayfirst=True)
+    return s.dropna()
+
+def _nombres_features(pipe) -> np.ndarray:
+    if isinstance(pipe, ModeloCategorico):
+        return pipe.get_feature_names_out()
+    return pipe.named_steps["prep"].get_feature_names_out()
+
+def _importancias(pipe) -> np.ndarray:
+    if isinstance(pipe, ModeloCategorico):
+        return pipe.feature_importances_
+    return pipe.named_steps["xgb"].feature_importances_
+
+def _texto_categorias(X: pd.DataFrame) -> pd.DataFrame:
+    # el OneHotEncoder trabaja sobre texto
+    return X.assign(CodArticulo=X["CodArticulo"].astype(str), Temporada=X["Temporada"].astype(str))
+
+def ajustar_estimador(modo: str, train: pd.DataFrame, corte: pd.Timestamp, nthread: Optional[int] = None,
+                      early_stopping_rounds: Optional[int] = None, params: Optional[dict] = None,
+                      callbacks: Optional[list] = None):
+    """
+    Estimador de `modo` ajustado sobre las filas de features `train` (todas
+    anteriores a `corte`). `params` reemplaza parte de XGB_PARAMS;
+    `callbacks` (xgb.callback.TrainingCallback) se pasan al entrenamiento.
+    """
+    pipe = construir_estimador(modo, nthread)
+    if params:
+        if isinstance(pipe, ModeloCategorico):
+            pipe.params.update(params)
+        else:
+            pipe.set_params(**{f"xgb__{k}": v for k, v in params.items()})
+    X_tr, y_tr = train[X_COLS], train["CantidadVendida"]
+    val = (train["Fechaventa"] >= corte - pd.Timedelta(days=VALIDACION_DIAS)).to_numpy()
+    validar = bool(early_stopping_rounds) and val.any() and not val.all()
+    if modo == "onehot":
+        # XGBRegressor con `hist` ya entrena sobre un QuantileDMatrix; la
+        # validación pasa por el mismo ColumnTransformer ajustado en train
+        X_tr = _texto_categorias(X_tr)
+        if callbacks:
+            pipe.set_params(xgb__callbacks=callbacks)
+        if not validar:
+            return pipe.fit(X_tr, y_tr)
+        prep = pipe.named_steps["prep"].fit(X_tr[~val])
+        pipe.set_params(xgb__early_stopping_rounds=early_stopping_rounds)
+        return pipe.fit(X_tr[~val], y_tr[~val], xgb__eval_set=[(prep.transform(X_tr[val]), y_tr[val])],
+                        xgb__verbose=False)
+    if validar:
+        return pipe.fit(X_tr[~val], y_tr[~val], eval_set=(X_tr[val], y_tr[val]),
+                        early_stopping_rounds=early_stopping_rounds, callbacks=callbacks)
+    return pipe.fit(X_tr, y_tr, callbacks=callbacks)
+
+def predecir(pipe, df: pd.DataFrame) -> np.ndarray:
+    X = df[X_COLS]
+    return pipe.predict(X if isinstance(pipe, ModeloCategorico) else _texto_categorias(X))
+
+def metricas(y, pred) -> dict:
+    """MAE, MAPE, WAPE, SMAPE y bias (%) sin redondear."""
+    y, pred = np.asarray(y, dtype=float), np.asarray(pred, dtype=float)
+    abs_y = max(np.sum(np.abs(y)), 1e-9)
+    return {
+        "mae": float(np.mean(np.abs(y - pred))),
+        "mape": float(100 * np.mean(np.abs((y - pred) / np.maximum(1, np.abs(y))))),
+        "wape": float(100 * np.sum(np.abs(y - pred)) / abs_y),
+        "smape": float(100 * np.mean(2 * np.abs(y - pred) / (np.abs(y) + np.abs(pred) + 1e-9))),
+        "bias": float(100 * (pred.sum() - y.sum()) / abs_y),
+    }
+
+def entrenar_modelo(df: pd.DataFrame, modo: str = "onehot", cutoff: Optional[str] = CUTOFF,
+                    nthread: Optional[int] = None, early_stopping_rounds: Optional[int] = None,
+                    params: Optional[dict] = None) -> dict:
+    """
+    Entrena con el split temporal de `corte_temporal`. Con
+    `early_stopping_rounds` los VALIDACION_DIAS días previos al corte se
+    separan como validación para cortar el número de árboles.
+    `params` (p. ej. los de ml/tuning.py) reemplaza parte de XGB_PARAMS.
+    """
+    # el corte se fija con la historia completa, antes de descartar filas sin lags
+    corte = corte_temporal(_fechas(df["Fechaventa"]), cutoff)
+
+    # Tipado, calendario, lags y medias móviles (mismo pipeline que predicción)
+    df = construir_features(df)
+
+    # Split temporal
+    train = df[df["Fechaventa"] < corte]
+    test = df[df["Fechaventa"] >= corte]
+
+    # Entrenamiento
+    pipe = ajustar_estimador(modo, train, corte, nthread, early_stopping_rounds, params)
+
+    df_pred = test.copy()
+    df_pred["Pred"] = predecir(pipe, test)
+
+    # sigma de las últimas 30 ventas, último stock y lead time por SKU
+    return _resultado(pipe, modo, df_pred, resumen_por_sku(df, media=None, respaldo=False))
+
+def entrenar_por_particiones(leer: Callable[[List[str]], pd.DataFrame], skus: List[str], fechas: pd.Series,
+                             modo: str = "nativo", n_particiones: int = 8, cutoff: Optional[str] = CUTOFF,
+                             nthread: Optional[int] = None, early_stopping_rounds: Optional[int] = None,
+                             externa: bool = False, params: Optional[dict] = None) -> dict:
+    """
+    Igual que `entrenar_modelo` pero sin materializar la historia completa:
+    `leer(skus)` devuelve las ventas de un grupo de SKUs (p. ej. lectura
+    Parquet filtrada) y XGBoost consume las features partición a partición
+    (ml/entrenamiento_particiones.py). Solo modos nativo y target: el one-hot
+    necesita ver todo el catálogo en una sola matriz. Con `externa` XGBoost
+    guarda los bloques cuantizados en disco (ExtMemQuantileDMatrix).
+
+    `fechas` (todas las de la historia) solo se usa para fijar el corte.
+    """
+    if modo not in ("nativo", "target"):
+        raise ValueError("El entrenamiento por particiones requiere modo nativo o target")
+    fechas = _fechas(pd.Series(fechas))
+    corte = corte_temporal(fechas, cutoff)
+    inicio_val = corte - pd.Timedelta(days=VALIDACION_DIAS)
+    if not early_stopping_rounds or inicio_val <= fechas.min():
+        inicio_val = None
 
-    mae  = float(mean_absolute_error(y_te, pred))
-    mape = float(100 * np.mean(np.abs((y_te - pred) / np.maximum(1, np.abs(y_te)))))
-    wape = float(100 * np.sum(np.abs(y_te - pred)) / max(np.sum(np.abs(y_te)), 1e-9))
-    smape = float(100 * np.mean(2 * np.abs(y_te - pred) / (np.abs(y_te) + np.abs(pred) + 1e-9)))
-    bias = float(100 * (pred.sum() - y_te.sum()) / max(np.sum(np.abs(y_te)), 1e-9))
+    pipe = construir_estimador(modo, nthread)
+    pipe.params.update(params or {})
+    with tempfile.TemporaryDirectory(prefix="particiones_") as tmp:
+        tmp_dir = Path(tmp)
+        info = escribir_particiones(leer, grupos_sku(skus, n_particiones), corte, inicio_val, X_COLS, tmp_dir)
+        pipe.columnas = list(X_COLS)
+        pipe.categorias = {"CodArticulo": sorted(info["sku_stats"].index), "Temporada": info["temporadas"]}
+        if modo == "target":
+            pipe.media_global = float(info["suma"].sum() / max(info["cuenta"].sum(), 1))
+            pipe.media_sku = pipe.medias_target(info["suma"], info["cuenta"], pipe.media_global)
+
+        rutas = info["rutas"]
+        cache = str(tmp_dir / "cache") if externa else None
+        # las filas de entrenamiento se codifican con sus propias ventas previas (modo target)
+        it_train = IteradorParquet(rutas["train"], lambda parte: pipe._preparar(parte, parte[ETIQUETA]),
+                                   cache and cache + "_train")
+        it_val = IteradorParquet(rutas["val"], pipe._preparar, cache and cache + "_val") if rutas["val"] else None
+        pipe.fit_iter(it_train, it_val, early_stopping_rounds)
+
+        partes = []
+        for ruta in rutas["test"]:
+            parte = pd.read_parquet(ruta)
+            parte["Pred"] = pipe.predict(parte)
+            parte["CodArticulo"] = parte["CodArticulo"].astype(str)
+            partes.append(parte)
+    if not partes:
+        raise ValueError("Sin filas de prueba después del corte")
+    df_pred = pd.concat(partes, ignore_index=True)
+    return _resultado(pipe, modo, df_pred, info["sku_stats"])
+
+def _resultado(pipe, modo: str, df_pred: pd.DataFrame, sku_stats: pd.DataFrame) -> dict:
+    """
+    Métricas sobre el tramo de prueba, artefactos en outputs/ y respuesta de
+    entrenamiento. `sku_stats`: d_sigma, StockMes y horizon por SKU.
+    """
+    y_te, pred = df_pred["CantidadVendida"], df_pred["Pred"].to_numpy()
+
+    m = metricas(y_te, pred)
+    mape, wape, smape, bias = m["mape"], m["wape"], m["smape"], m["bias"]
     precision = round(100 - mape, 2)
 
-    joblib.dump(pipe, MODEL_PATH)
+    guardar_modelo(pipe, MODEL_PATH)
 
     mae = round(mean_absolute_error(y_te, pred), 2)
 
     # Feature importances
     imp = pd.DataFrame({
-        "feature": pipe.named_steps["prep"].get_feature_names_out(),
-        "gain": pipe.named_steps["xgb"].feature_importances_
+        "feature": _nombres_features(pipe),
+        "gain": _importancias(pipe)
     }).sort_values("gain", ascending=False)
 
     # Guardar CSV
     imp.to_csv(OUTPUT_DIR / "importancia_features.csv", index=False)
 
     # Generar alerta
-    def robust_sigma(group):
-        last = group.tail(30)
-        sigma = last.std(ddof=0)
-        return 0.0 if np.isnan(sigma) else sigma
-
-    df_pred = test.copy()
-    df_pred["Pred"] = pred
-
-    d_media = df_pred.groupby("CodArticulo")["Pred"].mean()
-    d_sigma = df.groupby("CodArticulo")["CantidadVendida"].apply(robust_sigma)
-    sku_stats = df.groupby("CodArticulo").agg(
-        StockMes=("StockMes", "last"),
-        horizon=("TiempoReposicionDias", "first")
-    )
+    d_media = resumen_por_sku(df_pred, sigma=None, ultimo=None, primero=None)["d_media"]
 
     Z = 1.28
-    alert = pd.concat([d_media, d_sigma], axis=1, keys=["d_media", "d_sigma"]).join(sku_stats)
+    alert = pd.concat([d_media, sku_stats], axis=1)
     alert["seguridad"] = Z * alert["d_sigma"] * np.sqrt(alert["horizon"])
     alert["stock_objetivo"] = (alert["d_media"] * alert["horizon"] + alert["seguridad"]).round()
 
@@ -167,5 +287,6 @@ def entrenar_modelo(df: pd.DataFrame) -> dict:
         "smape": round(smape,2),
         "bias": round(bias,2),
         "precision": precision,
+        "modo": modo,
     }
 
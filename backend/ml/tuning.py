@@ -0,0 +1,179 @@
+"""
+Búsqueda de hiperparámetros con successive halving.
+
+Se prueban `n_trials` configuraciones (la primera es XGB_PARAMS) con pocos
+árboles; en cada ronda sobrevive el mejor 1/eta y el presupuesto de árboles
+se multiplica por eta, hasta `rondas_max`. Los trials de una ronda corren en
+paralelo en procesos `spawn` (ml/procesos.py; la API lo coordina desde un
+hilo, no desde un worker) y cada proceso carga una sola vez la matriz de
+features cacheada (Arrow mapeado en memoria). Al agotarse `presupuesto_s` no
+se lanzan más trials, los que están entrenando se cortan solos en la
+siguiente ronda de boosting (reciben el plazo) y se devuelve lo mejor de la
+última ronda evaluada (siempre se evalúa al menos un trial).
+
+Cada trial entrena con las filas anteriores a `inicio_val` (con early
+stopping en sus últimos días) y se puntúa con el MAE de
+[inicio_val, corte): el tramo de prueba de `entrenar_modelo` no se usa.
+"""
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from ml.features import X_COLS, cargar_features
+from ml.modelo_categorico import ModeloCategorico
+from ml.train_model import XGB_PARAMS, ajustar_estimador, corte_temporal, metricas, predecir
+from ml.procesos import crear_pool, hilos_por_proceso, workers_para
+
+# (escala, mínimo, máximo)
+ESPACIO = {
+    "max_depth": ("int", 3, 10),
+    "learning_rate": ("log", 0.01, 0.3),
+    "subsample": ("lineal", 0.5, 1.0),
+    "colsample_bytree": ("lineal", 0.5, 1.0),
+    "min_child_weight": ("log", 1.0, 20.0),
+    "reg_lambda": ("log", 0.1, 10.0),
+    "reg_alpha": ("log", 0.01, 5.0),
+}
+
+
+def muestrear(n: int, seed: int = 0) -> List[Dict]:
+    """`n` configuraciones al azar del ESPACIO; la primera es la de XGB_PARAMS."""
+    rng = np.random.default_rng(seed)
+    configs = [{k: XGB_PARAMS.get(k, 1.0) for k in ESPACIO}]
+    for _ in range(n - 1):
+        c = {}
+        for k, (escala, lo, hi) in ESPACIO.items():
+            if escala == "int":
+                c[k] = int(rng.integers(lo, hi + 1))
+            elif escala == "log":
+                c[k] = float(np.exp(rng.uniform(np.log(lo), np.log(hi))))
+            else:
+                c[k] = float(rng.uniform(lo, hi))
+        configs.append(c)
+    return configs[:n]
+
+
+@lru_cache(maxsize=1)
+def _matriz(ruta: str) -> pd.DataFrame:
+    # una carga por proceso: los trials siguientes del mismo worker la reutilizan
+    return cargar_features(Path(ruta), [*X_COLS, "Fechaventa", "CantidadVendida"])
+
+
+class Plazo(xgb.callback.TrainingCallback):
+    """Corta el boosting al pasar `limite` (time.time(): vale entre procesos)."""
+
+    def __init__(self, limite: float):
+        super().__init__()
+        self.limite = limite
+        self.cortado = False
+
+    def after_iteration(self, model, epoch, evals_log) -> bool:
+        self.cortado = time.time() > self.limite
+        return self.cortado
+
+
+def evaluar_trial(ruta: str, modo: str, params: Dict, rondas: int, inicio_val: pd.Timestamp,
+                  corte: pd.Timestamp, nthread: Optional[int] = None,
+                  early_stopping_rounds: Optional[int] = None, limite: Optional[float] = None) -> Dict:
+    """
+    MAE de validación de `params` con `rondas` árboles. Con `limite` el
+    entrenamiento se corta al pasarlo (`cortado`: el MAE es el de los árboles
+    alcanzados y `rondas` queda en las pedidas).
+    """
+    df = _matriz(ruta)
+    train = df[df["Fechaventa"] < inicio_val]
+    val = df[(df["Fechaventa"] >= inicio_val) & (df["Fechaventa"] < corte)]
+    t0 = time.perf_counter()
+    plazo = Plazo(limite) if limite is not None else None
+    pipe = ajustar_estimador(modo, train, inicio_val, nthread, early_stopping_rounds,
+                             {**params, "n_estimators": rondas}, callbacks=[plazo] if plazo else None)
+    cortado = plazo is not None and plazo.cortado
+    mejor = pipe.best_iteration if isinstance(pipe, ModeloCategorico) and not cortado else None
+    return {
+        "mae": metricas(val["CantidadVendida"], predecir(pipe, val))["mae"],
+        "rondas": rondas if mejor is None else mejor + 1,
+        "segundos": round(time.perf_counter() - t0, 2),
+        "cortado": cortado,
+    }
+
+
+def tunear(ruta: Path, modo: str = "target", n_trials: int = 16, eta: int = 3,
+           rondas_min: int = 50, rondas_max: Optional[int] = None, presupuesto_s: float = 600,
+           workers: Optional[int] = None, early_stopping_rounds: Optional[int] = 20,
+           seed: int = 0) -> Dict:
+    """
+    Devuelve {"params": mejores params (incluye n_estimators), "mae_val",
+    "trials": lista de trials evaluados, "rondas_halving", "segundos",
+    "agotado": si se cortó por tiempo, "workers": procesos usados}.
+    """
+    t0 = time.perf_counter()
+    limite = time.time() + presupuesto_s
+    rondas_max = rondas_max or XGB_PARAMS["n_estimators"]
+    fechas = _matriz(str(ruta))["Fechaventa"]
+    corte = corte_temporal(fechas)
+    inicio_val = corte_temporal(fechas[fechas < corte], None)
+
+    workers = workers_para(workers, n_trials)
+    nthread = hilos_por_proceso(workers)
+    ex = crear_pool(workers) if workers > 1 else None
+
+    vivos = list(enumerate(muestrear(n_trials, seed)))
+    rondas, nivel, trials, ultimo, agotado = rondas_min, 0, [], [], False
+    try:
+        while vivos:
+            args = [(str(ruta), modo, c, rondas, inicio_val, corte, nthread, early_stopping_rounds, limite)
+                    for _, c in vivos]
+            resultados = {}
+            if ex is None:
+                for (i, _), a in zip(vivos, args):
+                    if (trials or resultados) and time.perf_counter() - t0 > presupuesto_s:
+                        agotado = True
+                        break
+                    resultados[i] = evaluar_trial(*a)
+            else:
+                pendientes = {ex.submit(evaluar_trial, *a): i for (i, _), a in zip(vivos, args)}
+                while pendientes:
+                    # sin ningún resultado todavía se espera al primero aunque no quede tiempo
+                    resto = max(presupuesto_s - (time.perf_counter() - t0), 0) if trials or resultados else None
+                    hechos, _ = wait(pendientes, timeout=resto, return_when=FIRST_COMPLETED)
+                    if not hechos:
+                        agotado = True
+                        for f in pendientes:
+                            f.cancel()
+                        break
+                    for f in hechos:
+                        resultados[pendientes.pop(f)] = f.result()
+
+            ronda = [{"trial": i, "nivel": nivel, "params": c, **resultados[i]} for i, c in vivos if i in resultados]
+            agotado = agotado or any(t["cortado"] for t in ronda)
+            trials += ronda
+            if ronda:
+                ultimo = ronda
+            if agotado or rondas >= rondas_max:
+                break
+            ronda.sort(key=lambda t: t["mae"])
+            seguir = {t["trial"] for t in ronda[:max(1, math.ceil(len(ronda) / eta))]}
+            vivos = [(i, c) for i, c in vivos if i in seguir]
+            rondas, nivel = min(rondas * eta, rondas_max), nivel + 1
+    finally:
+        if ex is not None:
+            # los trials en curso ya tienen el plazo vencido y se cortan solos:
+            # se espera a que terminen para no dejarlos compitiendo con el ajuste final
+            ex.shutdown(wait=True, cancel_futures=True)
+        _matriz.cache_clear()
+
+    mejor = min(ultimo, key=lambda t: t["mae"])
+    return {
+        "params": {**mejor["params"], "n_estimators": int(mejor["rondas"])},
+        "mae_val": mejor["mae"],
+        "trials": trials,
+        "rondas_halving": nivel + 1,
+        "segundos": round(time.perf_counter() - t0, 2),
+        "agotado": agotado,
+        "workers": workers,
+    }
@@ -0,0 +1,95 @@
+"""
+What-if de la política de stock sobre un job ya calculado.
+
+Con los agregados guardados por SKU (d_media, d_sigma, StockMes, horizon) la
+política de model_prediction.politica_stock se reevalúa para una grilla de
+niveles de servicio x multiplicadores de lead time, sin volver a correr el
+modelo. Todo es broadcasting (nivel, multiplicador, SKU), por bloques de
+SKUs para acotar la memoria en grillas grandes.
+
+El nivel de servicio se traduce a Z con la normal inversa: 0.90 da 1.2816
+(la política por defecto usa Z = 1.28 redondeado).
+"""
+from statistics import NormalDist
+from typing import Optional, Sequence
+import numpy as np
+import pandas as pd
+
+COLUMNAS = ["d_media", "d_sigma", "StockMes", "horizon"]
+# celdas (nivel x multiplicador x SKU) por bloque: los intermedios de un bloque
+# (~1 MB cada uno) quedan en caché, así que más SKUs por bloque no acelera
+CELDAS_BLOQUE = 1 << 17
+
+
+def z_servicio(nivel: float) -> float:
+    return NormalDist().inv_cdf(nivel)
+
+
+def _acumular(acc: dict, buf: list, z: np.ndarray, m: np.ndarray, dm, ds, st, h, con_nan: bool):
+    L, M, b = z.shape[0], m.shape[1], dm.shape[-1]
+    # los intermedios (L, M, b) reutilizan `buf`: sin reservar memoria por bloque
+    seg, obj, q, s = (x[:L * M * b].reshape(L, M, b) for x in buf)
+    hm = h * m                                       # (1, M, b)
+    raiz = np.sqrt(hm)
+    np.multiply(z * ds, raiz, out=seg)               # (L, 1, b) x (1, M, b)
+    np.add(seg, dm * hm, out=obj)
+    np.round(obj, out=obj)
+    np.less(st, seg, out=q)
+    # mismo orden que np.select en politica_stock: el quiebre tiene prioridad
+    np.multiply(obj, 1.3, out=seg)
+    np.greater(st, seg, out=s)
+    np.greater(s, q, out=s)                          # s & ~q
+    acc["quiebre"] += np.add.reduce(q.view(np.int8), axis=2, dtype=np.int64)
+    acc["sobre"] += np.add.reduce(s.view(np.int8), axis=2, dtype=np.int64)
+    # faltante = obj - min(obj, stock); seguridad = z * sum(sigma * raiz) sin pasar por (L, M, b)
+    np.minimum(obj, st, out=seg)
+    if con_nan:
+        acc["seguridad"] += z[:, :, 0] * np.nansum(ds * raiz, axis=2)
+        acc["objetivo"] += np.nansum(obj, axis=2)
+        acc["faltante"] += np.nansum(obj - seg, axis=2)
+        return
+    uno = np.ones(b)
+    acc["seguridad"] += z[:, :, 0] * ((ds * raiz) @ uno)
+    objetivo = obj.reshape(L * M, b) @ uno
+    acc["objetivo"] += objetivo.reshape(L, M)
+    acc["faltante"] += (objetivo - seg.reshape(L * M, b) @ uno).reshape(L, M)
+
+
+def grilla_politica(agregados: pd.DataFrame, niveles: Sequence[float], multiplicadores: Sequence[float],
+                    bloque: Optional[int] = None) -> pd.DataFrame:
+    """
+    Una fila por (nivel_servicio, multiplicador) con cuántos SKUs quedan en
+    cada Estado y los totales de seguridad, stock objetivo y unidades
+    faltantes (stock objetivo por encima del stock actual). `bloque` (SKUs
+    por bloque) sale por defecto del tamaño de la grilla (CELDAS_BLOQUE).
+    """
+    z = np.array([z_servicio(p) for p in niveles], dtype=float)[:, None, None]
+    m = np.asarray(multiplicadores, dtype=float)[None, :, None]
+    forma = (z.shape[0], m.shape[1])
+    acc = {k: np.zeros(forma, dtype=np.int64) for k in ("quiebre", "sobre")}
+    acc.update({k: np.zeros(forma) for k in ("seguridad", "objetivo", "faltante")})
+
+    valores = np.column_stack([agregados[c].to_numpy(dtype=float) for c in COLUMNAS])
+    n = len(valores)
+    bloque = bloque or max(1, CELDAS_BLOQUE // max(1, forma[0] * forma[1]))
+    celdas = forma[0] * forma[1] * min(bloque, max(n, 1))
+    buf = [np.empty(celdas), np.empty(celdas), np.empty(celdas, dtype=bool), np.empty(celdas, dtype=bool)]
+    # las filas con nulos (p. ej. SKU sin lead time) van aparte con nansum
+    nulas = np.isnan(valores).any(axis=1)
+    for grupo, con_nan in ((valores[~nulas], False), (valores[nulas], True)):
+        for i in range(0, len(grupo), bloque):
+            b = grupo[i:i + bloque].T[:, None, None, :]
+            _acumular(acc, buf, z, m, *b, con_nan=con_nan)
+
+    niv, mult = np.meshgrid(np.asarray(niveles, dtype=float), np.asarray(multiplicadores, dtype=float), indexing="ij")
+    return pd.DataFrame({
+        "nivel_servicio": niv.ravel(),
+        "multiplicador": mult.ravel(),
+        "z": np.broadcast_to(z[:, :, 0], forma).ravel(),
+        "quiebre_potencial": acc["quiebre"].ravel(),
+        "sobre_stock": acc["sobre"].ravel(),
+        "ok": (n - acc["quiebre"] - acc["sobre"]).ravel(),
+        "seguridad_total": acc["seguridad"].ravel().round(2),
+        "stock_objetivo_total": acc["objetivo"].ravel(),
+        "unidades_faltantes": acc["faltante"].ravel(),
+    })
@@ -3,6 +3,9 @@ Configuración global de pytest para el proyecto Multitop
 Estructura: backend/test/
 """
 
+import os
+import shutil
+import tempfile
 import pytest
 import sys
 from pathlib import Path
@@ -16,23 +19,61 @@ if str(BACKEND_DIR) not in sys.path:
     sys.path.insert(0, str(BACKEND_DIR))
 
 
+# ==== Directorio de trabajo temporal ====
+# Modelo, base, logs y resultados usan rutas relativas a outputs/: los tests
+# corren desde un directorio temporal (también los workers `spawn`, que
+# heredan el cwd) y no tocan los artefactos reales.
+WORK_DIR = Path(tempfile.mkdtemp(prefix="multitop-test-"))
+ORIGINAL_DIR = Path.cwd()
+os.chdir(WORK_DIR)
+
+
+def pytest_unconfigure(config):
+    os.chdir(ORIGINAL_DIR)
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
 # ==== Directorios de outputs compartidos por todos los tests ====
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_directories():
     """Crear directorios necesarios para las pruebas (una sola vez por sesión)"""
     directories = [
-        BACKEND_DIR / "outputs",
-        BACKEND_DIR / "outputs" / "store",
-        BACKEND_DIR / "outputs" / "exports",
+        WORK_DIR / "outputs",
+        WORK_DIR / "outputs" / "store",
+        WORK_DIR / "outputs" / "exports",
     ]
 
     for directory in directories:
         directory.mkdir(parents=True, exist_ok=True)
 
+    # tablas e índices: en la API los crea el lifespan al arrancar
+    from app.inicializacion import preparar_base
+    preparar_base()
+
     yield
 
 
+# ==== Modelo para las pruebas marcadas requires_model ====
+# El directorio temporal empieza sin modelo: se entrena uno chico una vez por
+# sesión antes de la primera prueba que lo necesita.
+
+@pytest.fixture(scope="session")
+def modelo_entrenado():
+    from ml.bench_entrenamiento import datos_sinteticos
+    from ml.train_model import MODEL_PATH, entrenar_modelo
+
+    if not MODEL_PATH.exists():
+        entrenar_modelo(datos_sinteticos(5, 120))
+    return MODEL_PATH
+
+
+@pytest.fixture(autouse=True)
+def _modelo_si_lo_requiere(request):
+    if request.node.get_closest_marker("requires_model"):
+        request.getfixturevalue("modelo_entrenado")
+
+
 # ==== Fixtures reutilizables de DataFrames ====
 
 @pytest.fixture
@@ -0,0 +1,1825 @@
+"""
+Pruebas Unitarias - Sprint 3
+Sistema de Predicción de Demanda - Multitop SAC
+Rendimiento: registro de modelo, features compartidas y almacenamiento
+"""
+
+import pytest
+import pandas as pd
+import numpy as np
+from pathlib import Path
+
+
+# ============================================================================
+# PRUEBAS DEL REGISTRO DE MODELO
+# ============================================================================
+
+class TestRegistroModelo:
+    """Pruebas para ml/model_registry.py"""
+
+    def test_carga_una_vez_y_recarga_al_cambiar(self, tmp_path):
+        """
+        Verifica que el modelo quede residente y se reemplace al cambiar el archivo
+        """
+        from ml.model_registry import ModelRegistry, guardar_modelo
+
+        # Arrange
+        path = tmp_path / "modelo.joblib"
+        guardar_modelo({"v": 1}, path)
+        reg = ModelRegistry(path)
+
+        # Act
+        m1 = reg.get()
+        m1_bis = reg.get()
+        v1 = reg.version
+        guardar_modelo({"v": 2}, path)
+        m2 = reg.get()
+
+        # Assert
+        assert m1 is m1_bis, "No debe deserializar en cada llamada"
+        assert m2 == {"v": 2}
+        assert reg.version != v1
+
+    def test_sin_modelo_lanza_error(self, tmp_path):
+        """
+        Verifica que sin archivo se informe que falta entrenar
+        """
+        from ml.model_registry import ModelRegistry
+
+        reg = ModelRegistry(tmp_path / "no_existe.joblib")
+
+        with pytest.raises(FileNotFoundError):
+            reg.get()
+        assert reg.info()["version"] is None
+
+    def test_guardado_concurrente_no_mezcla_temporales(self, tmp_path):
+        """
+        Verifica que varios guardados simultáneos dejen un modelo completo
+        y ningún temporal
+        """
+        import joblib
+        from concurrent.futures import ThreadPoolExecutor
+        from ml.model_registry import guardar_modelo
+
+        path = tmp_path / "modelo.joblib"
+        modelos = [{"v": i, "pesos": list(range(200_000))} for i in range(4)]
+
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(lambda m: guardar_modelo(m, path), modelos))
+
+        assert joblib.load(path) in modelos
+        assert [p.name for p in tmp_path.iterdir()] == ["modelo.joblib"]
+
+
+# ============================================================================
+# PRUEBAS DEL PIPELINE DE FEATURES COMPARTIDO
+# ============================================================================
+
+class TestFeaturesCompartidas:
+    """Pruebas para ml/features.py"""
+
+    def test_lags_equivalen_a_rolling_por_sku(self):
+        """
+        Verifica que los lags vectorizados coincidan con groupby/shift/rolling
+        y que ninguna ventana cruce de un SKU a otro
+        """
+        from ml.features import construir_features, LAG_COLS
+
+        # Arrange - dos SKUs intercalados y desordenados
+        n = 60
+        df = pd.DataFrame({
+            "Fechaventa": list(pd.date_range("2024-01-01", periods=n)) * 2,
+            "CodArticulo": ["ME001"] * n + ["ME002"] * n,
+            "Temporada": ["Verano"] * (2 * n),
+            "PrecioVenta": [45.5] * (2 * n),
+            "CantidadVendida": np.random.randint(50, 150, 2 * n),
+            "StockMes": [5000] * (2 * n),
+            "TiempoReposicionDias": [60] * (2 * n),
+            "Promocion": [0] * (2 * n),
+            "DiaFestivo": [0] * (2 * n),
+            "EsDomingo": [0] * (2 * n),
+            "TiendaCerrada": [0] * (2 * n),
+        }).sample(frac=1, random_state=0)
+
+        # Act
+        resultado = construir_features(df, dropna=False)
+
+        # Assert
+        grp = resultado.groupby("CodArticulo", observed=True)["CantidadVendida"]
+        esperado = {
+            "lag_1d": grp.shift(1),
+            "lag_7d": grp.shift(7),
+            "ma_7d": grp.transform(lambda s: s.shift(1).rolling(7).mean()),
+            "ma_14d": grp.transform(lambda s: s.shift(1).rolling(14).mean()),
+            "ma_30d": grp.transform(lambda s: s.shift(1).rolling(30).mean()),
+            "rolling_std_7d": grp.transform(lambda s: s.shift(1).rolling(7).std()),
+        }
+        for col in LAG_COLS:
+            np.testing.assert_allclose(resultado[col], esperado[col], rtol=1e-9, atol=1e-9)
+        assert resultado.groupby("CodArticulo", observed=True)["Fechaventa"].is_monotonic_increasing.all()
+
+    def test_no_modifica_dataframe_original(self):
+        """
+        Verifica que el pipeline no altere el DataFrame recibido
+        """
+        from ml.features import construir_features
+
+        df = pd.DataFrame({
+            "Fechaventa": ["01/02/2024"] * 40,
+            "CodArticulo": ["ME001"] * 40,
+            "Temporada": ["Verano"] * 40,
+            "PrecioVenta": [45.5] * 40,
+            "CantidadVendida": list(range(40)),
+            "StockMes": [5000] * 40,
+            "TiempoReposicionDias": [60] * 40,
+            "Promocion": [0] * 40,
+            "DiaFestivo": [0] * 40,
+            "EsDomingo": [0] * 40,
+            "TiendaCerrada": [0] * 40,
+        })
+        columnas = list(df.columns)
+
+        construir_features(df)
+
+        assert list(df.columns) == columnas
+        assert not pd.api.types.is_datetime64_any_dtype(df["Fechaventa"])
+
+
+# ============================================================================
+# PRUEBAS DEL ESTADO INCREMENTAL DE FEATURES
+# ============================================================================
+
+def _csv_ventas(n_sku: int, dias: int) -> bytes:
+    """CSV de ventas con fechas dd/mm/aaaa, como los que se suben a la API."""
+    fechas = pd.date_range("2024-01-01", periods=dias)
+    df = pd.concat([_ventas(fechas, f"ME{i:03d}") for i in range(n_sku)], ignore_index=True)
+    df["Fechaventa"] = df["Fechaventa"].dt.strftime("%d/%m/%Y")
+    return df.to_csv(index=False).encode()
+
+
+def _ventas(fechas, sku="ME001"):
+    n = len(fechas)
+    return pd.DataFrame({
+        "Fechaventa": fechas,
+        "CodArticulo": [sku] * n,
+        "Temporada": ["Verano"] * n,
+        "PrecioVenta": [45.5] * n,
+        "CantidadVendida": np.random.randint(50, 150, n),
+        "StockMes": [5000] * n,
+        "TiempoReposicionDias": [60] * n,
+        "Promocion": [0] * n,
+        "DiaFestivo": [0] * n,
+        "EsDomingo": [0] * n,
+        "TiendaCerrada": [0] * n,
+    })
+
+
+class TestEstadoIncremental:
+    """Pruebas para ml/feature_state.py"""
+
+    def test_features_incrementales_igual_a_historia_completa(self):
+        """
+        Verifica que los días nuevos + cola guardada den los mismos lags que
+        recalcular toda la historia
+        """
+        from ml.features import construir_features, tipar_df, LAG_COLS
+        from ml.feature_state import actualizar_cola, historia_previa
+
+        # Arrange
+        completo = pd.concat([
+            _ventas(pd.date_range("2024-01-01", periods=90), "ME001"),
+            _ventas(pd.date_range("2024-01-01", periods=90), "ME002"),
+        ], ignore_index=True)
+        viejo = completo[completo["Fechaventa"] < "2024-03-25"]
+        nuevo = completo[completo["Fechaventa"] >= "2024-03-25"]
+
+        # Act
+        cola = actualizar_cola(None, tipar_df(viejo))
+        tipado = tipar_df(nuevo)
+        incremental = construir_features(tipado, historia=historia_previa(cola, tipado))
+        referencia = construir_features(completo)
+        referencia = referencia[referencia["Fechaventa"] >= "2024-03-25"].reset_index(drop=True)
+
+        # Assert
+        assert len(incremental) == len(referencia)
+        for col in LAG_COLS:
+            np.testing.assert_allclose(incremental[col], referencia[col])
+
+    def test_cola_reemplaza_dias_reenviados(self):
+        """
+        Verifica que reenviar días ya guardados no duplique observaciones
+        """
+        from ml.features import tipar_df
+        from ml.feature_state import actualizar_cola, RETENCION
+
+        base = _ventas(pd.date_range("2024-01-01", periods=100))
+        cola = actualizar_cola(None, tipar_df(base))
+        cola2 = actualizar_cola(cola, tipar_df(base.tail(5)))
+
+        assert len(cola) == RETENCION
+        assert len(cola2) == RETENCION
+        assert cola2["Fechaventa"].is_unique
+
+    def test_bloqueo_serializa_actualizaciones(self, tmp_path):
+        """
+        Verifica que dos actualizaciones concurrentes del estado no se pisen
+        (leer → actualizar → guardar bajo el lock) y no dejen temporales
+        """
+        import threading
+        import time
+        from ml.feature_state import bloqueo_estado, cargar_estado, guardar_estado
+
+        path = tmp_path / "estado.joblib"
+        guardar_estado(pd.DataFrame({"n": [0]}), path)
+
+        def sumar():
+            with bloqueo_estado(path):
+                n = int(cargar_estado(path)["n"].iloc[0])
+                time.sleep(0.05)
+                guardar_estado(pd.DataFrame({"n": [n + 1]}), path)
+
+        hilos = [threading.Thread(target=sumar) for _ in range(4)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+        assert int(cargar_estado(path)["n"].iloc[0]) == 4
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["estado.joblib", "estado.joblib.lock"]
+
+    @pytest.mark.requires_model
+    def test_prediccion_incremental_no_retiene_el_lock(self, monkeypatch):
+        """
+        Verifica que el lock del estado no se tome mientras se predice y que
+        una actualización concurrente del estado no se pierda al guardar
+        """
+        import threading
+        from app.services import predict_service
+        from ml.features import tipar_df
+        from ml.feature_state import actualizar_cola, bloqueo_estado, cargar_estado, guardar_estado
+
+        # Arrange
+        base = pd.concat([_ventas(pd.date_range("2024-01-01", periods=60), f"ME00{i}") for i in (1, 2)],
+                         ignore_index=True)
+        predict_service.predict_from_df(base, {}, particiones=1)
+        nuevos = pd.date_range("2024-03-01", periods=3)
+        otro = tipar_df(_ventas(nuevos, "ME002"))
+        predecir = predict_service.predecir_con_estado
+        libre = []
+
+        def predecir_con_concurrente(df, historia, actualizar):
+            def actualizar_estado():
+                with bloqueo_estado():
+                    guardar_estado(actualizar_cola(cargar_estado(), otro))
+            h = threading.Thread(target=actualizar_estado)
+            h.start()
+            h.join(timeout=5)
+            libre.append(not h.is_alive())
+            return predecir(df, historia, actualizar)
+
+        monkeypatch.setattr(predict_service, "predecir_con_estado", predecir_con_concurrente)
+
+        # Act
+        predict_service.predict_from_df(_ventas(nuevos, "ME001"), {}, incremental=True, particiones=1)
+        ultima = cargar_estado().groupby("CodArticulo", observed=True)["Fechaventa"].max()
+
+        # Assert
+        assert libre == [True]
+        assert ultima["ME001"] == ultima["ME002"] == nuevos[-1]
+
+
+# ============================================================================
+# PRUEBAS DE LA COLA DE JOBS
+# ============================================================================
+
+class TestColaJobs:
+    """Pruebas para app/services/job_queue.py y app/api/router_jobs.py"""
+
+    @pytest.mark.integration
+    def test_job_de_entrenamiento_fallido_reporta_error(self):
+        """
+        Verifica que el submit responda de inmediato y que el error del
+        worker quede registrado en el job
+        """
+        import time
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        with TestClient(app) as client:
+            # Act
+            r = client.post("/api/model/train/jobs", files={"file": ("x.csv", b"a,b\n1,2\n")})
+            job_id = r.json()["job_id"]
+            for _ in range(120):
+                estado = client.get(f"/api/jobs/{job_id}").json()
+                if estado["status"] in ("done", "failed"):
+                    break
+                time.sleep(0.25)
+
+        # Assert
+        assert r.status_code == 202
+        assert estado["tipo"] == "train"
+        assert estado["status"] == "failed"
+        assert estado["error"]
+
+    def test_job_inexistente_404(self):
+        """
+        Verifica que consultar un job desconocido devuelva 404
+        """
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        with TestClient(app) as client:
+            r = client.get("/api/jobs/no-existe")
+
+        assert r.status_code == 404
+
+    def test_jobs_pendientes_de_otro_proceso_fallan_al_arrancar(self):
+        """
+        Verifica que al arrancar se marquen como fallidos los jobs que un
+        proceso anterior dejó queued/running, sin tocar los de este proceso
+        """
+        from concurrent.futures import Future
+        from app.repositories import predictions_repo, train_jobs_repo
+        from app.services import job_queue
+
+        # Arrange
+        huerfano_pred = predictions_repo.create_job({}, status="running")
+        huerfano_train = train_jobs_repo.create_job({})
+        propio = predictions_repo.create_job({})
+        job_queue._futures[propio] = ("prediction", Future(), None)
+
+        try:
+            # Act
+            job_queue.recuperar_interrumpidos()
+            pred = job_queue.job_status(huerfano_pred)
+            train = job_queue.job_status(huerfano_train)
+            vivo = job_queue.job_status(propio)
+        finally:
+            job_queue._futures.pop(propio, None)
+
+        # Assert
+        assert pred["status"] == train["status"] == "failed"
+        assert pred["error"] == train["error"] == job_queue.INTERRUMPIDO
+        assert pred["finished_at"] is not None
+        assert vivo["status"] == "queued"
+
+    @pytest.mark.integration
+    def test_pool_roto_se_recrea_y_falla_sus_jobs(self):
+        """
+        Verifica que si un worker muere el job quede fallido, el pool roto se
+        reemplace por uno nuevo y los jobs terminados salgan de _futures
+        """
+        import asyncio
+        import os
+        import time
+        from app.services import job_queue
+
+        # Arrange
+        roto = job_queue.get_executor()
+
+        # Act: el worker termina sin devolver nada y rompe el pool
+        job_id = job_queue.submit_training(os._exit, 3)
+        for _ in range(120):
+            estado = job_queue.job_status(job_id)
+            if estado["status"] in job_queue.TERMINALES:
+                break
+            time.sleep(0.25)
+        resultado = asyncio.run(job_queue.run(abs, -2))
+
+        # Assert
+        assert estado["status"] == "failed"
+        assert estado["error"] == job_queue.POOL_ROTO
+        assert job_id not in job_queue._futures
+        assert job_queue.get_executor() is not roto
+        assert resultado == 2
+
+
+# ============================================================================
+# PRUEBAS DE INGESTA POR BLOQUES
+# ============================================================================
+
+class TestIngestaCSV:
+    """Pruebas para app/services/ingest_service.py"""
+
+    def test_lectura_por_bloques_tipada(self, tmp_path):
+        """
+        Verifica que leer en bloques unifique categorías y aplique los tipos
+        de las columnas requeridas
+        """
+        from app.services.ingest_service import iter_csv, concat_chunks
+
+        # Arrange
+        df = pd.concat([
+            _ventas(pd.date_range("2024-01-01", periods=10), "ME001"),
+            _ventas(pd.date_range("2024-01-01", periods=10), "ME002"),
+        ], ignore_index=True)
+        df["Fechaventa"] = df["Fechaventa"].dt.strftime("%d/%m/%Y")
+        df["PrecioVenta"] = df["PrecioVenta"].astype(object)
+        df.loc[0, "PrecioVenta"] = "sin precio"
+        path = tmp_path / "ventas.csv"
+        df.to_csv(path, index=False)
+
+        # Act
+        resultado = concat_chunks(list(iter_csv(path, chunksize=7)))
+
+        # Assert
+        assert len(resultado) == 20
+        assert isinstance(resultado["CodArticulo"].dtype, pd.CategoricalDtype)
+        assert set(resultado["CodArticulo"].cat.categories) == {"ME001", "ME002"}
+        assert pd.api.types.is_datetime64_any_dtype(resultado["Fechaventa"])
+        assert resultado["Fechaventa"].iloc[1] == pd.Timestamp("2024-01-02")
+        assert resultado["PrecioVenta"].dtype == "float64"
+        assert resultado["PrecioVenta"].isna().sum() == 1
+
+
+# ============================================================================
+# PRUEBAS DE ALMACENAMIENTO COLUMNAR
+# ============================================================================
+
+class TestArchivosParquet:
+    """Pruebas para app/repositories/files_repo.py"""
+
+    def test_guardar_y_leer_con_proyeccion_y_filtro(self):
+        """
+        Verifica que el dataset se guarde tipado y se pueda leer solo con
+        algunas columnas y filtrado por tienda
+        """
+        from app.repositories import files_repo
+
+        # Arrange - dos bloques con tiendas distintas
+        b1 = _ventas(pd.date_range("2024-01-01", periods=10), "ME001").assign(tienda="Lima Centro")
+        b2 = _ventas(pd.date_range("2024-01-01", periods=10), "ME002").assign(tienda="Lima Norte")
+
+        # Act
+        meta = files_repo.save_upload_chunks([b1, b2], "ventas.csv")
+        todo = files_repo.read_file(meta["file_id"])
+        parcial = files_repo.read_file(
+            meta["file_id"], columns=["CodArticulo", "CantidadVendida"],
+            filters=[("tienda", "==", "Lima Norte")]
+        )
+
+        # Assert
+        assert meta["rows"] == 20
+        assert files_repo.get_file(meta["file_id"]).suffix == ".parquet"
+        assert isinstance(todo["CodArticulo"].dtype, pd.CategoricalDtype)
+        assert pd.api.types.is_datetime64_any_dtype(todo["Fechaventa"])
+        assert list(parcial.columns) == ["CodArticulo", "CantidadVendida"]
+        assert len(parcial) == 10
+        assert set(parcial["CodArticulo"].astype(str)) == {"ME002"}
+
+    def test_columnas_extra_no_pierden_texto_entre_bloques(self, tmp_path, monkeypatch):
+        """
+        Verifica que una columna numérica o vacía en el primer bloque conserve
+        los valores de texto de los bloques siguientes
+        """
+        from app.repositories import files_repo
+        from app.services.ingest_service import store_upload
+        from app.utils.config import settings
+
+        # Arrange - bloques de 2 filas: tienda "101","102" | "Lima"; categoria vacía | "Calzado"
+        monkeypatch.setattr(settings, "CSV_CHUNK_ROWS", 2)
+        df = _ventas(pd.date_range("2024-01-01", periods=3))
+        df["Fechaventa"] = df["Fechaventa"].dt.strftime("%d/%m/%Y")
+        df["tienda"] = ["101", "102", "Lima"]
+        df["categoria"] = [None, None, "Calzado"]
+        path = tmp_path / "ventas.csv"
+        df.to_csv(path, index=False)
+
+        # Act
+        meta, _ = store_upload(path, "ventas.csv")
+        leido = files_repo.read_file(meta["file_id"])
+        norte = files_repo.read_file(meta["file_id"], filters=[("tienda", "==", "101")])
+
+        # Assert
+        assert list(leido["tienda"].astype(object)) == ["101", "102", "Lima"]
+        assert leido["categoria"].isna().tolist() == [True, True, False]
+        assert leido["categoria"].iloc[2] == "Calzado"
+        assert len(norte) == 1
+
+    def test_filtros_de_corrida_se_leen_del_parquet(self):
+        """
+        Verifica que con filtros la corrida lea solo esas filas del archivo y
+        obtenga lo mismo que filtrar el dataset completo
+        """
+        from app.repositories import files_repo
+        from app.services.etl_service import limpiar_df
+        from app.services.predict_service import _dataset
+
+        # Arrange
+        b1 = _ventas(pd.date_range("2024-01-01", periods=10), "ME001").assign(tienda="Lima Centro")
+        b2 = _ventas(pd.date_range("2024-01-01", periods=10), "ME002").assign(tienda="Lima Norte")
+        meta = files_repo.save_upload_chunks([b1, b2], "ventas.csv")
+        filtros = {"tienda": "Lima Norte", "campania": None, "categoria": "no-es-columna"}
+
+        # Act
+        leido = _dataset(meta["file_id"], filtros)
+        completo = limpiar_df(files_repo.load_dataset(meta["file_id"]), filtros={"tienda": "Lima Norte"})
+
+        # Assert
+        assert len(leido) == 10
+        assert set(leido["CodArticulo"].astype(str)) == {"ME002"}
+        pd.testing.assert_frame_equal(limpiar_df(leido, filtros=filtros), completo, check_categorical=False)
+        assert _dataset(meta["file_id"], {}) is files_repo.load_dataset(meta["file_id"])
+
+    def test_dataset_guardado_se_cachea_tipado(self):
+        """
+        Verifica que las corridas sobre un file_id reutilicen el mismo
+        DataFrame tipado sin volver a leer el archivo
+        """
+        from app.repositories import files_repo
+
+        meta = files_repo.save_upload(_ventas(pd.date_range("2024-01-01", periods=10)), "ventas.csv")
+
+        df1 = files_repo.load_dataset(meta["file_id"])
+        df2 = files_repo.load_dataset(meta["file_id"])
+
+        assert df1 is df2
+        assert pd.api.types.is_datetime64_any_dtype(df1["Fechaventa"])
+
+    def test_correr_sobre_file_id_inexistente_404(self):
+        """
+        Verifica que predecir o entrenar con un file_id desconocido devuelva 404
+        """
+        import uuid
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        fid = uuid.uuid4()
+        with TestClient(app) as client:
+            r_pred = client.post(f"/api/predictions/run/{fid}")
+            r_train = client.post(f"/api/model/train/jobs/{fid}")
+
+        assert r_pred.status_code == 404
+        assert r_train.status_code == 404
+
+
+# ============================================================================
+# PRUEBAS DEL REPOSITORIO EN SQLITE
+# ============================================================================
+
+def _fila(sku, estado="OK", pct=0.1):
+    return {
+        "CodArticulo": sku, "d_media": 10.0, "d_sigma": 2.0, "StockMes": 500.0,
+        "horizon": 60.0, "seguridad": 20.0, "stock_objetivo": 620.0,
+        "dias_cobertura": 50.0, "porcentaje_sobrestock": pct,
+        "indice_riesgo_quiebre": 25.0, "Estado": estado, "Accion": "Monitorear",
+    }
+
+
+class TestRepositorioSQLite:
+    """Pruebas para app/repositories/predictions_repo.py sobre app/models.py"""
+
+    def test_guardar_y_leer_job_con_filas(self):
+        """
+        Verifica que el job y sus filas se guarden y se lean con la misma forma
+        que el manifiesto JSON anterior
+        """
+        from app.repositories import predictions_repo
+
+        # Arrange
+        filas = [_fila("ME001"), _fila("ME002", "Sobre-stock", float("nan"))]
+
+        # Act
+        job_id, n = predictions_repo.save_run({"tienda": "Lima Centro"}, filas, {"OK": 1, "Sobre-stock": 1})
+        job = predictions_repo.get_job(job_id)
+        leidas = predictions_repo.get_job_rows(job_id)
+        predictions_repo.set_job_mae(job_id, 1.5)
+
+        # Assert
+        assert n == 2
+        assert job["status"] == "done"
+        assert job["filters"]["tienda"] == "Lima Centro"
+        assert job["total_items"] == 2
+        assert [r["CodArticulo"] for r in leidas] == ["ME001", "ME002"]
+        assert np.isnan(leidas[1]["porcentaje_sobrestock"])
+        assert predictions_repo.get_job(job_id)["mae"] == 1.5
+        assert predictions_repo.list_jobs()[0]["id"] == job_id
+
+    def test_init_db_crea_tablas_e_importa_manifiesto(self, tmp_path):
+        """
+        Verifica que `python -m app.manage init-db` prepare una base nueva e
+        importe una sola vez el manifiesto JSON anterior
+        """
+        import json
+        import os
+        import sqlite3
+        import subprocess
+        import sys
+
+        # Arrange - base vacía y manifiesto de entrenamientos previo a SQLite
+        (tmp_path / "train_jobs.json").write_text(json.dumps({"jobs": [
+            {"id": "legacy-1", "created_at": "2024-01-01T10:00:00", "status": "done", "params": {}}
+        ]}))
+        backend = Path(__file__).resolve().parents[1]
+        env = {**os.environ, "PYTHONPATH": str(backend), "STORE_DIR": str(tmp_path),
+               "DATABASE_URL": f"sqlite:///{tmp_path / 'nueva.db'}"}
+
+        # Act - dos veces: es idempotente
+        for _ in range(2):
+            subprocess.run([sys.executable, "-m", "app.manage", "init-db"], cwd=tmp_path, env=env, check=True)
+        with sqlite3.connect(tmp_path / "nueva.db") as conn:
+            ids = [r[0] for r in conn.execute("SELECT id FROM train_jobs")]
+            tablas = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+        # Assert
+        assert ids == ["legacy-1"]
+        assert {"files", "prediction_jobs", "prediction_summary_totals", "prediction_cache"} <= tablas
+        assert (tmp_path / "train_jobs.json.migrado").exists()
+
+    def test_escrituras_concurrentes(self):
+        """
+        Verifica que varios hilos puedan crear jobs a la vez sin perder registros
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from app.repositories import predictions_repo
+
+        with ThreadPoolExecutor(8) as pool:
+            ids = list(pool.map(lambda i: predictions_repo.save_run({}, [_fila(f"ME{i}")], {"OK": 1})[0],
+                                range(32)))
+
+        assert len(set(ids)) == 32
+        assert all(predictions_repo.get_job(i)["total_items"] == 1 for i in ids)
+
+    def test_job_inexistente(self):
+        """
+        Verifica que actualizar o leer un job desconocido lance KeyError
+        """
+        from app.repositories import predictions_repo
+
+        with pytest.raises(KeyError):
+            predictions_repo.get_job("no-existe")
+        with pytest.raises(KeyError):
+            predictions_repo.update_job("no-existe", status="failed")
+
+    def test_historial_por_cursor_y_filtros(self):
+        """
+        Verifica que el historial se recorra por cursor sin repetir jobs y
+        que los filtros por tienda y rango de MAE se apliquen en la base
+        """
+        import uuid
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.repositories import predictions_repo
+        from app.utils.paginate import encode_cursor
+
+        # Arrange - tienda única para aislar los jobs de esta prueba
+        tienda = f"T-{uuid.uuid4().hex[:8]}"
+        ids = []
+        for i in range(5):
+            job_id, _ = predictions_repo.save_run({"tienda": tienda}, [_fila("ME001")], {"OK": 1})
+            predictions_repo.set_job_mae(job_id, float(i))
+            ids.append(job_id)
+
+        # Act
+        vistos, cursor, paginas = [], None, 0
+        with TestClient(app) as client:
+            while True:
+                params = {"tienda": tienda, "size": 2, **({"cursor": cursor} if cursor else {})}
+                r = client.get("/api/predictions/history", params=params)
+                vistos += [j["job_id"] for j in r.json()]
+                paginas += 1
+                cursor = r.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            por_mae = client.get("/api/predictions/history",
+                                 params={"tienda": tienda, "mae_min": 1, "mae_max": 3}).json()
+            invalido = client.get("/api/predictions/history", params={"cursor": "%%%"})
+            mal_formados = [
+                client.get("/api/predictions/history", params={"cursor": encode_cursor(*claves)}).status_code
+                for claves in ([], ["2024-01-01"], [1, 2], ["2024-01-01", None], ["a", "b", "c"])
+            ]
+
+        # Assert
+        assert vistos == ids[::-1]
+        assert paginas == 3
+        assert sorted(j["mae"] for j in por_mae) == [1.0, 2.0, 3.0]
+        assert invalido.status_code == 400
+        assert mal_formados == [400] * 5
+
+    def test_resumen_materializado_y_reconstruccion(self):
+        """
+        Verifica que los contadores se actualicen al guardar cada corrida y
+        que la reconstrucción desde los jobs dé el mismo resultado
+        """
+        import uuid
+        from app.repositories import predictions_repo, summary_repo
+
+        # Arrange
+        tienda = f"T-{uuid.uuid4().hex[:8]}"
+        antes = summary_repo.get_summary()
+
+        # Act
+        predictions_repo.save_run({"tienda": tienda}, [_fila("ME001"), _fila("ME002")],
+                                  {"OK": 1, "Quiebre Potencial": 1})
+        predictions_repo.save_run({"tienda": tienda}, [_fila("ME001")], {"OK": 1})
+        despues = summary_repo.get_summary()
+        por_tienda = summary_repo.get_summary(filtros={"tienda": tienda})
+        diario = summary_repo.get_daily(filtros={"tienda": tienda})
+        reconstruido = summary_repo.rebuild()
+
+        # Assert
+        assert despues["total"] == antes["total"] + 3
+        assert por_tienda == {"total": 3, "estados": {"OK": 2, "Quiebre Potencial": 1}}
+        assert len(diario) == 1 and diario[0]["total"] == 3
+        assert reconstruido == despues
+
+
+# ============================================================================
+# PRUEBAS DEL EXPORT EN STREAMING
+# ============================================================================
+
+class TestExportStreaming:
+    """Pruebas para app/services/export_service.py y /predictions/export"""
+
+    def _guardar_job(self, n=12):
+        from app.repositories import predictions_repo
+
+        filas = [
+            _fila(f"ME{i:03d}", "OK" if i % 3 else "Sobre-stock")
+            for i in range(n)
+        ]
+        job_id, _ = predictions_repo.save_run({}, filas, {"OK": 8, "Sobre-stock": 4})
+        return job_id
+
+    def test_csv_por_bloques_con_filtro_y_columnas(self, monkeypatch):
+        """
+        Verifica que el CSV se arme por bloques con una sola cabecera y respete
+        el filtro de Estado y la selección de columnas
+        """
+        import io
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.services import export_service
+
+        # Arrange - bloques de 5 filas para forzar varios
+        monkeypatch.setattr(export_service, "EXPORT_CHUNK", 5)
+        job_id = self._guardar_job()
+
+        # Act
+        with TestClient(app) as client:
+            completo = client.get("/api/predictions/export", params={"job_id": job_id})
+            parcial = client.get("/api/predictions/export", params={
+                "job_id": job_id, "columnas": "CodArticulo,Estado", "estado": "Sobre-stock"})
+            vacio = client.get("/api/predictions/export", params={"job_id": "no-existe"})
+
+        # Assert
+        df = pd.read_csv(io.StringIO(completo.text))
+        assert completo.status_code == 200
+        assert len(df) == 12
+        assert df["CodArticulo"].tolist() == [f"ME{i:03d}" for i in range(12)]
+        df_parcial = pd.read_csv(io.StringIO(parcial.text))
+        assert list(df_parcial.columns) == ["CodArticulo", "Estado"]
+        assert set(df_parcial["Estado"]) == {"Sobre-stock"} and len(df_parcial) == 4
+        assert vacio.status_code == 404
+
+    def test_parquet_y_gzip(self, monkeypatch):
+        """
+        Verifica que los formatos Parquet y CSV comprimido se puedan leer de vuelta
+        """
+        import gzip
+        import io
+        from app.services import export_service
+
+        monkeypatch.setattr(export_service, "EXPORT_CHUNK", 5)
+        job_id = self._guardar_job()
+
+        body, media, nombre = export_service.export_stream(job_id, "parquet")
+        tabla = pd.read_parquet(io.BytesIO(b"".join(body)))
+        body_gz, media_gz, nombre_gz = export_service.export_stream(job_id, "csv", comprimir=True)
+        csv_gz = pd.read_csv(io.BytesIO(gzip.decompress(b"".join(body_gz))))
+
+        assert len(tabla) == 12 and nombre.endswith(".parquet")
+        assert len(csv_gz) == 12 and nombre_gz.endswith(".csv.gz")
+        assert media_gz == "application/gzip"
+        with pytest.raises(ValueError):
+            export_service.export_stream(job_id, "csv", columnas=["NoExiste"])
+
+
+# ============================================================================
+# PRUEBAS DE FILAS POR JOB EN FORMATO COLUMNAR
+# ============================================================================
+
+class TestFilasColumnar:
+    """Pruebas para el almacenamiento Parquet de app/repositories/predictions_repo.py"""
+
+    def test_lectura_por_columnas(self):
+        """
+        Verifica que las filas se guarden en Parquet y se puedan leer solo las
+        columnas que usa la comparación
+        """
+        import pyarrow.parquet as pq
+        from app.repositories import predictions_repo
+
+        # Arrange
+        filas = [_fila(f"ME{i:03d}", "OK" if i % 2 else "Quiebre Potencial") for i in range(6)]
+
+        # Act
+        job_id, _ = predictions_repo.save_run({}, filas, {"OK": 3, "Quiebre Potencial": 3})
+        parcial = predictions_repo.read_job_rows(job_id, columns=["CodArticulo", "d_media"])
+        quiebres = predictions_repo.read_job_rows(job_id, filters=[("Estado", "==", "Quiebre Potencial")])
+        esquema = pq.read_schema(predictions_repo.rows_path(job_id))
+
+        # Assert
+        assert list(parcial.columns) == ["CodArticulo", "d_media"]
+        assert parcial["CodArticulo"].tolist() == [f"ME{i:03d}" for i in range(6)]
+        assert len(quiebres) == 3
+        assert str(esquema.field("Estado").type).startswith("dictionary")
+        assert predictions_repo.get_job_rows(job_id)[1] == filas[1]
+
+    def test_detalle_paginado_filtrado_y_ordenado(self):
+        """
+        Verifica que el detalle de un job se pagine, filtre y ordene en el
+        servidor y que sin size siga devolviendo todas las filas
+        """
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.repositories import predictions_repo
+
+        # Arrange - riesgo creciente con i, estados alternados
+        filas = []
+        for i in range(30):
+            f = _fila(f"{'ME' if i < 20 else 'PR'}{i:03d}", "OK" if i % 2 else "Quiebre Potencial")
+            f["indice_riesgo_quiebre"] = float(i)
+            filas.append(f)
+        job_id, _ = predictions_repo.save_run({}, filas, {"OK": 15, "Quiebre Potencial": 15})
+
+        # Act
+        with TestClient(app) as client:
+            todo = client.get(f"/api/predictions/{job_id}").json()
+            pagina = client.get(f"/api/predictions/{job_id}", params={
+                "estado": "OK", "sku": "ME", "sort": "-riesgo", "size": 3, "page": 2}).json()
+            rango = client.get(f"/api/predictions/{job_id}", params={
+                "riesgo_min": 5, "riesgo_max": 9, "sort": "riesgo"}).json()
+
+        # Assert
+        assert len(todo["predictions"]) == 30 and todo["total"] == 30
+        # OK con prefijo ME: 1,3,...,19 -> desc: 19,17,15 | 13,11,9
+        assert pagina["total"] == 10
+        assert [p["indice_riesgo_quiebre"] for p in pagina["predictions"]] == [13.0, 11.0, 9.0]
+        assert [p["indice_riesgo_quiebre"] for p in rango["predictions"]] == [5.0, 6.0, 7.0, 8.0, 9.0]
+
+    def test_orden_con_empates_estable_entre_paginas(self):
+        """
+        Verifica que ordenar por una columna con valores repetidos recorra
+        todas las filas sin repetir ni saltar ninguna entre páginas
+        """
+        from app.repositories import predictions_repo
+
+        # Arrange - tres valores de riesgo para 24 SKUs
+        filas = []
+        for i in range(24):
+            f = _fila(f"ME{i:03d}")
+            f["indice_riesgo_quiebre"] = float(i % 3)
+            filas.append(f)
+        job_id, _ = predictions_repo.save_run({}, filas, {"OK": 24})
+
+        # Act
+        paginas = [predictions_repo.query_job_rows(job_id, sort="indice_riesgo_quiebre", descending=True,
+                                                   offset=k * 5, limit=5)[0] for k in range(5)]
+        skus = pd.concat(paginas)["CodArticulo"].astype(str).tolist()
+
+        # Assert - dentro de cada riesgo, en orden de guardado
+        assert skus == [f"ME{i:03d}" for r in (2, 1, 0) for i in range(24) if i % 3 == r]
+
+
+# ============================================================================
+# PRUEBAS DE SERIALIZACIÓN RÁPIDA
+# ============================================================================
+
+class TestSerializacionRapida:
+    """Pruebas para app/utils/fast_json.py"""
+
+    def test_fast_igual_a_respuesta_validada(self):
+        """
+        Verifica que la ruta rápida produzca las mismas filas que la
+        respuesta validada por pydantic, también en orientación por columnas
+        """
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.repositories import predictions_repo
+
+        # Arrange
+        filas = [_fila(f"ME{i:03d}", "OK" if i % 2 else "Sobre-stock") for i in range(5)]
+        job_id, _ = predictions_repo.save_run({}, filas, {"OK": 2, "Sobre-stock": 3})
+
+        # Act
+        with TestClient(app) as client:
+            normal = client.get(f"/api/predictions/{job_id}").json()
+            rapido = client.get(f"/api/predictions/{job_id}", params={"fast": True}).json()
+            columnas = client.get(f"/api/predictions/{job_id}", params={"orient": "columns"}).json()
+
+        # Assert
+        assert rapido == normal
+        assert columnas["predictions"]["CodArticulo"] == [f["CodArticulo"] for f in filas]
+        assert columnas["predictions"]["Estado"] == [f["Estado"] for f in filas]
+
+    def test_esquema_se_valida_por_dataframe(self):
+        """
+        Verifica que falten columnas o tipos incorrectos se detecten a nivel de DataFrame
+        """
+        from app.schemas import PredictionItem
+        from app.utils.fast_json import check_frame
+
+        df = pd.DataFrame([_fila("ME001")])
+
+        check_frame(df, PredictionItem)
+        with pytest.raises(ValueError):
+            check_frame(df.drop(columns=["Accion"]), PredictionItem)
+        with pytest.raises(ValueError):
+            check_frame(df.assign(d_media="alto"), PredictionItem)
+
+
+# ============================================================================
+# PRUEBAS DEL MODO CATEGÓRICO (SIN ONE-HOT)
+# ============================================================================
+
+class TestModeloCategorico:
+    """Pruebas para ml/modelo_categorico.py"""
+
+    @pytest.mark.parametrize("codificacion", ["nativo", "target"])
+    def test_prediccion_no_depende_del_orden_de_categorias(self, codificacion):
+        """
+        Verifica que predecir con categorías en otro orden (otro archivo) dé
+        lo mismo y que un SKU nuevo no rompa la predicción
+        """
+        from ml.features import construir_features, X_COLS
+        from ml.modelo_categorico import ModeloCategorico
+
+        # Arrange
+        df = construir_features(pd.concat([
+            _ventas(pd.date_range("2024-01-01", periods=60), "ME001"),
+            _ventas(pd.date_range("2024-01-01", periods=60), "ME002"),
+        ], ignore_index=True))
+        modelo = ModeloCategorico(codificacion, n_estimators=20).fit(df[X_COLS], df["CantidadVendida"])
+        X = df[X_COLS]
+        invertido = X.assign(CodArticulo=X["CodArticulo"].cat.reorder_categories(["ME002", "ME001"]))
+        nuevo = X.assign(CodArticulo=X["CodArticulo"].cat.rename_categories(["ME001", "ME999"]))
+
+        # Act
+        p1 = modelo.predict(X)
+        p2 = modelo.predict(invertido)
+        p3 = modelo.predict(nuevo)
+
+        # Assert
+        np.testing.assert_allclose(p1, p2)
+        assert np.isfinite(p3).all()
+        assert list(modelo.get_feature_names_out()) == X_COLS
+
+    def test_target_entrenamiento_sin_fuga_de_la_propia_venta(self):
+        """
+        Verifica que en modo target cada fila de entrenamiento se codifique
+        solo con las ventas anteriores de su SKU y que la predicción use la
+        media de todo el entrenamiento
+        """
+        from ml.features import construir_features, X_COLS
+        from ml.modelo_categorico import ModeloCategorico
+
+        # Arrange
+        df = construir_features(pd.concat([
+            _ventas(pd.date_range("2024-01-01", periods=60), "ME001"),
+            _ventas(pd.date_range("2024-01-01", periods=60), "ME002"),
+        ], ignore_index=True))
+        X, y = df[X_COLS], df["CantidadVendida"].to_numpy(dtype=float)
+        modelo = ModeloCategorico("target", suavizado=5.0, n_estimators=5).fit(X, y)
+        g, s = modelo.media_global, modelo.suavizado
+
+        # Act
+        entrenamiento = modelo._preparar(X, y)["CodArticulo"].to_numpy()
+        alterado = y.copy()
+        alterado[-1] += 1000
+        tras_cambio = modelo._preparar(X, alterado)["CodArticulo"].to_numpy()
+        inferencia = modelo._preparar(X)["CodArticulo"].to_numpy()
+
+        # Assert
+        me001 = np.flatnonzero(df["CodArticulo"] == "ME001")
+        assert entrenamiento[me001[0]] == pytest.approx(g)
+        assert entrenamiento[me001[2]] == pytest.approx((y[me001[0]] + y[me001[1]] + s * g) / (2 + s))
+        np.testing.assert_allclose(tras_cambio, entrenamiento)
+        assert inferencia[me001[0]] == pytest.approx(modelo.media_sku["ME001"])
+
+
+class TestEntrenamientoDMatrix:
+    """Pruebas para ml/train_model.py y ml/entrenamiento_particiones.py"""
+
+    def test_corte_temporal_relativo_a_los_datos(self):
+        """
+        Verifica que el corte fijo se use si cruza la historia y que, si no,
+        la prueba sean los últimos días disponibles
+        """
+        from ml.train_model import corte_temporal
+
+        # Arrange
+        fechas_2024 = pd.Series(pd.date_range("2024-06-01", "2024-12-31"))
+        fechas_previas = pd.Series(pd.date_range("2024-01-01", periods=120))
+
+        # Act
+        fijo = corte_temporal(fechas_2024)
+        relativo = corte_temporal(fechas_previas)
+
+        # Assert
+        assert fijo == pd.Timestamp("2024-10-01")
+        assert relativo == fechas_previas.max() - pd.Timedelta(days=23)
+
+    def test_particiones_igual_a_entrenamiento_en_memoria(self):
+        """
+        Verifica que entrenar por grupos de SKU desde bloques dé el mismo
+        modelo que con el frame completo, con early stopping activo
+        """
+        from ml.train_model import entrenar_modelo, entrenar_por_particiones
+
+        # Arrange
+        np.random.seed(0)
+        fechas = pd.date_range("2024-01-01", periods=120)
+        df = pd.concat([_ventas(fechas, f"ME{i:03d}") for i in range(6)], ignore_index=True)
+
+        # Act
+        completo = entrenar_modelo(df, modo="target", early_stopping_rounds=10)
+        por_bloques = entrenar_por_particiones(
+            lambda skus: df[df["CodArticulo"].isin(skus)], df["CodArticulo"].unique().tolist(),
+            df["Fechaventa"], modo="target", n_particiones=3, early_stopping_rounds=10,
+        )
+
+        # Assert
+        assert por_bloques["mae"] == completo["mae"]
+        assert len(por_bloques["alerta"]) == 6
+        with pytest.raises(ValueError):
+            entrenar_por_particiones(lambda skus: df, ["ME000"], df["Fechaventa"], modo="onehot")
+
+    def test_memoria_externa_desde_settings(self, monkeypatch):
+        """
+        Verifica que TRAIN_EXTERNAL_MEMORY haga entrenar por particiones con la
+        caché en disco de XGBoost y dé el mismo modelo que en memoria
+        """
+        from ml import train_model
+        from app.repositories.files_repo import save_upload
+        from app.services.train_service import train_from_file
+        from app.utils.config import settings
+
+        # Arrange
+        np.random.seed(0)
+        fechas = pd.date_range("2024-01-01", periods=120)
+        fid = save_upload(pd.concat([_ventas(fechas, f"ME{i:03d}") for i in range(4)], ignore_index=True),
+                          "ventas.csv")["file_id"]
+        externas = []
+
+        class Iterador(train_model.IteradorParquet):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                externas.append(self.externa)
+
+        monkeypatch.setattr(train_model, "IteradorParquet", Iterador)
+
+        # Act
+        en_memoria = train_from_file(fid, modo="nativo", particiones=2)
+        monkeypatch.setattr(settings, "TRAIN_EXTERNAL_MEMORY", True)
+        en_disco = train_from_file(fid, modo="nativo", particiones=2)
+
+        # Assert
+        assert externas == [False, False, True, True]
+        assert en_disco["mae"] == en_memoria["mae"]
+
+    def test_onehot_con_early_stopping(self):
+        """
+        Verifica que el modo onehot separe validación y corte árboles con
+        early stopping, igual que los modos nativo y target
+        """
+        from ml.features import construir_features
+        from ml.train_model import ajustar_estimador, corte_temporal, XGB_PARAMS
+
+        # Arrange
+        np.random.seed(0)
+        df = construir_features(pd.concat([_ventas(pd.date_range("2024-01-01", periods=120), f"ME{i:03d}")
+                                           for i in range(3)], ignore_index=True))
+        corte = corte_temporal(df["Fechaventa"], None)
+        train = df[df["Fechaventa"] < corte]
+
+        # Act
+        pipe = ajustar_estimador("onehot", train, corte, early_stopping_rounds=5)
+
+        # Assert
+        assert pipe.named_steps["xgb"].best_iteration < XGB_PARAMS["n_estimators"] - 1
+
+
+class TestBacktest:
+    """Pruebas para ml/backtest.py"""
+
+    def test_origenes_y_metricas_desde_sumas(self):
+        """
+        Verifica los orígenes de los pliegues y que las métricas armadas desde
+        sumas por SKU coincidan con las calculadas fila a fila
+        """
+        from ml.backtest import origenes, sumas_por_sku, metricas_desde_sumas, SUMAS
+        from ml.train_model import metricas
+
+        # Arrange
+        fechas = pd.Series(pd.date_range("2024-01-01", "2024-03-31"))
+        sku = pd.Series(["A", "B", "A", "C"])
+        y, pred = np.array([10.0, 0.0, 5.0, 8.0]), np.array([12.0, 1.0, 4.0, 8.0])
+
+        # Act
+        inicios = origenes(fechas, n_pliegues=3, horizonte=7, paso=7)
+        total = metricas_desde_sumas(sumas_por_sku(sku, y, pred)[SUMAS].sum().to_frame().T).iloc[0]
+
+        # Assert
+        assert inicios[-1] == pd.Timestamp("2024-03-25")
+        assert inicios[0] == pd.Timestamp("2024-03-11")
+        for k, v in metricas(y, pred).items():
+            assert total[k] == pytest.approx(v)
+        with pytest.raises(ValueError):
+            origenes(fechas, n_pliegues=20, horizonte=7, paso=7)
+
+    def test_backtest_reporta_pliegues_y_skus(self, tmp_path):
+        """Verifica el reporte por pliegue y por SKU sobre la matriz cacheada"""
+        from ml.backtest import backtest
+        from ml.features import construir_features, guardar_features
+
+        # Arrange
+        fechas = pd.date_range("2024-01-01", periods=120)
+        df = pd.concat([_ventas(fechas, f"ME{i:03d}") for i in range(3)], ignore_index=True)
+        ruta = tmp_path / "features.arrow"
+        guardar_features(construir_features(df), ruta)
+
+        # Act
+        out = backtest(ruta, modo="target", n_pliegues=3, horizonte=7, paso=7, workers=1)
+
+        # Assert
+        assert list(out["pliegues"]["filas_test"]) == [21, 21, 21]
+        assert out["pliegues"]["origen"].is_monotonic_increasing
+        assert len(out["por_sku"]) == 3
+        assert len(out["por_sku_pliegue"]) == 9
+        assert out["por_sku"]["n"].sum() == 63
+        assert set(out["global"]) == {"mae", "mape", "wape", "smape", "bias"}
+
+    @pytest.mark.integration
+    def test_api_reparte_pliegues_en_procesos(self, monkeypatch):
+        """
+        Verifica que /model/backtest use varios procesos para los pliegues
+        aunque la API lo corra como job
+        """
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.utils.config import settings
+
+        # Arrange
+        monkeypatch.setattr(settings, "BACKTEST_WORKERS", 2)
+
+        with TestClient(app) as client:
+            fid = client.post("/api/files/upload", files={"file": ("ventas.csv", _csv_ventas(3, 120))}).json()["file_id"]
+
+            # Act
+            r = client.post(f"/api/model/backtest/{fid}",
+                            params={"modo": "target", "pliegues": 2, "horizonte": 7, "paso": 7})
+
+        # Assert
+        assert r.status_code == 200, r.text
+        assert r.json()["workers"] == 2
+        assert len(r.json()["pliegues"]) == 2
+
+
+class TestTuning:
+    """Pruebas para ml/tuning.py"""
+
+    def test_successive_halving_descarta_y_respeta_presupuesto(self, tmp_path):
+        """
+        Verifica que cada ronda conserve 1/eta de las configuraciones con más
+        árboles y que sin tiempo no se evalúen más trials
+        """
+        from ml.features import construir_features, guardar_features
+        from ml.tuning import tunear
+
+        # Arrange
+        fechas = pd.date_range("2024-01-01", periods=150)
+        df = pd.concat([_ventas(fechas, f"ME{i:03d}") for i in range(3)], ignore_index=True)
+        ruta = tmp_path / "features.arrow"
+        guardar_features(construir_features(df), ruta)
+
+        # Act
+        out = tunear(ruta, "target", n_trials=4, eta=2, rondas_min=5, rondas_max=20, workers=1)
+        corto = tunear(ruta, "target", n_trials=4, eta=2, rondas_min=5, rondas_max=20, workers=1,
+                       presupuesto_s=0.0)
+
+        # Assert
+        por_nivel = pd.Series([t["nivel"] for t in out["trials"]]).value_counts().sort_index()
+        assert list(por_nivel) == [4, 2, 1]
+        assert out["rondas_halving"] == 3
+        assert out["params"]["n_estimators"] <= 20
+        assert out["mae_val"] == min(t["mae"] for t in out["trials"] if t["nivel"] == 2)
+        assert corto["agotado"] is True
+        assert len(corto["trials"]) == 1
+        assert corto["trials"][0]["cortado"] is True
+
+    @pytest.mark.parametrize("modo", ["onehot", "target"])
+    def test_trial_se_corta_al_vencer_el_plazo(self, tmp_path, modo):
+        """
+        Verifica que un trial que ya pasó su plazo deje de agregar árboles
+        en lugar de entrenar todas sus rondas
+        """
+        import time
+        from ml.features import construir_features, guardar_features
+        from ml.tuning import evaluar_trial, muestrear, _matriz
+
+        fechas = pd.date_range("2024-01-01", periods=150)
+        df = pd.concat([_ventas(fechas, f"ME{i:03d}") for i in range(3)], ignore_index=True)
+        ruta = tmp_path / "features.arrow"
+        guardar_features(construir_features(df), ruta)
+        inicio_val, corte = pd.Timestamp("2024-04-15"), pd.Timestamp("2024-05-01")
+        params = muestrear(1)[0]
+
+        try:
+            completo = evaluar_trial(str(ruta), modo, params, 200, inicio_val, corte)
+            cortado = evaluar_trial(str(ruta), modo, params, 200, inicio_val, corte, limite=time.time())
+        finally:
+            _matriz.cache_clear()
+
+        assert completo["cortado"] is False
+        assert cortado["cortado"] is True
+        assert cortado["segundos"] < completo["segundos"]
+
+    @pytest.mark.integration
+    def test_api_reparte_trials_en_procesos(self, monkeypatch):
+        """
+        Verifica que /model/train con tuning use varios procesos para los
+        trials aunque la API lo corra como job
+        """
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.utils.config import settings
+
+        # Arrange
+        for k, v in {"TUNING_WORKERS": 2, "TUNING_TRIALS": 4, "TUNING_ETA": 2, "TUNING_MIN_ROUNDS": 5}.items():
+            monkeypatch.setattr(settings, k, v)
+
+        with TestClient(app) as client:
+            fid = client.post("/api/files/upload", files={"file": ("ventas.csv", _csv_ventas(3, 150))}).json()["file_id"]
+
+            # Act
+            r = client.post(f"/api/model/train/{fid}", params={"tuning": True, "modo": "target"})
+
+        # Assert
+        assert r.status_code == 200, r.text
+        assert r.json()["tuning"]["workers"] == 2
+
+
+class TestAgregadosPorSku:
+    """Pruebas para ml/agregados.py"""
+
+    def test_resumen_igual_a_groupby(self):
+        """
+        Verifica que el resumen vectorizado coincida con los groupby de pandas
+        (media, sigma de las últimas 30 con respaldo, último stock, primer
+        lead time), con nulos y con filas no agrupadas por SKU
+        """
+        from ml.agregados import resumen_por_sku
+
+        # Arrange
+        rng = np.random.default_rng(0)
+        n = 40
+        df = pd.DataFrame({
+            "CodArticulo": np.repeat(["A", "B", "C"], n),
+            "CantidadVendida": rng.integers(0, 100, 3 * n).astype(float),
+            "Pred": rng.normal(50, 5, 3 * n),
+            "StockMes": rng.integers(100, 200, 3 * n).astype(float),
+            "TiempoReposicionDias": np.repeat([30.0, 45.0, 60.0], n),
+        })
+        df.loc[df.index[-30:], "CantidadVendida"] = np.nan     # C: últimas 30 nulas
+        df.loc[df.index[n - 1], "StockMes"] = np.nan            # A: último stock nulo
+
+        def sigma(g):
+            s = g.tail(30).std(ddof=0)
+            return g.std(ddof=0) if np.isnan(s) else s
+
+        g = df.groupby("CodArticulo")
+        esperado = pd.DataFrame({
+            "d_media": g["Pred"].mean(),
+            "d_sigma": g["CantidadVendida"].apply(sigma),
+            "StockMes": g["StockMes"].last(),
+            "horizon": g["TiempoReposicionDias"].first(),
+        })
+        mezclado = df.iloc[np.argsort(np.tile(np.arange(n), 3), kind="stable")]
+
+        # Act
+        agrupado = resumen_por_sku(df)
+        desordenado = resumen_por_sku(mezclado).sort_index()
+
+        # Assert
+        pd.testing.assert_frame_equal(agrupado, esperado, check_index_type=False)
+        pd.testing.assert_frame_equal(desordenado, esperado, check_index_type=False)
+
+
+# ============================================================================
+# PRUEBAS DEL CACHÉ DE RESULTADOS
+# ============================================================================
+
+class TestCacheResultados:
+    """Pruebas para app/services/result_cache.py"""
+
+    def _consulta(self, contenido, filtros):
+        from app.services import result_cache
+        filtros = {k: v for k, v in filtros.items() if v}
+        return {"key": result_cache.clave(contenido, "v1", filtros), "content_hash": contenido,
+                "model_version": "v1", "filtros": filtros}
+
+    def test_hit_en_memoria_y_disco_con_desalojo_lru(self, monkeypatch):
+        """
+        Verifica que una corrida idéntica devuelva el job guardado (primero
+        desde memoria y, sin ella, desde el índice en disco), que otros
+        filtros no colisionen y que el índice desaloje la entrada menos usada
+        """
+        import uuid
+        from app.services import result_cache
+        from app.repositories import predictions_repo
+        from app.utils.config import settings
+
+        # Arrange
+        monkeypatch.setattr(settings, "PREDICTION_CACHE_ENTRIES", 2)
+        result_cache.limpiar()
+        contenido = uuid.uuid4().hex
+        frame = pd.DataFrame([_fila("ME001", "Sobre-stock"), _fila("ME002")])
+        summary = {"Sobre-stock": 1, "OK": 1}
+        lima = self._consulta(contenido, {"tienda": "Lima Centro", "campania": None})
+        norte = self._consulta(contenido, {"tienda": "Lima Norte"})
+        job_id, _ = predictions_repo.save_run(lima["filtros"], frame, summary)
+
+        # Act
+        antes = result_cache.buscar(lima)
+        result_cache.registrar(lima, job_id, summary, frame)
+        en_memoria = result_cache.buscar(lima)
+        result_cache.limpiar()
+        en_disco = result_cache.buscar(lima)
+        otro_filtro = result_cache.buscar(norte)
+        stats = result_cache.stats()
+        # dos corridas nuevas desalojan del índice a la de Lima Centro
+        result_cache.limpiar()
+        for tienda in ("Sur", "Este"):
+            c = self._consulta(contenido, {"tienda": tienda})
+            result_cache.registrar(c, job_id, summary, frame)
+        result_cache.limpiar()
+        desalojada = result_cache.buscar(lima)
+
+        # Assert
+        assert antes is None
+        assert en_memoria[0] == job_id and en_memoria[2] is frame
+        assert en_disco[0] == job_id and en_disco[1] == summary
+        assert list(en_disco[2]["CodArticulo"]) == ["ME001", "ME002"]
+        assert otro_filtro is None
+        assert stats["hits_disco"] == 1 and stats["misses"] == 1
+        assert desalojada is None
+
+    def test_sin_filtros_solo_con_estado_del_mismo_contenido(self, tmp_path, monkeypatch):
+        """
+        Verifica que una corrida sin filtros solo se reutilice si el estado
+        de features guardado en disco lo escribió ese mismo contenido, sin
+        importar en qué orden se registraron los jobs
+        """
+        import uuid
+        from app.services import result_cache
+        from app.repositories import predictions_repo
+        from ml import feature_state
+
+        # Arrange
+        estado = tmp_path / "estado.joblib"
+        monkeypatch.setattr(result_cache, "origen_estado", lambda: feature_state.origen_estado(estado))
+        result_cache.limpiar()
+        a, b = uuid.uuid4().hex, uuid.uuid4().hex
+        frame = pd.DataFrame([_fila("ME001")])
+        ca, cb = self._consulta(a, {}), self._consulta(b, {})
+        job_a, _ = predictions_repo.save_run({}, frame, {"OK": 1})
+        job_b, _ = predictions_repo.save_run({}, frame, {"OK": 1})
+        cola = pd.DataFrame({"CodArticulo": ["ME001"], "Fechaventa": [pd.Timestamp("2024-01-01")],
+                             "CantidadVendida": [1]})
+
+        # Act - A escribe el estado; B lo reescribe pero A se registra al final
+        feature_state.guardar_estado(cola, estado, origen=a)
+        result_cache.registrar(ca, job_a, {"OK": 1}, frame)
+        hit_a = result_cache.buscar(ca)
+        feature_state.guardar_estado(cola, estado, origen=b)
+        result_cache.registrar(cb, job_b, {"OK": 1}, frame)
+        result_cache.registrar(ca, job_a, {"OK": 1}, frame)
+        tras_b = result_cache.buscar(ca)
+        hit_b = result_cache.buscar(cb)
+        feature_state.guardar_estado(cola, estado)      # p. ej. una corrida incremental
+        tras_incremental = result_cache.buscar(cb)
+
+        # Assert
+        assert hit_a[0] == job_a
+        assert tras_b is None
+        assert hit_b[0] == job_b
+        assert tras_incremental is None
+
+
+# ============================================================================
+# PRUEBAS DE PREDICCIÓN PARTICIONADA
+# ============================================================================
+
+class TestPrediccionParticionada:
+    """Pruebas para ml/prediccion_particiones.py"""
+
+    def test_worker_no_abre_pools_anidados(self):
+        """
+        Verifica que dentro de un worker del pool compartido no se repartan
+        trabajos en más procesos y que XGBoost quede con los hilos asignados
+        """
+        import xgboost as xgb
+        from ml.procesos import crear_pool, en_worker, workers_para
+
+        with crear_pool(2) as ex:
+            dentro = ex.submit(workers_para, 4, 4).result()
+            marcado = ex.submit(en_worker).result()
+            hilos = ex.submit(xgb.get_config).result()["nthread"]
+
+        assert workers_para(4, 4) == 4 and not en_worker()
+        assert dentro == 1 and marcado
+        assert hilos >= 1
+
+    def test_jobs_que_reparten_corren_en_hilo_de_la_api(self, monkeypatch):
+        """
+        Verifica que una predicción particionada se coordine desde un hilo de
+        la API, donde sí se reparte en varios procesos, y no desde un worker
+        """
+        import asyncio
+        from ml.procesos import workers_para
+        from app.services import job_queue
+        from app.services.predict_service import prediccion_en_paralelo
+        from app.utils.config import settings
+
+        # Arrange
+        monkeypatch.setattr(settings, "PREDICT_WORKERS", 2)
+
+        async def ambos():
+            return (await job_queue.run(workers_para, 2, 4, local=True),
+                    await job_queue.run(workers_para, 2, 4))
+
+        # Act
+        en_hilo, en_pool = asyncio.run(ambos())
+
+        # Assert
+        assert prediccion_en_paralelo(4) and not prediccion_en_paralelo(1)
+        assert en_hilo == 2
+        assert en_pool == 1
+
+    def test_particion_estable_por_sku(self):
+        """
+        Verifica que todas las filas de un SKU caigan en la misma partición
+        y que la asignación no dependa del orden ni del tipo de la columna
+        """
+        from ml.prediccion_particiones import particion_sku
+
+        skus = pd.Series([f"ME{i:03d}" for i in range(50)] * 3)
+
+        p = particion_sku(skus, 4)
+        p_cat = particion_sku(skus.astype("category")[::-1], 4)[::-1]
+
+        assert set(p) <= {0, 1, 2, 3}
+        assert len(set(p)) > 1
+        assert (pd.Series(p).groupby(skus).nunique() == 1).all()
+        np.testing.assert_array_equal(p, p_cat)
+
+    @pytest.mark.requires_model
+    def test_particionado_igual_a_pasada_unica(self):
+        """
+        Verifica que repartir los SKUs entre procesos devuelva las mismas
+        alertas y la misma cola de estado que una sola pasada
+        """
+        from ml.model_prediction import predecir_con_estado
+        from ml.prediccion_particiones import predecir_particionado
+
+        if not Path("outputs/modelo_xgb_sku_global.joblib").exists():
+            pytest.skip("Modelo no entrenado")
+
+        # Arrange
+        fechas = pd.date_range("2024-01-01", periods=45)
+        df = pd.concat([_ventas(fechas, f"ME{i:03d}") for i in range(6)], ignore_index=True)
+
+        # Act
+        unica, cola_unica = predecir_con_estado(df, None, actualizar=True)
+        partes, cola_partes = predecir_particionado(df, None, actualizar=True, n_particiones=3, workers=2)
+
+        # Assert
+        texto = lambda d: d.assign(CodArticulo=d["CodArticulo"].astype(str))
+        pd.testing.assert_frame_equal(texto(unica), texto(partes), check_dtype=False)
+        pd.testing.assert_frame_equal(texto(cola_unica), texto(cola_partes), check_dtype=False)
+
+
+# ============================================================================
+# PRUEBAS DE ESCENARIOS EN LOTE
+# ============================================================================
+
+class TestEscenariosLote:
+    """Pruebas para ml/escenarios.py"""
+
+    def test_mascara_igual_a_limpiar_df(self):
+        """
+        Verifica que la máscara de filtros seleccione las mismas filas que
+        limpiar_df, ignorando filtros vacíos y columnas inexistentes
+        """
+        from app.services.etl_service import limpiar_df
+        from ml.escenarios import mascara_filtros
+
+        df = pd.DataFrame({"tienda": ["A", "B", None, "A"], "categoria": ["x", "x", "y", "y"]})
+
+        for filtros in ({"tienda": "A"}, {"tienda": "A", "categoria": "y"}, {"tienda": None, "campania": "z"}):
+            esperado = limpiar_df(df, filtros)
+            obtenido = df[mascara_filtros(df, filtros)].reset_index(drop=True)
+            pd.testing.assert_frame_equal(obtenido, esperado)
+
+    @pytest.mark.requires_model
+    def test_escenarios_igual_a_corridas_separadas(self):
+        """
+        Verifica que cada escenario del lote coincida con una corrida con
+        esos filtros, tanto si conserva SKUs enteros como si los recorta
+        """
+        from app.services.etl_service import limpiar_df
+        from ml.escenarios import predecir_escenarios
+        from ml.model_prediction import procesar_prediccion_global
+
+        if not Path("outputs/modelo_xgb_sku_global.joblib").exists():
+            pytest.skip("Modelo no entrenado")
+
+        # Arrange - categoría fija por SKU, tienda variable por día
+        fechas = pd.date_range("2024-01-01", periods=60)
+        df = pd.concat([_ventas(fechas, f"ME{i:03d}").assign(categoria=f"C{i % 2}") for i in range(4)],
+                       ignore_index=True)
+        df["tienda"] = np.where(np.arange(len(df)) % 3 == 0, "A", "B")
+        escenarios = [{}, {"categoria": "C1"}, {"tienda": "B"}, {"tienda": "B", "categoria": "C0"}]
+
+        # Act
+        lote = predecir_escenarios(df, escenarios)
+
+        # Assert
+        texto = lambda d: d.assign(CodArticulo=d["CodArticulo"].astype(str))
+        for filtros, obtenido in zip(escenarios, lote):
+            esperado = procesar_prediccion_global(limpiar_df(df, filtros))
+            pd.testing.assert_frame_equal(texto(obtenido), texto(esperado), check_dtype=False)
+
+
+# ============================================================================
+# PRUEBAS DEL WHAT-IF DE POLÍTICA DE STOCK
+# ============================================================================
+
+class TestWhatIfPolitica:
+    """Pruebas para ml/what_if.py"""
+
+    def test_grilla_igual_a_politica_por_punto(self):
+        """
+        Verifica que cada celda de la grilla coincida con politica_stock
+        aplicada con ese Z y multiplicador, incluidos SKUs sin lead time
+        """
+        from ml.model_prediction import politica_stock
+        from ml.what_if import grilla_politica, z_servicio
+
+        # Arrange
+        rng = np.random.default_rng(0)
+        n = 1000
+        agregados = pd.DataFrame({
+            "CodArticulo": [f"ME{i:04d}" for i in range(n)],
+            "d_media": rng.gamma(2, 20, n),
+            "d_sigma": rng.gamma(2, 5, n),
+            "StockMes": rng.integers(0, 6000, n).astype(float),
+            "horizon": rng.choice([30.0, 60.0, np.nan], n),
+        })
+        niveles, multiplicadores = [0.8, 0.9, 0.99], [0.5, 1.0, 2.0]
+
+        # Act
+        grilla = grilla_politica(agregados, niveles, multiplicadores, bloque=128)
+
+        # Assert
+        assert len(grilla) == 9
+        for _, celda in grilla.iterrows():
+            punto = politica_stock(agregados.set_index("CodArticulo"), z=z_servicio(celda["nivel_servicio"]),
+                                   multiplicador=celda["multiplicador"])
+            estados = punto["Estado"].value_counts()
+            assert celda["quiebre_potencial"] == estados.get("Quiebre Potencial", 0)
+            assert celda["sobre_stock"] == estados.get("Sobre-stock", 0)
+            assert celda["ok"] == estados.get("OK", 0)
+            assert celda["stock_objetivo_total"] == pytest.approx(punto["stock_objetivo"].sum())
+            assert celda["seguridad_total"] == pytest.approx(punto["seguridad"].sum(), abs=0.01)
+
+    def test_grilla_grande_en_menos_de_un_segundo(self):
+        """
+        Verifica que una grilla de 20 x 20 sobre 100k SKUs se evalúe en
+        frío (primera llamada) bastante por debajo de un segundo
+        """
+        import time
+        from ml.what_if import grilla_politica
+
+        # Arrange
+        rng = np.random.default_rng(0)
+        n = 100_000
+        agregados = pd.DataFrame({
+            "d_media": rng.gamma(2, 5, n),
+            "d_sigma": rng.gamma(2, 2, n),
+            "StockMes": rng.integers(0, 500, n).astype(float),
+            "horizon": rng.choice([7.0, 30.0, 60.0, np.nan], n),
+        })
+
+        # Act
+        inicio = time.perf_counter()
+        grilla = grilla_politica(agregados, np.linspace(0.8, 0.99, 20), np.linspace(0.5, 2.0, 20))
+        segundos = time.perf_counter() - inicio
+
+        # Assert
+        assert len(grilla) == 400
+        assert (grilla[["quiebre_potencial", "sobre_stock", "ok"]].sum(axis=1) == n).all()
+        assert segundos < 0.75
+
+
+# ============================================================================
+# PRUEBAS DEL PRONÓSTICO RECURSIVO
+# ============================================================================
+
+class TestPronosticoRecursivo:
+    """Pruebas para ml/pronostico.py"""
+
+    def test_lags_de_ventana_igual_a_calcular_lags(self):
+        """
+        Verifica que las variables calculadas desde la ventana de 30 ventas
+        sean las de calcular_lags para la observación siguiente
+        """
+        from ml.features import calcular_lags, tipar_df
+        from ml.pronostico import estado_inicial, lags_desde_ventana
+
+        # Arrange - dos SKUs con historia de distinto largo
+        fechas = pd.date_range("2024-01-01", periods=45)
+        df = pd.concat([_ventas(fechas, "ME001"), _ventas(fechas[:35], "ME002")], ignore_index=True)
+
+        # Act
+        estado = estado_inicial(tipar_df(df))
+        desde_ventana = lags_desde_ventana(estado["ventana"])
+
+        # Assert - calcular_lags sobre la serie con una fila más al final
+        for i, sku in enumerate(estado["CodArticulo"].astype(str)):
+            serie = df.loc[df["CodArticulo"] == sku, "CantidadVendida"].to_numpy(dtype=float)
+            esperado = calcular_lags(np.r_[serie, np.nan], np.zeros(len(serie) + 1, dtype=np.int64))
+            for col, arr in desde_ventana.items():
+                assert arr[i] == pytest.approx(esperado[col][-1]), (sku, col)
+        assert list(estado["ultima_fecha"]) == [np.datetime64("2024-02-14"), np.datetime64("2024-02-04")]
+
+    @pytest.mark.requires_model
+    def test_pronostico_por_sku_y_fecha(self):
+        """
+        Verifica que haya una fila por SKU y día futuro, con fechas
+        consecutivas, y que se excluyan SKUs sin historia suficiente
+        """
+        from ml.pronostico import pronosticar
+
+        if not Path("outputs/modelo_xgb_sku_global.joblib").exists():
+            pytest.skip("Modelo no entrenado")
+
+        fechas = pd.date_range("2024-01-01", periods=40)
+        df = pd.concat([_ventas(fechas, "ME001"), _ventas(fechas, "ME002"), _ventas(fechas[:10], "CORTO")],
+                       ignore_index=True)
+
+        pron = pronosticar(df, 5)
+
+        assert list(pron.columns) == ["CodArticulo", "Fechaventa", "paso", "Pred"]
+        assert set(pron["CodArticulo"]) == {"ME001", "ME002"}
+        me001 = pron[pron["CodArticulo"] == "ME001"]
+        assert list(me001["paso"]) == [1, 2, 3, 4, 5]
+        assert list(me001["Fechaventa"]) == list(pd.date_range("2024-02-10", periods=5))
+        assert (pron["Pred"] >= 0).all()
+
+    def test_error_al_guardar_deja_el_job_fallido(self):
+        """
+        Verifica que si falla la escritura del pronóstico el job quede
+        fallido con el error, y no running para siempre
+        """
+        from app.api.router_predictions import _guardar_pronostico
+        from app.repositories import predictions_repo
+
+        # Arrange - pronóstico sin las columnas esperadas
+        antes = {j["id"] for j in predictions_repo.list_jobs()}
+
+        # Act
+        with pytest.raises(KeyError):
+            _guardar_pronostico({}, {}, pd.DataFrame(), pd.DataFrame({"x": [1]}))
+        nuevos = [j for j in predictions_repo.list_jobs() if j["id"] not in antes]
+
+        # Assert
+        assert len(nuevos) == 1
+        assert nuevos[0]["status"] == "failed"
+        assert nuevos[0]["error"]
+        assert nuevos[0]["finished_at"] is not None
+
+
+# ============================================================================
+# PRUEBAS DE LA COMPARACIÓN CONTRA VENTAS REALES
+# ============================================================================
+
+class TestComparacionReal:
+    """Pruebas para app/services/compare_service.py"""
+
+    def _csv(self, filas):
+        import base64
+        df = pd.DataFrame(filas, columns=["CodArticulo", "Fechaventa", "CantidadVendida", "categoria"])
+        return base64.b64encode(df.to_csv(index=False).encode()).decode()
+
+    def _job_con_pronostico(self):
+        from app.repositories import predictions_repo
+
+        job_id, _ = predictions_repo.save_run({}, [_fila("ME001"), _fila("ME002")], {"OK": 2})
+        fechas = pd.date_range("2024-03-01", periods=4)
+        predictions_repo.save_forecast(job_id, pd.DataFrame({
+            "CodArticulo": ["ME001"] * 4 + ["ME002"] * 4,
+            "Fechaventa": list(fechas) * 2,
+            "paso": [1, 2, 3, 4] * 2,
+            "Pred": [10.0, 10.0, 10.0, 10.0, 5.0, 5.0, 5.0, 5.0],
+        }))
+        return job_id
+
+    def test_metricas_por_dia_sku_y_categoria(self):
+        """
+        Verifica que las ventas se crucen por SKU y día con el pronóstico
+        y que MAE, MAPE y WAPE salgan por nivel y por periodo
+        """
+        from app.services.compare_service import compare_with_real
+
+        # Arrange - ME001 en dos tiendas el 01/03 (se suman); ME999 sin pronóstico
+        job_id = self._job_con_pronostico()
+        csv = self._csv([
+            ("ME001", "01/03/2024", 6, "Cuadernos"), ("ME001", "01/03/2024", 6, "Cuadernos"),
+            ("ME001", "02/03/2024", 8, "Cuadernos"), ("ME002", "01/03/2024", 0, "Lapices"),
+            ("ME002", "02/03/2024", 10, "Lapices"), ("ME999", "01/03/2024", 3, "Lapices"),
+        ])
+
+        # Act
+        sku = compare_with_real(job_id, csv, "SKU", periodo="dia")
+        cat = compare_with_real(job_id, csv, "Categoria")
+        glob = compare_with_real(job_id, csv, "Global", desde="2024-03-02")
+
+        # Assert - errores absolutos: ME001 2 y 2, ME002 5 y 5
+        assert sku["global"]["MAE"] == pytest.approx(3.5)
+        assert sku["global"]["WAPE"] == pytest.approx(14 / 30, abs=1e-3)
+        assert sku["global"]["MAPE"] == pytest.approx((2 / 12 + 2 / 8 + 5 / 10) / 3, abs=1e-3)
+        assert sku["total"] == 2
+        me002 = next(r for r in sku["por_sku"] if r["CodArticulo"] == "ME002")
+        assert me002["MAE"] == 5 and me002["n"] == 2 and me002["Real"] == 10
+        assert [p["periodo"] for p in sku["por_periodo"]] == ["2024-03-01", "2024-03-02"]
+        assert [r["categoria"] for r in cat["por_sku"]] == ["Cuadernos", "Lapices"]
+        assert glob["por_sku"] == [] and glob["global"]["n"] == 2
+        assert glob["global"]["MAE"] == pytest.approx(3.5)
+
+    def test_acumular_ventas_y_paginar(self):
+        """
+        Verifica que con acumular las ventas nuevas se sumen a las ya
+        cargadas (reemplazando el mismo SKU y día) y que por_sku se pagine
+        """
+        from app.services.compare_service import compare_with_real
+
+        # Arrange
+        job_id = self._job_con_pronostico()
+        dia1 = self._csv([("ME001", "01/03/2024", 12, "C"), ("ME002", "01/03/2024", 5, "L")])
+        dia2 = self._csv([("ME001", "02/03/2024", 10, "C"), ("ME002", "01/03/2024", 7, "L")])
+
+        # Act
+        compare_with_real(job_id, dia1, "SKU", acumular=True)
+        compare_with_real(job_id, dia2, "SKU", acumular=True)
+        todo = compare_with_real(job_id, None, "SKU", acumular=True, size=1, page=1, orden="mae")
+
+        # Assert - filas ME001 01/03, ME002 01/03 (reemplazada), ME001 02/03
+        assert todo["global"]["n"] == 3
+        assert todo["global"]["MAE"] == pytest.approx((2 + 2 + 0) / 3, abs=1e-3)
+        assert todo["total"] == 2 and todo["page"] == 1 and todo["size"] == 1
+        assert [r["CodArticulo"] for r in todo["por_sku"]] == ["ME002"]
+        with pytest.raises(ValueError):
+            compare_with_real(job_id, None, "SKU")
+
+    def test_acumular_mezcla_sin_categoria_y_concurrente(self):
+        """
+        Verifica que cargas acumuladas sin categoria queden agrupadas como
+        "Sin categoria" y que cargas simultáneas al mismo job no se pierdan
+        """
+        import base64
+        from concurrent.futures import ThreadPoolExecutor
+        from app.services.compare_service import SIN_CATEGORIA, compare_with_real
+
+        # Arrange
+        job_id = self._job_con_pronostico()
+        sin_cat = base64.b64encode(b"CodArticulo,Fechaventa,CantidadVendida\nME002,01/03/2024,5\n").decode()
+        dias = [self._csv([("ME001", f"0{d}/03/2024", 10, "Cuadernos")]) for d in (1, 2, 3, 4)]
+
+        # Act
+        compare_with_real(job_id, sin_cat, "SKU", acumular=True)
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(lambda csv: compare_with_real(job_id, csv, "SKU", acumular=True), dias))
+        cat = compare_with_real(job_id, None, "Categoria", acumular=True)
+
+        # Assert
+        assert cat["global"]["n"] == 5
+        assert [r["categoria"] for r in cat["por_sku"]] == ["Cuadernos", SIN_CATEGORIA]
+        assert [r["n"] for r in cat["por_sku"]] == [4, 1]
+
+    def test_job_sin_pronostico_usa_d_media(self):
+        """
+        Verifica que un job sin pronóstico diario se compare contra la
+        demanda diaria media de cada SKU
+        """
+        from app.repositories import predictions_repo
+        from app.services.compare_service import compare_with_real
+
+        job_id, _ = predictions_repo.save_run({}, [_fila("ME001")], {"OK": 1})
+        csv = self._csv([("ME001", "01/03/2024", 12, "C"), ("ME001", "02/03/2024", 9, "C")])
+
+        res = compare_with_real(job_id, csv, "SKU")
+
+        assert res["global"]["MAE"] == pytest.approx(1.5)
+        assert res["por_sku"][0]["Pred"] == 20.0